@@ -127,14 +127,15 @@ if not hasattr(dbf, "build_city"):
 
 # Now import the recommender
 try:
-    from .therapists_recommender import recommend
+    from .therapists_recommender import recommend, analysis_cache_stats
 
     def _format_recommend_markdown(result: dict) -> str:
         """Render recommender JSON into friendly Vietnamese Markdown."""
         try:
             needs = result.get("needs") or {}
             providers = result.get("results") or result.get("providers") or []
-            city = needs.get("nearest_major_city") or needs.get("city") or "khu vực của bạn"
+            city = ((result.get("location") or {}).get("name")
+                    or needs.get("nearest_major_city") or needs.get("city") or "khu vực của bạn")
         except Exception:
             needs, providers, city = {}, [], "khu vực của bạn"
 
@@ -152,7 +153,8 @@ try:
             addr = p.get("address") or p.get("formatted_address") or ""
             phone = p.get("phone") or p.get("international_phone_number") or ""
             website = p.get("website") or ""
-            bits = [addr, phone, website]
+            dist = p.get("distance_km")
+            bits = [f"~{dist} km" if dist is not None else "", addr, phone, website]
             meta = " • ".join([b for b in bits if b])
             star = f" — ⭐ {rating}" if isinstance(rating, (int, float, str)) and str(rating).strip() else ""
             lines.append(f"- **{i}. {name}**{star}")
@@ -334,7 +336,11 @@ def index():
 # Health check
 @chatbot_bp.route("/api/health", methods=["GET"])
 def api_health():
-    return jsonify({"status": "ok"})
+    try:
+        cache = analysis_cache_stats()
+    except Exception as e:
+        cache = {"error": str(e)}
+    return jsonify({"status": "ok", "analysis_cache": cache})
 
 # Stress advice (text/markdown)
 @chatbot_bp.route("/api/stress_text", methods=["POST"])
@@ -0,0 +1,153 @@
+"""
+Persistent cache for Gemini needs-extraction results
+=====================================================
+
+`therapists_recommender.analyze_user_text` calls Gemini for every request,
+even when the same question was asked a minute ago. This module keeps the
+parsed JSON payload returned by the model in a small SQLite file so identical
+(accent-insensitive) queries skip the round-trip.
+
+- Key: sha256(model name + language hint + normalized text); the hint is
+  part of the prompt, so it changes the answer
+- TTL: entries older than `ttl_s` are treated as misses and removed
+- Size cap: least-recently-used entries are evicted above `max_entries`
+- Invalidation: every row stores a fingerprint of the system prompt; rows
+  written with another prompt are purged when the cache is opened
+
+Configure with env vars (all optional):
+   ANALYZE_CACHE_PATH=./database/analyze_cache.sqlite3
+   ANALYZE_CACHE_TTL_S=604800
+   ANALYZE_CACHE_MAX=5000
+"""
+
+from __future__ import annotations
+import os, json, time, sqlite3, hashlib, threading
+from typing import Dict, Any, Optional
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "database", "analyze_cache.sqlite3")
+DEFAULT_TTL_S = 7 * 24 * 3600
+DEFAULT_MAX_ENTRIES = 5000
+
+
+def _sha256(*parts: str) -> str:
+    h = hashlib.sha256()
+    for p in parts:
+        h.update(p.encode("utf-8"))
+        h.update(b"\x00")
+    return h.hexdigest()
+
+
+class AnalysisCache:
+    """SQLite-backed TTL + LRU cache for analyze_user_text payloads."""
+
+    def __init__(self, path: str, prompt: str, ttl_s: float = DEFAULT_TTL_S,
+                 max_entries: int = DEFAULT_MAX_ENTRIES):
+        self.path = path
+        self.ttl_s = float(ttl_s)
+        self.max_entries = int(max_entries)
+        self.prompt_hash = _sha256(prompt)
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "misses": 0, "expired": 0, "evictions": 0, "invalidated": 0}
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False, timeout=10)
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS analyze_cache (
+                key TEXT PRIMARY KEY,
+                model TEXT NOT NULL,
+                prompt_hash TEXT NOT NULL,
+                payload TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            )
+        """)
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS ix_analyze_cache_accessed ON analyze_cache(accessed_at)"
+        )
+        # Prompt đổi -> kết quả cũ không còn đúng định dạng/ý nghĩa
+        cur = self._conn.execute(
+            "DELETE FROM analyze_cache WHERE prompt_hash != ?", (self.prompt_hash,)
+        )
+        self._stats["invalidated"] += cur.rowcount
+        self._conn.commit()
+
+    def _key(self, normalized_text: str, model: str, lang: str = "") -> str:
+        return _sha256(model, lang, normalized_text)
+
+    def get(self, normalized_text: str, model: str, lang: str = "") -> Optional[Dict[str, Any]]:
+        """Return the cached payload or None on miss/expiry."""
+        key = self._key(normalized_text, model, lang)
+        now = time.time()
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT payload, created_at FROM analyze_cache WHERE key=? AND prompt_hash=?",
+                (key, self.prompt_hash),
+            ).fetchone()
+            if row is None:
+                self._stats["misses"] += 1
+                return None
+            payload, created_at = row
+            if now - created_at > self.ttl_s:
+                self._conn.execute("DELETE FROM analyze_cache WHERE key=?", (key,))
+                self._conn.commit()
+                self._stats["expired"] += 1
+                self._stats["misses"] += 1
+                return None
+            self._conn.execute("UPDATE analyze_cache SET accessed_at=? WHERE key=?", (now, key))
+            self._conn.commit()
+            self._stats["hits"] += 1
+        try:
+            return json.loads(payload)
+        except Exception:
+            return None
+
+    def put(self, normalized_text: str, model: str, payload: Dict[str, Any], lang: str = "") -> None:
+        """Store a payload, then evict the least recently used rows above the cap."""
+        key = self._key(normalized_text, model, lang)
+        now = time.time()
+        data = json.dumps(payload, ensure_ascii=False)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO analyze_cache "
+                "(key, model, prompt_hash, payload, created_at, accessed_at) VALUES (?,?,?,?,?,?)",
+                (key, model, self.prompt_hash, data, now, now),
+            )
+            (count,) = self._conn.execute("SELECT COUNT(*) FROM analyze_cache").fetchone()
+            overflow = count - self.max_entries
+            if overflow > 0:
+                self._conn.execute(
+                    "DELETE FROM analyze_cache WHERE key IN ("
+                    "SELECT key FROM analyze_cache ORDER BY accessed_at ASC LIMIT ?)",
+                    (overflow,),
+                )
+                self._stats["evictions"] += overflow
+            self._conn.commit()
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM analyze_cache")
+            self._conn.commit()
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters since process start + current size, for /api/health."""
+        with self._lock:
+            (entries,) = self._conn.execute("SELECT COUNT(*) FROM analyze_cache").fetchone()
+            out = dict(self._stats)
+        lookups = out["hits"] + out["misses"]
+        out.update({
+            "entries": entries,
+            "max_entries": self.max_entries,
+            "ttl_s": self.ttl_s,
+            "hit_rate": round(out["hits"] / lookups, 4) if lookups else 0.0,
+        })
+        return out
+
+
+def open_default_cache(prompt: str) -> AnalysisCache:
+    """Build the process-wide cache from env configuration."""
+    return AnalysisCache(
+        path=os.getenv("ANALYZE_CACHE_PATH", DEFAULT_PATH),
+        prompt=prompt,
+        ttl_s=float(os.getenv("ANALYZE_CACHE_TTL_S", str(DEFAULT_TTL_S))),
+        max_entries=int(os.getenv("ANALYZE_CACHE_MAX", str(DEFAULT_MAX_ENTRIES))),
+    )
@@ -0,0 +1,484 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks for the Aerial recommender
+===========================================
+
+Run from the Aerial folder:
+   python benchmarks.py ranking --n 100000
+
+Subcommands
+-----------
+ranking   Python loop (score_provider + full sort) vs. vectorized
+          score_columns + argpartition top-k on a synthetic city
+crawl     Serial build_city_database vs. crawl_cities against a fake
+          SerpAPI client with fixed latency
+dedupe    Blocked fuzzy dedupe on synthetic providers with known duplicates
+          (time, pairwise precision/recall, all-pairs extrapolation), plus
+          precision/recall on the city files with injected perturbed copies
+matcher   Per-call cost of city + language detection: the old per-dict
+          substring scans vs. the one-pass Aho–Corasick scanner
+"""
+
+from __future__ import annotations
+import argparse
+import contextlib
+import glob
+import io
+import json
+import os
+import random
+import tempfile
+import time
+import unicodedata
+from typing import Any, Callable, Dict, List, Tuple
+
+import therapists_recommender as tr
+from provider_store import build_snapshot
+
+CATEGORIES = [
+    "Nhà tâm lý học", "Psychologist", "Psychiatrist", "Mental health clinic",
+    "Counselor", "Bệnh viện tâm thần", "Phòng khám", "Người chữa bệnh bằng liệu pháp tâm lý",
+]
+CITIES = [tr.HUB_HCMC, tr.HUB_HANOI, tr.HUB_DN, None]
+
+
+def synthetic_providers(n: int, seed: int = 42) -> List[Dict[str, Any]]:
+    """Random providers shaped like database_fetcher.normalize_local_item output."""
+    rnd = random.Random(seed)
+    out = []
+    for i in range(n):
+        out.append({
+            "name": f"Provider {i}" + (" English Care" if rnd.random() < 0.1 else ""),
+            "address": f"{rnd.randint(1, 500)} Street {i % 97}",
+            "rating": round(rnd.uniform(1, 5), 1) if rnd.random() < 0.9 else None,
+            "reviews": rnd.randint(0, 3000) if rnd.random() < 0.9 else None,
+            "phone": None,
+            "website": f"https://p{i}.vn/en" if rnd.random() < 0.2 else f"https://p{i}.vn",
+            "category": rnd.choice(CATEGORIES),
+            "city": rnd.choice(CITIES),
+            "latitude": rnd.uniform(8.5, 23.3),
+            "longitude": rnd.uniform(102.2, 109.5),
+        })
+    return out
+
+
+def _best_of(fn: Callable[[], Any], repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best
+
+
+def bench_ranking(n: int, top_k: int, repeat: int) -> None:
+    raw = synthetic_providers(n)
+    t0 = time.perf_counter()
+    snap = build_snapshot("bench", "<memory>", 0, raw)
+    build_s = time.perf_counter() - t0
+    if snap.columns is None:
+        raise SystemExit("numpy is not installed; vectorized path unavailable.")
+
+    needs = {"nearest_major_city": tr.HUB_DN, "need_psychiatrist": False, "language": ["vi", "en"]}
+
+    def loop():
+        scored = [(tr.score_provider(p, needs), p) for p in snap.providers]
+        scored.sort(key=lambda x: x[0], reverse=True)
+        return scored[:top_k]
+
+    def vectorized():
+        return tr.rank_snapshot(snap, needs, top_k)
+
+    same = [id(p) for _, p in loop()] == [id(snap.providers[i]) for i in vectorized()]
+    t_loop = _best_of(loop, repeat)
+    t_vec = _best_of(vectorized, repeat)
+    print(f"providers      : {n:,} (snapshot + columns built in {build_s*1000:.1f} ms)")
+    print(f"python loop    : {t_loop*1000:9.2f} ms")
+    print(f"vectorized     : {t_vec*1000:9.2f} ms")
+    print(f"speedup        : {t_loop / t_vec:9.1f}x")
+    print(f"same top-{top_k}     : {same}")
+
+
+def _fake_place(city: str, place: int) -> Dict[str, Any]:
+    """One SerpAPI local result; the same (city, place) always gives the same record."""
+    rnd = random.Random(f"{city}|{place}")
+    name = f"{rnd.choice(NAME_PREFIXES)} {rnd.choice(NAME_WORDS)} {rnd.choice(NAME_WORDS)} {place}"
+    return {
+        "title": name,
+        "address": f"{rnd.randint(1, 400)} Đường {rnd.choice(NAME_WORDS)}, {city}",
+        "rating": round(rnd.uniform(3.5, 5.0), 1),
+        "reviews": rnd.randint(0, 800),
+        "type": rnd.choice(CATEGORIES),
+        # rải trong ~20 km quanh trung tâm: hai nơi khác nhau không trùng toạ độ
+        "gps_coordinates": {"latitude": 16.0 + rnd.uniform(-0.1, 0.1),
+                            "longitude": 108.2 + rnd.uniform(-0.1, 0.1)},
+    }
+
+
+class FakeGoogleSearch:
+    """
+    Stand-in for serpapi.GoogleSearch: fixed latency, 20 results/page, N pages/query.
+    Places are distinct, and the terms of a city overlap by half a page, so
+    cross-term duplicates exist but do not collapse the city.
+    """
+    latency_s = 0.2
+    pages = 2
+
+    def __init__(self, params: Dict[str, Any]):
+        self.params = params
+
+    def get_dict(self) -> Dict[str, Any]:
+        time.sleep(self.latency_s)
+        start = int(self.params.get("start") or 0)
+        page = start // 20
+        term, _, city = self.params["q"].rpartition(" in ")
+        offset = sum(map(ord, term)) % 5 * 10
+        results = [_fake_place(city, offset + start + i) for i in range(20)]
+        resp: Dict[str, Any] = {"local_results": results}
+        if page + 1 < self.pages:
+            resp["serpapi_pagination"] = {"next": start + 20}
+        return resp
+
+
+def bench_crawl(latency_s: float, pages: int, workers: int, rate: float) -> None:
+    import database_fetcher as dbf
+
+    FakeGoogleSearch.latency_s = latency_s
+    FakeGoogleSearch.pages = pages
+    cities = ["Hanoi", "Ho Chi Minh City", "Da Nang"]
+    terms = ["psychologist", "psychiatrist", "mental health clinic"]
+    pause = 1.0 / rate
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.environ["PROVIDER_CATALOG_PATH"] = os.path.join(tmp, "serial.sqlite3")
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            for city in cities:
+                dbf.build_city_database(
+                    city=city, terms=terms, out_path=os.path.join(tmp, f"serial_{dbf.safe_name(city)}.json"),
+                    api_key="fake", pages=pages, sleep_s=pause, search_cls=FakeGoogleSearch,
+                )
+        t_serial = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        with contextlib.redirect_stdout(io.StringIO()):
+            counts = dbf.crawl_cities(
+                cities=cities, terms=terms, outdir=tmp, api_key="fake", pages=pages,
+                workers=workers, rate_per_s=rate, search_cls=FakeGoogleSearch,
+                catalog_path=os.path.join(tmp, "crawl.sqlite3"),
+            )
+        t_crawl = time.perf_counter() - t0
+
+        serial = _provider_keys(os.path.join(tmp, "serial.sqlite3"))
+        crawled = _provider_keys(os.path.join(tmp, "crawl.sqlite3"))
+
+    n_req = len(cities) * len(terms) * pages
+    print(f"requests       : {n_req} ({latency_s*1000:.0f} ms latency, {rate:g} req/s limit)")
+    print(f"serial build   : {t_serial:8.2f} s")
+    print(f"crawler ({workers} w) : {t_crawl:8.2f} s")
+    print(f"speedup        : {t_serial / t_crawl:8.1f}x")
+    print(f"providers      : {counts}")
+    print(f"same providers : {serial == crawled}")
+    assert serial == crawled, "concurrent crawl and serial build disagree"
+
+
+def _provider_keys(path: str) -> Dict[str, set]:
+    """{city: {dedupe_key}} of the live providers in a catalog file."""
+    import provider_catalog as catalog
+
+    conn = catalog.connect(path)
+    try:
+        return {
+            c: {catalog.dedupe_key(p) for p in catalog.query_providers(conn, city=c)}
+            for c in catalog.cities(conn)
+        }
+    finally:
+        conn.close()
+
+
+NAME_PREFIXES = [
+    "Phòng khám Tâm lý", "Trung tâm Tư vấn Tâm lý", "Văn phòng tâm lý", "Psychology Clinic",
+    "Mental Care", "Phòng Tham vấn", "Viện Tâm lý", "Counseling Center",
+]
+NAME_WORDS = [
+    "An", "Bình", "Hạnh", "Phúc", "Minh", "Tâm", "Nhiên", "Sen", "Việt", "Hải", "Đăng", "Thiện",
+    "Mai", "Lan", "Hòa", "Khang", "Ánh", "Dương", "Sao", "Mây", "Family", "Sunny", "Care", "Hope",
+    "Mind", "Bloom", "Light", "Harbor", "Green", "Lotus", "Kim", "Ngọc", "Thanh", "Phong", "Huy",
+]
+
+
+def _strip_accents(s: str) -> str:
+    nfd = unicodedata.normalize("NFD", s)
+    return "".join(ch for ch in nfd if unicodedata.category(ch) != "Mn").replace("đ", "d").replace("Đ", "D")
+
+
+def _perturb(p: Dict[str, Any], rnd: random.Random) -> Dict[str, Any]:
+    """A copy of p the way another search term might return it."""
+    q = dict(p)
+    name = q.get("name") or ""
+    for _ in range(rnd.randint(1, 2)):
+        op = rnd.randrange(6)
+        if op == 0:
+            name = _strip_accents(name)
+        elif op == 1:
+            name = name.upper() if rnd.random() < 0.5 else name.lower()
+        elif op == 2:
+            name = name + rnd.choice([" (online)", " - Cơ sở 1", " (trực tiếp hoặc online)"])
+        elif op == 3 and len(name) > 8:
+            i = rnd.randrange(len(name))
+            name = name[:i] + name[i + 1:]  # lỗi gõ thiếu ký tự
+        elif op == 4:
+            name = name.replace(" - ", " ").replace("&", "and")
+        else:
+            words = name.split()
+            if len(words) > 2:
+                i = rnd.randrange(len(words) - 1)
+                words[i], words[i + 1] = words[i + 1], words[i]
+                name = " ".join(words)
+    q["name"] = name
+    q["address"] = (q.get("address") or "").replace("Việt Nam", "Vietnam") + rnd.choice(["", ", VN"])
+    if q.get("phone") and rnd.random() < 0.5:
+        digits = "".join(ch for ch in q["phone"] if ch.isdigit())
+        q["phone"] = "0" + digits[2:] if digits.startswith("84") else digits
+    if rnd.random() < 0.15:
+        q["phone"] = None
+    if q.get("latitude") is not None:
+        if rnd.random() < 0.1:
+            q["latitude"] = q["longitude"] = None
+        else:
+            q["latitude"] += rnd.uniform(-0.0003, 0.0003)   # ≈ ±30 m
+            q["longitude"] += rnd.uniform(-0.0003, 0.0003)
+    return q
+
+
+def synthetic_entities(n: int, dup_rate: float, seed: int = 7) -> Tuple[List[Dict[str, Any]], List[int]]:
+    """n providers (about dup_rate of them perturbed copies) and their true entity ids."""
+    from locations import PROVINCE_CENTROIDS
+
+    rnd = random.Random(seed)
+    centroids = list(PROVINCE_CENTROIDS.values())
+    records: List[Dict[str, Any]] = []
+    truth: List[int] = []
+    eid = 0
+    while len(records) < n:
+        lat0, lon0 = rnd.choice(centroids)
+        base = {
+            "name": f"{rnd.choice(NAME_PREFIXES)} {' '.join(rnd.sample(NAME_WORDS, 2))}",
+            "address": f"{rnd.randint(1, 400)} Đường {rnd.choice(NAME_WORDS)}, Việt Nam",
+            "phone": f"+84 9{rnd.randint(10, 99)} {rnd.randint(100, 999)} {rnd.randint(100, 999)}"
+                     if rnd.random() < 0.85 else None,
+            "rating": round(rnd.uniform(3, 5), 1),
+            "reviews": rnd.randint(0, 500),
+            "latitude": rnd.gauss(lat0, 0.05),
+            "longitude": rnd.gauss(lon0, 0.05),
+        }
+        records.append(base)
+        truth.append(eid)
+        if rnd.random() < dup_rate:
+            for _ in range(rnd.randint(1, 2)):
+                records.append(_perturb(base, rnd))
+                truth.append(eid)
+        eid += 1
+    order = list(range(len(records)))
+    rnd.shuffle(order)
+    return [records[i] for i in order[:n]], [truth[i] for i in order[:n]]
+
+
+def _pair_counts(clusters: List[List[int]], truth: List[int]) -> Tuple[int, int, int]:
+    """(true positive, predicted, actual) same-entity pairs."""
+    def c2(k: int) -> int:
+        return k * (k - 1) // 2
+
+    tp = predicted = 0
+    for c in clusters:
+        predicted += c2(len(c))
+        per_entity: Dict[int, int] = {}
+        for i in c:
+            per_entity[truth[i]] = per_entity.get(truth[i], 0) + 1
+        tp += sum(c2(k) for k in per_entity.values())
+    sizes: Dict[int, int] = {}
+    for t in truth:
+        sizes[t] = sizes.get(t, 0) + 1
+    return tp, predicted, sum(c2(k) for k in sizes.values())
+
+
+def _pr(clusters: List[List[int]], truth: List[int]) -> str:
+    tp, pred, actual = _pair_counts(clusters, truth)
+    precision = tp / pred if pred else 1.0
+    recall = tp / actual if actual else 1.0
+    return f"precision {precision:.3f}  recall {recall:.3f}  ({tp}/{pred} predicted, {actual} true pairs)"
+
+
+def _all_pairs_clusters(providers: List[Dict[str, Any]]) -> List[List[int]]:
+    """Same match rules as provider_dedupe, without blocking (O(n²) baseline)."""
+    import provider_dedupe as pdd
+
+    recs = [pdd._Rec(p) for p in providers]
+    keys = [pdd.dedupe_key(p) for p in providers]
+    uf = pdd.UnionFind(len(providers))
+    for i in range(len(recs)):
+        for j in range(i + 1, len(recs)):
+            a, b = recs[i], recs[j]
+            if (keys[i] == keys[j]
+                    or (a.phone and a.phone == b.phone and pdd._phone_match(a, b))
+                    or pdd._geo_match(a, b)):
+                uf.union(i, j)
+    clusters: Dict[int, List[int]] = {}
+    for i in range(len(recs)):
+        clusters.setdefault(uf.find(i), []).append(i)
+    return list(clusters.values())
+
+
+def bench_dedupe(n: int, dup_rate: float, naive_n: int) -> None:
+    import provider_dedupe as pdd
+
+    records, truth = synthetic_entities(n, dup_rate)
+    t0 = time.perf_counter()
+    clusters = pdd.cluster_providers(records)
+    t_blocked = time.perf_counter() - t0
+    print(f"synthetic      : {n:,} providers, {len(set(truth)):,} real places")
+    print(f"blocked        : {t_blocked:8.2f} s -> {len(clusters):,} clusters")
+    print(f"                 {_pr(clusters, truth)}")
+
+    sub, sub_truth = records[:naive_n], truth[:naive_n]
+    t0 = time.perf_counter()
+    naive = _all_pairs_clusters(sub)
+    t_naive = time.perf_counter() - t0
+    t0 = time.perf_counter()
+    blocked_sub = pdd.cluster_providers(sub)
+    t_blocked_sub = time.perf_counter() - t0
+    print(f"all-pairs      : {t_naive:8.2f} s on {naive_n:,} (blocked {t_blocked_sub:.3f} s); "
+          f"≈ {t_naive * (n / naive_n) ** 2 / 3600:.1f} h extrapolated to {n:,}")
+    print(f"                 all-pairs {_pr(naive, sub_truth)}")
+    print(f"                 blocked   {_pr(blocked_sub, sub_truth)}")
+
+    # File thật: mỗi cơ sở là một thực thể, chèn thêm bản sao đã làm nhiễu
+    rnd = random.Random(11)
+    db_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), "database")
+    for path in sorted(glob.glob(os.path.join(db_dir, "*_therapists.json"))):
+        with open(path, "r", encoding="utf-8") as f:
+            base = [p for p in json.load(f) if isinstance(p, dict)]
+        recs, tr_ids = list(base), list(range(len(base)))
+        for i, p in enumerate(base):
+            if rnd.random() < 0.5:
+                recs.append(_perturb(p, rnd))
+                tr_ids.append(i)
+        raw_merges = len(base) - len(pdd.cluster_providers(base))
+        print(f"{os.path.basename(path):32s}: {len(base)} + {len(recs) - len(base)} copies; "
+              f"{_pr(pdd.cluster_providers(recs), tr_ids)}; merges in original file: {raw_merges}")
+
+
+MATCHER_TEXTS = [
+    "Tôi đang sống ở Biên Hòa, Đồng Nai và cần gặp bác sĩ tâm lý trực tiếp",
+    "I live in Hanoi and need an English speaking therapist for anxiety, CBT preferred",
+    "Mình ở quận 1, muốn tư vấn tâm lý online vào buổi tối",
+    "Em học ở Đà Nẵng, hay mất ngủ và lo âu, cần phòng khám gần Hải Châu",
+    "Looking for a psychiatrist near Son Tra, budget is limited",
+    "Tôi ở miền Trung, cần chuyên gia trị liệu cho con nhỏ",
+    "Cần tư vấn tâm lý",
+    "Gia đình tôi ở Cần Thơ nhưng tôi làm việc tại Thành phố Hồ Chí Minh, cần trị liệu trực tuyến",
+]
+
+
+def _legacy_detect_language(text: str) -> str:
+    """detect_language before the automaton (reference for equality + timing)."""
+    import re
+    t = text.lower()
+    en_hits = sum(1 for w in tr._EN_WORDS if w in t)
+    vi_hits = sum(1 for w in tr._VI_HINTS if w in t)
+    if en_hits > vi_hits:
+        return "en"
+    if vi_hits > en_hits:
+        return "vi"
+    return "en" if re.fullmatch(r"[\x00-\x7F\s\W]+", text) else "vi"
+
+
+def _legacy_resolve(user_text: str) -> str:
+    """resolve_nearest_major_city before the automaton (no district extension)."""
+    t = tr._deaccent((user_text or "").lower())
+    for k, hub in tr.CITY_ALIASES.items():
+        if k in t: return hub
+    for prov, hub in tr.PROVINCE_TO_HUB.items():
+        if prov in t: return hub
+    for sub, hub in tr.SUBREGION_ALIAS.items():
+        if sub in t: return hub
+    for k, hub in tr.REGION_ALIAS.items():
+        if k in t: return hub
+    return tr.HUB_HCMC
+
+
+def bench_matcher(repeat: int) -> None:
+    # Câu ngẫu nhiên ghép từ tên tỉnh/alias để so kết quả trên nhiều tổ hợp
+    rnd = random.Random(3)
+    names = list(tr.PROVINCE_TO_HUB) + list(tr.CITY_ALIASES) + list(tr.SUBREGION_ALIAS) + ["xin chao", "the clinic"]
+    corpus = MATCHER_TEXTS + [
+        " ".join(rnd.choice(names) for _ in range(rnd.randint(0, 4))) + " " + rnd.choice(MATCHER_TEXTS)
+        for _ in range(500)
+    ]
+    mismatches = 0
+    for text in corpus:
+        hub_new, _, _ = tr._scan_hints.__wrapped__(text)
+        legacy = _legacy_resolve(text)
+        # Khác biệt duy nhất được phép: câu không có tỉnh/alias nào nhưng có tên quận mới thêm
+        if (hub_new or tr.HUB_HCMC) != legacy and not (legacy == tr.HUB_HCMC and hub_new is not None):
+            mismatches += 1
+        if tr.detect_language(text) != _legacy_detect_language(text):
+            mismatches += 1
+
+    scan = tr._scan_hints.__wrapped__  # bỏ lru_cache để đo đúng chi phí một lần quét
+
+    def legacy_both():
+        for t in MATCHER_TEXTS:
+            _legacy_resolve(t)
+            _legacy_detect_language(t)
+
+    def automaton_both():
+        for t in MATCHER_TEXTS:
+            scan(t)
+
+    n = len(MATCHER_TEXTS) * 1000
+    t_old = _best_of(lambda: [legacy_both() for _ in range(1000)], repeat) / n
+    t_new = _best_of(lambda: [automaton_both() for _ in range(1000)], repeat) / n
+    print(f"patterns       : {len(tr._LOCATION_AC)} location, {len(tr._LANG_AC)} language")
+    print(f"agreement      : {len(corpus)} texts, {mismatches} mismatches")
+    print(f"substring scans: {t_old * 1e6:8.2f} µs/call (resolve + detect)")
+    print(f"automaton      : {t_new * 1e6:8.2f} µs/call (one pass)")
+    print(f"speedup        : {t_old / t_new:8.1f}x")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Aerial recommender micro-benchmarks")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_rank = sub.add_parser("ranking", help="loop vs vectorized provider scoring")
+    p_rank.add_argument("--n", type=int, default=100_000)
+    p_rank.add_argument("--topk", type=int, default=5)
+    p_rank.add_argument("--repeat", type=int, default=5)
+
+    p_crawl = sub.add_parser("crawl", help="serial build vs concurrent crawler (fake SerpAPI)")
+    p_crawl.add_argument("--latency", type=float, default=0.2)
+    p_crawl.add_argument("--pages", type=int, default=2)
+    p_crawl.add_argument("--workers", type=int, default=6)
+    p_crawl.add_argument("--rate", type=float, default=10.0)
+
+    p_dd = sub.add_parser("dedupe", help="blocked fuzzy dedupe: speed and precision/recall")
+    p_dd.add_argument("--n", type=int, default=100_000)
+    p_dd.add_argument("--dup-rate", type=float, default=0.25)
+    p_dd.add_argument("--naive-n", type=int, default=2_000)
+
+    p_m = sub.add_parser("matcher", help="substring scans vs Aho–Corasick city/language detection")
+    p_m.add_argument("--repeat", type=int, default=5)
+
+    args = parser.parse_args()
+    if args.cmd == "ranking":
+        bench_ranking(args.n, args.topk, args.repeat)
+    elif args.cmd == "crawl":
+        bench_crawl(args.latency, args.pages, args.workers, args.rate)
+    elif args.cmd == "dedupe":
+        bench_dedupe(args.n, args.dup_rate, args.naive_n)
+    elif args.cmd == "matcher":
+        bench_matcher(args.repeat)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,8 @@ Features
 - Robust fetching with basic retry & error detection
 - Normalize common fields to a clean JSON schema
 - Dedupe across multiple terms per city
+- Upsert into the SQLite provider catalog (provider_catalog.py); the city
+  JSON is exported from the catalog as an import/export format
 - Atomic write to avoid broken JSON files
 - Simple CLI + friendly console logs
 
@@ -24,8 +26,17 @@ Quick Start
 4) Custom:
    python database_fetcher.py --cities "Hanoi" "Ho Chi Minh City" --terms "psychologist" "mental health clinic" --pages 2 --hl vi
 
+5) Crawler mode (parallel queries, shared rate limit, resumable):
+   python database_fetcher.py --workers 6 --rate 3
+   (Ctrl+C rồi chạy lại cùng lệnh sẽ tiếp tục từ checkpoint; --fresh để làm lại từ đầu)
+
+6) Incremental refresh (only terms older than --max-age-days, diff into the catalog):
+   python database_fetcher.py --refresh --max-age-days 7 --tombstone-days 30
+   python database_fetcher.py --refresh --every-hours 24     # keep running on a schedule
+
 Output
 ------
+- Upserts providers into ./database/providers.sqlite3
 - Creates/updates JSON files under ./database/<City>_therapists.json
 """
 
@@ -35,7 +46,10 @@ import json
 import time
 import argparse
 import tempfile
-from typing import List, Dict, Any
+import threading
+import queue
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 
 # Optional .env loader (won't crash if missing)
 try:
@@ -44,11 +58,18 @@ except Exception:
     def load_dotenv() -> None:
         return
 
-# SerpAPI client (if missing, give a clear message)
+try:
+    from . import provider_catalog as catalog
+    from .provider_dedupe import KnownProviders, fuzzy_dedupe
+except ImportError:  # chạy trực tiếp bằng CLI
+    import provider_catalog as catalog
+    from provider_dedupe import KnownProviders, fuzzy_dedupe
+
+# SerpAPI client (checked when a real fetch starts, see _search_client)
 try:
     from serpapi import GoogleSearch  # type: ignore
-except ImportError as e:
-    raise SystemExit("Missing dependency 'serpapi'. Install it with: pip install serpapi") from e
+except ImportError:
+    GoogleSearch = None
 
 
 # ---------------------------
@@ -121,6 +142,73 @@ def is_serpapi_error(resp: Any) -> str | None:
     return None
 
 
+def _search_client(search_cls: Any = None) -> Any:
+    """GoogleSearch by default; tests/benchmarks may inject a fake with the same API."""
+    if search_cls is not None:
+        return search_cls
+    if GoogleSearch is None:
+        raise SystemExit("Missing dependency 'serpapi'. Install it with: pip install serpapi")
+    return GoogleSearch
+
+
+def fetch_maps_page(
+    query: str,
+    api_key: str,
+    hl: str = "vi",
+    start: Any = None,
+    retries: int = 2,
+    backoff_s: float = 1.5,
+    search_cls: Any = None,
+    page_no: int = 1,
+) -> Tuple[List[Dict[str, Any]], Any, bool]:
+    """
+    Fetch one page of Google Maps results.
+    Returns (normalized items, next page token or None, ok).
+    ok=False means SerpAPI failed for good and the query should stop.
+    """
+    client = _search_client(search_cls)
+    params: Dict[str, Any] = {
+        "engine": "google_maps",
+        "q": query,
+        "hl": hl,
+        "api_key": api_key,
+        # "type": "search",  # Uncomment if needed
+    }
+    if start is not None:
+        params["start"] = start  # SerpAPI sometimes uses 'start' for pagination
+
+    attempt = 0
+    while True:
+        attempt += 1
+        try:
+            resp = client(params).get_dict()
+        except Exception as e:
+            if attempt <= retries:
+                print(f"[WARN] SerpAPI exception (attempt {attempt}/{retries}) page {page_no}: {e}")
+                time.sleep(backoff_s * attempt)
+                continue
+            print(f"[ERROR] SerpAPI exception: {e}")
+            return [], None, False
+
+        err_msg = is_serpapi_error(resp)
+        if err_msg:
+            print(f"[ERROR] SerpAPI returned error: {err_msg}")
+            return [], None, False
+
+        local_results = resp.get("local_results") or []
+        if not isinstance(local_results, list):
+            local_results = []
+        items = [normalize_local_item(raw) for raw in local_results]
+
+        # Try to detect pagination
+        pag = resp.get("serpapi_pagination") or {}
+        next_page_param = None
+        if isinstance(pag, dict):
+            # Some schemas expose next page token differently (adjust if needed)
+            next_page_param = pag.get("next_page_token") or pag.get("next")
+        return items, next_page_param, True
+
+
 def serpapi_maps_search(
     query: str,
     api_key: str,
@@ -129,6 +217,7 @@ def serpapi_maps_search(
     per_page_pause_s: float = 1.2,
     retries: int = 2,
     backoff_s: float = 1.5,
+    search_cls: Any = None,
 ) -> List[Dict[str, Any]]:
     """
     Fetch multiple pages of Google Maps results from SerpAPI.
@@ -140,52 +229,13 @@ def serpapi_maps_search(
     next_page_param: Any = None
 
     for page_idx in range(max_pages):
-        params: Dict[str, Any] = {
-            "engine": "google_maps",
-            "q": query,
-            "hl": hl,
-            "api_key": api_key,
-            # "type": "search",  # Uncomment if needed
-        }
-        if next_page_param is not None:
-            params["start"] = next_page_param  # SerpAPI sometimes uses 'start' for pagination
-
-        attempt = 0
-        while True:
-            attempt += 1
-            try:
-                resp = GoogleSearch(params).get_dict()
-            except Exception as e:
-                if attempt <= retries:
-                    print(f"[WARN] SerpAPI exception (attempt {attempt}/{retries}) page {page_idx+1}: {e}")
-                    time.sleep(backoff_s * attempt)
-                    continue
-                print(f"[ERROR] SerpAPI exception: {e}")
-                return collected
-
-            err_msg = is_serpapi_error(resp)
-            if err_msg:
-                print(f"[ERROR] SerpAPI returned error: {err_msg}")
-                return collected
-
-            local_results = resp.get("local_results") or []
-            if not isinstance(local_results, list):
-                local_results = []
-
-            for raw in local_results:
-                collected.append(normalize_local_item(raw))
-
-            # Try to detect pagination
-            pag = resp.get("serpapi_pagination") or {}
-            next_page_param = None
-            if isinstance(pag, dict):
-                # Some schemas expose next page token differently (adjust if needed)
-                next_page_param = pag.get("next_page_token") or pag.get("next")
-
-            break  # break retry loop, page fetched OK
-
-        if not next_page_param:
-            # No more pages
+        items, next_page_param, ok = fetch_maps_page(
+            query, api_key, hl=hl, start=next_page_param, retries=retries,
+            backoff_s=backoff_s, search_cls=search_cls, page_no=page_idx + 1,
+        )
+        collected.extend(items)
+        if not ok or not next_page_param:
+            # Lỗi hoặc hết trang
             break
 
         time.sleep(per_page_pause_s)
@@ -193,20 +243,21 @@ def serpapi_maps_search(
     return collected
 
 
-def dedupe_providers(providers: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
-    """Dedupe by (lower(name), lower(address))."""
-    seen: set[tuple[Any, Any]] = set()
-    unique: List[Dict[str, Any]] = []
-    for p in providers:
-        key = (
-            (p.get("name") or "").strip().lower(),
-            (p.get("address") or "").strip().lower(),
-        )
-        if key in seen:
-            continue
-        seen.add(key)
-        unique.append(p)
-    return unique
+def dedupe_providers(providers: List[Dict[str, Any]],
+                     known: Optional[KnownProviders] = None) -> List[Dict[str, Any]]:
+    """
+    Dedupe by (lower(name), lower(address)) — the catalog's upsert key — and
+    merge near-duplicates (similar name + same phone or same spot, see
+    provider_dedupe). Records matching one of `known` (the city's catalog
+    rows) take its key, so duplicates across terms and runs update one row;
+    `known` is updated with the merged records.
+    """
+    if known is None:
+        return fuzzy_dedupe(providers)
+    merged = fuzzy_dedupe(providers, known.candidates(providers))
+    for p in merged:
+        known.add(p)
+    return merged
 
 
 def verify_json(path: str) -> None:
@@ -227,10 +278,12 @@ def build_city_database(
     hl: str = "vi",
     pages: int = 2,
     sleep_s: float = 1.2,
+    search_cls: Any = None,
 ) -> None:
     """
-    Build one city JSON by merging & deduping results from multiple terms.
-    Writes atomically and verifies JSON integrity.
+    Build one city by merging & deduping results from multiple terms.
+    Upserts into the catalog, then exports the city JSON atomically and
+    verifies its integrity.
     """
     print(f"\n=== Building database for: {city} ===")
     all_items: List[Dict[str, Any]] = []
@@ -244,18 +297,301 @@ def build_city_database(
             hl=hl,
             max_pages=pages,
             per_page_pause_s=sleep_s,
+            search_cls=search_cls,
         )
         print(f"[Fetch] -> {len(batch)} items")
         all_items.extend(batch)
 
-    deduped = dedupe_providers(all_items)
-    print(f"[Dedupe] -> {len(deduped)} unique providers")
-
-    write_json_atomic(deduped, out_path)
+    conn = catalog.connect()
+    try:
+        deduped = dedupe_providers(all_items, KnownProviders(catalog.query_providers(conn, city=city)))
+        print(f"[Dedupe] -> {len(deduped)} unique providers")
+        inserted, updated = catalog.upsert_providers(conn, city, deduped)
+        print(f"[Catalog] +{inserted} new, {updated} updated")
+        # JSON là bản export của catalog (gồm cả cơ sở đã biết từ lần build trước)
+        write_json_atomic(catalog.query_providers(conn, city=city), out_path)
+    finally:
+        conn.close()
     verify_json(out_path)
     print(f"[OK] JSON valid → {out_path}")
 
 
+# ---------------------------
+# Concurrent crawler
+# ---------------------------
+
+class RateLimiter:
+    """Global limit of `rate_per_s` requests per second, shared by all workers."""
+
+    def __init__(self, rate_per_s: float):
+        self.interval = 1.0 / rate_per_s if rate_per_s > 0 else 0.0
+        self._lock = threading.Lock()
+        self._next_at = 0.0
+
+    def wait(self) -> None:
+        if self.interval <= 0:
+            return
+        with self._lock:
+            now = time.monotonic()
+            slot = max(now, self._next_at)
+            self._next_at = slot + self.interval
+        delay = slot - now
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CrawlCheckpoint:
+    """
+    Append-only JSONL log of finished (query, page) units.
+    Each line: {"query", "page", "next", "done"}; the last line per query wins.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.state: Dict[str, Dict[str, Any]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue  # dòng ghi dở khi bị ngắt
+                    self.state[rec["query"]] = rec
+
+    def resume_point(self, query: str) -> Optional[Tuple[int, Any]]:
+        """(next page index, start token) to continue from, or None if the query is finished."""
+        rec = self.state.get(query)
+        if rec is None:
+            return 0, None
+        if rec.get("done"):
+            return None
+        return rec["page"] + 1, rec.get("next")
+
+    def record(self, query: str, page: int, next_token: Any, done: bool) -> None:
+        rec = {"query": query, "page": page, "next": next_token, "done": done}
+        self.state[query] = rec
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+
+    def clear(self) -> None:
+        self.state.clear()
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def _crawl_query(query: str, city: str, first_page: int, start: Any, max_pages: int,
+                 api_key: str, hl: str, limiter: RateLimiter, out: "queue.Queue",
+                 search_cls: Any, stop: threading.Event) -> None:
+    """
+    Worker: walk one query's page chain, pushing every finished page to `out`.
+    Always ends with exactly one ("end", city, query) message, whatever happened.
+    """
+    token = start
+    try:
+        for page_idx in range(first_page, max_pages):
+            if stop.is_set():
+                return  # Ctrl+C ở luồng chính: dừng trước trang kế tiếp
+            limiter.wait()
+            items, token, ok = fetch_maps_page(
+                query, api_key, hl=hl, start=token, search_cls=search_cls, page_no=page_idx + 1,
+            )
+            if not ok:
+                # Không ghi checkpoint -> lần chạy sau thử lại từ trang này
+                out.put(("error", city, query, f"page {page_idx + 1} failed"))
+                return
+            done = (not token) or page_idx + 1 >= max_pages
+            out.put(("page", city, query, page_idx, items, token, done))
+            if done:
+                return
+    except BaseException as e:  # SystemExit (thiếu serpapi) cũng phải báo về luồng chính
+        out.put(("error", city, query, str(e)))
+    finally:
+        out.put(("end", city, query))
+
+
+def crawl_cities(
+    cities: List[str],
+    terms: List[str],
+    outdir: str,
+    api_key: str,
+    hl: str = "vi",
+    pages: int = 2,
+    workers: int = 4,
+    rate_per_s: float = 2.0,
+    checkpoint_path: Optional[str] = None,
+    fresh: bool = False,
+    search_cls: Any = None,
+    catalog_path: Optional[str] = None,
+) -> Dict[str, int]:
+    """
+    Crawl every (term, city) query with a bounded worker pool.
+
+    - Pages of one query stay sequential (each needs the previous token);
+      different queries run in parallel.
+    - All workers share one RateLimiter instead of sleeping per page.
+    - Each finished page is upserted into the catalog right away and then
+      recorded in the checkpoint, so an interrupted run resumes after the
+      last merged page.
+    - City JSON files are exported from the catalog at the end.
+
+    Returns {city: provider count}.
+    """
+    checkpoint = CrawlCheckpoint(checkpoint_path or os.path.join(outdir, ".crawl_checkpoint.jsonl"))
+    if fresh:
+        checkpoint.clear()
+
+    limiter = RateLimiter(rate_per_s)
+    out: "queue.Queue" = queue.Queue()
+    stop = threading.Event()
+    conn = catalog.connect(catalog_path)
+    # Catalog của từng city nạp một lần, cập nhật trong RAM khi gộp từng trang
+    known: Dict[str, KnownProviders] = {}
+    pending = 0
+    try:
+        pool = ThreadPoolExecutor(max_workers=max(1, workers))
+        try:
+            for city in cities:
+                for term in terms:
+                    query = f"{term} in {city}"
+                    resume = checkpoint.resume_point(query)
+                    if resume is None:
+                        print(f"[Skip] {query} (checkpoint)")
+                        continue
+                    first_page, start = resume
+                    if first_page >= pages:
+                        # Checkpoint đã tới giới hạn --pages của lần chạy này
+                        print(f"[Skip] {query} (checkpoint at page {first_page}, --pages {pages})")
+                        continue
+                    pool.submit(_crawl_query, query, city, first_page, start, pages,
+                                api_key, hl, limiter, out, search_cls, stop)
+                    pending += 1
+
+            # Luồng chính: gộp từng trang vào catalog ngay khi worker xong.
+            # get có timeout để Ctrl+C được xử lý ngay cả khi chưa có trang nào về
+            while pending:
+                try:
+                    msg = out.get(timeout=0.5)
+                except queue.Empty:
+                    continue
+                if msg[0] == "end":
+                    pending -= 1
+                    continue
+                if msg[0] == "error":
+                    _, city, query, err = msg
+                    print(f"[ERROR] {query}: {err}")
+                    continue
+                _, city, query, page_idx, items, token, done = msg
+                if items:
+                    # So với catalog của city -> trùng với trang/term khác được gộp vào row đã có
+                    if city not in known:
+                        known[city] = KnownProviders(catalog.query_providers(conn, city=city))
+                    catalog.upsert_providers(conn, city, dedupe_providers(items, known[city]))
+                checkpoint.record(query, page_idx, token, done)
+                print(f"[Crawl] {query} p{page_idx + 1} -> {len(items)} items")
+        except BaseException:
+            # Ctrl+C / lỗi: worker đang chạy dừng sau trang hiện tại, worker chưa chạy bị huỷ
+            stop.set()
+            pool.shutdown(wait=False, cancel_futures=True)
+            raise
+        pool.shutdown()
+
+        counts: Dict[str, int] = {}
+        for city in cities:
+            out_path = os.path.join(outdir, f"{safe_name(city)}_therapists.json")
+            data = catalog.query_providers(conn, city=city)
+            write_json_atomic(data, out_path)
+            verify_json(out_path)
+            counts[city] = len(data)
+            print(f"[OK] {city}: {counts[city]} providers → {out_path}")
+    finally:
+        conn.close()
+
+    if all(checkpoint.resume_point(f"{t} in {c}") is None for c in cities for t in terms):
+        checkpoint.clear()  # chạy xong trọn vẹn -> lần sau crawl lại từ đầu
+    return counts
+
+
+# ---------------------------
+# Incremental refresh
+# ---------------------------
+
+def refresh_stale(
+    cities: List[str],
+    terms: List[str],
+    outdir: str,
+    api_key: str,
+    hl: str = "vi",
+    pages: int = 2,
+    sleep_s: float = 1.2,
+    max_age_s: float = 7 * 86400,
+    tombstone_after_s: float = 30 * 86400,
+    search_cls: Any = None,
+    catalog_path: Optional[str] = None,
+) -> Dict[str, Dict[str, int]]:
+    """
+    Refetch only (city, term) queries older than max_age_s and diff the
+    results into the catalog (insert / update / last_seen bump).
+
+    Once every term of a city is fresh, providers not seen for
+    tombstone_after_s are tombstoned. The city JSON is re-exported only if
+    the city actually changed.
+
+    Returns {city: {"inserted", "updated", "unchanged", "tombstoned", "fetched"}}.
+    """
+    conn = catalog.connect(catalog_path)
+    summary: Dict[str, Dict[str, int]] = {}
+    try:
+        for city in cities:
+            due = catalog.stale_terms(conn, city, terms, max_age_s)
+            totals = {"inserted": 0, "updated": 0, "unchanged": 0, "tombstoned": 0, "fetched": 0}
+            summary[city] = totals
+            if not due:
+                print(f"[Refresh] {city}: up to date")
+                continue
+
+            complete = True
+            known = KnownProviders(catalog.query_providers(conn, city=city))
+            for term in due:
+                query = f"{term} in {city}"
+                print(f"[Refresh] {query}")
+                batch = serpapi_maps_search(
+                    query=query, api_key=api_key, hl=hl, max_pages=pages,
+                    per_page_pause_s=sleep_s, search_cls=search_cls,
+                )
+                if not batch:
+                    # Lỗi/không có kết quả -> không ghi fetch_log, lần sau thử lại
+                    print("[Refresh] -> no results, will retry next run")
+                    complete = False
+                    continue
+                diff = catalog.apply_diff(conn, city, dedupe_providers(batch, known))
+                catalog.record_fetch(conn, city, term, len(batch))
+                totals["fetched"] += 1
+                for k, v in diff.items():
+                    totals[k] += v
+                print(f"[Refresh] -> +{diff['inserted']} new, {diff['updated']} changed, "
+                      f"{diff['unchanged']} unchanged")
+
+            # Chỉ xoá mềm khi mọi term của city đã được lấy lại gần đây
+            if complete:
+                totals["tombstoned"] = catalog.tombstone_unseen(
+                    conn, city, before=time.time() - tombstone_after_s
+                )
+
+            if totals["inserted"] or totals["updated"] or totals["tombstoned"]:
+                out_path = os.path.join(outdir, f"{safe_name(city)}_therapists.json")
+                write_json_atomic(catalog.query_providers(conn, city=city), out_path)
+                verify_json(out_path)
+                print(f"[OK] {city}: {totals} → {out_path}")
+            else:
+                print(f"[OK] {city}: no changes")
+    finally:
+        conn.close()
+    return summary
+
+
 # ---------------------------
 # CLI
 # ---------------------------
@@ -298,6 +634,51 @@ def parse_args() -> argparse.Namespace:
         default=1.2,
         help="Pause seconds between pages (default: 1.2)",
     )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="Crawler mode: number of concurrent queries (default: 0 = serial build)",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=2.0,
+        help="Crawler mode: max SerpAPI requests per second across workers (default: 2)",
+    )
+    parser.add_argument(
+        "--checkpoint",
+        default=None,
+        help="Crawler mode: checkpoint file (default: <outdir>/.crawl_checkpoint.jsonl)",
+    )
+    parser.add_argument(
+        "--fresh",
+        action="store_true",
+        help="Crawler mode: ignore an existing checkpoint and start over",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Incremental mode: refetch only stale (city, term) queries and diff into the catalog",
+    )
+    parser.add_argument(
+        "--max-age-days",
+        type=float,
+        default=7.0,
+        help="Refresh mode: refetch a query once it is older than this (default: 7)",
+    )
+    parser.add_argument(
+        "--tombstone-days",
+        type=float,
+        default=30.0,
+        help="Refresh mode: tombstone providers not seen for this long (default: 30)",
+    )
+    parser.add_argument(
+        "--every-hours",
+        type=float,
+        default=0.0,
+        help="Refresh mode: repeat every N hours (default: 0 = run once)",
+    )
     return parser.parse_args()
 
 
@@ -311,6 +692,42 @@ def main() -> None:
     outdir = args.outdir
     os.makedirs(outdir, exist_ok=True)
 
+    if args.refresh:
+        while True:
+            refresh_stale(
+                cities=args.cities,
+                terms=args.terms,
+                outdir=outdir,
+                api_key=api_key,
+                hl=args.hl,
+                pages=args.pages,
+                sleep_s=args.sleep,
+                max_age_s=args.max_age_days * 86400,
+                tombstone_after_s=args.tombstone_days * 86400,
+            )
+            if args.every_hours <= 0:
+                break
+            print(f"\n[Refresh] next run in {args.every_hours:g} h")
+            time.sleep(args.every_hours * 3600)
+        print("\nAll done.")
+        return
+
+    if args.workers > 0:
+        crawl_cities(
+            cities=args.cities,
+            terms=args.terms,
+            outdir=outdir,
+            api_key=api_key,
+            hl=args.hl,
+            pages=args.pages,
+            workers=args.workers,
+            rate_per_s=args.rate,
+            checkpoint_path=args.checkpoint,
+            fresh=args.fresh,
+        )
+        print("\nAll done.")
+        return
+
     for city in args.cities:
         file_name = f"{safe_name(city)}_therapists.json"
         out_path = os.path.join(outdir, file_name)
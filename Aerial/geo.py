@@ -0,0 +1,170 @@
+"""
+Geospatial helpers for provider search
+======================================
+
+- `haversine_km`: great-circle distance
+- `geohash_encode` / `geohash_neighbors`: standard base32 geohash cells
+- `geohash_cell`: the same cells as integer (row, col), used as blocking keys
+- `GridIndex`: uniform lat/lon grid over provider coordinates with an
+  expanding-ring k-nearest-neighbour search. Cells are ~0.1° (≈11 km), so a
+  query only touches the few cells around the user instead of every provider
+  in the country.
+"""
+
+from __future__ import annotations
+import math
+from typing import Dict, List, Optional, Sequence, Tuple
+
+EARTH_RADIUS_KM = 6371.0088
+KM_PER_DEG_LAT = 111.32
+
+_GEOHASH_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+
+
+def haversine_km(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    p1, p2 = math.radians(lat1), math.radians(lat2)
+    dp = p2 - p1
+    dl = math.radians(lon2 - lon1)
+    a = math.sin(dp / 2) ** 2 + math.cos(p1) * math.cos(p2) * math.sin(dl / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(min(1.0, math.sqrt(a)))
+
+
+def valid_coords(lat, lon) -> bool:
+    return (
+        isinstance(lat, (int, float)) and isinstance(lon, (int, float))
+        and -90.0 <= lat <= 90.0 and -180.0 <= lon <= 180.0
+    )
+
+
+def geohash_encode(lat: float, lon: float, precision: int = 7) -> str:
+    """Encode a coordinate as a geohash string (precision 7 ≈ 150 m cells)."""
+    lat_lo, lat_hi = -90.0, 90.0
+    lon_lo, lon_hi = -180.0, 180.0
+    out = []
+    bit, ch, even = 0, 0, True
+    while len(out) < precision:
+        if even:
+            mid = (lon_lo + lon_hi) / 2
+            if lon >= mid:
+                ch = (ch << 1) | 1
+                lon_lo = mid
+            else:
+                ch <<= 1
+                lon_hi = mid
+        else:
+            mid = (lat_lo + lat_hi) / 2
+            if lat >= mid:
+                ch = (ch << 1) | 1
+                lat_lo = mid
+            else:
+                ch <<= 1
+                lat_hi = mid
+        even = not even
+        bit += 1
+        if bit == 5:
+            out.append(_GEOHASH_BASE32[ch])
+            bit, ch = 0, 0
+    return "".join(out)
+
+
+def _geohash_cell_size(precision: int) -> Tuple[float, float]:
+    """(dlat, dlon) of a geohash cell: lon bits = ceil(5p/2), lat bits = floor(5p/2)."""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = (5 * precision) // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def geohash_cell(lat: float, lon: float, precision: int = 7) -> Tuple[int, int]:
+    """
+    Integer (row, col) of the geohash cell containing the point.
+    Same cells as geohash_encode at that precision, but neighbours are just
+    (row ± 1, col ± 1), which makes it cheap to use as a blocking key.
+    """
+    dlat, dlon = _geohash_cell_size(precision)
+    return (math.floor((lat + 90.0) / dlat), math.floor((lon + 180.0) / dlon))
+
+
+def geohash_neighbors(lat: float, lon: float, precision: int = 7) -> List[str]:
+    """The cell containing (lat, lon) plus its 8 neighbours (duplicates removed)."""
+    dlat, dlon = _geohash_cell_size(precision)
+    cells = []
+    for i in (-1, 0, 1):
+        for j in (-1, 0, 1):
+            la = max(-90.0, min(90.0, lat + i * dlat))
+            lo = ((lon + j * dlon + 180.0) % 360.0) - 180.0
+            gh = geohash_encode(la, lo, precision)
+            if gh not in cells:
+                cells.append(gh)
+    return cells
+
+
+class GridIndex:
+    """
+    Uniform grid over points for k-nearest queries.
+
+    points: sequence of (lat, lon) or None (rows without coordinates are skipped)
+    """
+
+    def __init__(self, points: Sequence[Optional[Tuple[float, float]]], cell_deg: float = 0.1):
+        self.cell_deg = float(cell_deg)
+        self.points = list(points)
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        self.size = 0
+        min_r = min_c = math.inf
+        max_r = max_c = -math.inf
+        for idx, pt in enumerate(self.points):
+            if pt is None or not valid_coords(*pt):
+                continue
+            key = self._cell(pt[0], pt[1])
+            self.cells.setdefault(key, []).append(idx)
+            self.size += 1
+            min_r, max_r = min(min_r, key[0]), max(max_r, key[0])
+            min_c, max_c = min(min_c, key[1]), max(max_c, key[1])
+        self._bounds = (min_r, max_r, min_c, max_c)
+
+    def __len__(self) -> int:
+        return self.size
+
+    def _cell(self, lat: float, lon: float) -> Tuple[int, int]:
+        return (math.floor(lat / self.cell_deg), math.floor(lon / self.cell_deg))
+
+    def _ring(self, r0: int, c0: int, ring: int):
+        if ring == 0:
+            yield (r0, c0)
+            return
+        for dc in range(-ring, ring + 1):
+            yield (r0 - ring, c0 + dc)
+            yield (r0 + ring, c0 + dc)
+        for dr in range(-ring + 1, ring):
+            yield (r0 + dr, c0 - ring)
+            yield (r0 + dr, c0 + ring)
+
+    def nearest(self, lat: float, lon: float, k: int,
+                max_km: Optional[float] = None) -> List[Tuple[float, int]]:
+        """Return up to k (distance_km, point_index) pairs, closest first."""
+        if self.size == 0 or k <= 0:
+            return []
+        r0, c0 = self._cell(lat, lon)
+        min_r, max_r, min_c, max_c = self._bounds
+        # Vòng xa nhất cần duyệt để phủ hết dữ liệu
+        max_ring = int(max(abs(r0 - min_r), abs(r0 - max_r), abs(c0 - min_c), abs(c0 - max_c)))
+        # Cạnh ô ngắn nhất (km) tại vĩ độ truy vấn -> khoảng cách tối thiểu tới vòng chưa duyệt
+        cell_km = self.cell_deg * KM_PER_DEG_LAT * max(0.1, math.cos(math.radians(abs(lat) + self.cell_deg)))
+
+        found: List[Tuple[float, int]] = []
+        for ring in range(max_ring + 1):
+            for key in self._ring(r0, c0, ring):
+                for idx in self.cells.get(key, ()):
+                    plat, plon = self.points[idx]
+                    d = haversine_km(lat, lon, plat, plon)
+                    if max_km is None or d <= max_km:
+                        found.append((d, idx))
+            reach_km = ring * cell_km  # mọi điểm ở vòng sau đều xa hơn mức này
+            if max_km is not None and reach_km > max_km:
+                break
+            if len(found) >= k:
+                found.sort()
+                if found[k - 1][0] <= reach_km:
+                    break
+        found.sort()
+        return found[:k]
@@ -0,0 +1,131 @@
+"""
+Approximate centroids for Vietnamese provinces and common urban districts
+=========================================================================
+
+Used by the recommender to turn "Tôi ở Cần Thơ" / "near Hai Chau" into a
+coordinate for nearest-provider search. Province points are the provincial
+capitals; district points are district centres. Keys are accent-folded,
+lowercase names (đ -> d), so both "Đắk Lắk" and "dak lak" resolve.
+"""
+
+from __future__ import annotations
+import re
+import unicodedata
+from typing import Dict, Optional, Tuple
+
+
+def fold(s: str) -> str:
+    """Lowercase, strip accents and map đ -> d."""
+    if not isinstance(s, str):
+        return ""
+    nfkd = unicodedata.normalize("NFD", s.lower())
+    return "".join(ch for ch in nfkd if unicodedata.category(ch) != "Mn").replace("đ", "d")
+
+
+PROVINCE_CENTROIDS: Dict[str, Tuple[float, float]] = {
+    # Miền Bắc
+    "Hà Nội": (21.0285, 105.8542), "Hải Phòng": (20.8449, 106.6881),
+    "Quảng Ninh": (20.9599, 107.0425), "Bắc Ninh": (21.1861, 106.0763),
+    "Bắc Giang": (21.2731, 106.1946), "Lạng Sơn": (21.8537, 106.7610),
+    "Cao Bằng": (22.6657, 106.2578), "Hà Giang": (22.8233, 104.9836),
+    "Tuyên Quang": (21.8236, 105.2140), "Thái Nguyên": (21.5942, 105.8482),
+    "Phú Thọ": (21.3227, 105.4019), "Vĩnh Phúc": (21.3089, 105.6049),
+    "Hòa Bình": (20.8172, 105.3376), "Sơn La": (21.3256, 103.9188),
+    "Điện Biên": (21.3860, 103.0230), "Lai Châu": (22.3964, 103.4582),
+    "Lào Cai": (22.4856, 103.9707), "Yên Bái": (21.7229, 104.9113),
+    "Thái Bình": (20.4463, 106.3366), "Hải Dương": (20.9373, 106.3146),
+    "Hưng Yên": (20.6464, 106.0511), "Hà Nam": (20.5411, 105.9139),
+    "Nam Định": (20.4388, 106.1621), "Ninh Bình": (20.2506, 105.9745),
+    # Miền Trung + Tây Nguyên
+    "Thanh Hóa": (19.8067, 105.7852), "Nghệ An": (18.6796, 105.6813),
+    "Hà Tĩnh": (18.3559, 105.8877), "Quảng Bình": (17.4689, 106.6223),
+    "Quảng Trị": (16.8163, 107.1003), "Thừa Thiên Huế": (16.4637, 107.5909),
+    "Đà Nẵng": (16.0544, 108.2022), "Quảng Nam": (15.5736, 108.4740),
+    "Quảng Ngãi": (15.1214, 108.8044), "Bình Định": (13.7820, 109.2196),
+    "Phú Yên": (13.0882, 109.0929), "Khánh Hòa": (12.2388, 109.1967),
+    "Ninh Thuận": (11.5645, 108.9886), "Bình Thuận": (10.9289, 108.1021),
+    "Kon Tum": (14.3545, 108.0076), "Gia Lai": (13.9833, 108.0000),
+    "Đắk Lắk": (12.6667, 108.0500), "Đắk Nông": (12.0042, 107.6907),
+    "Lâm Đồng": (11.9404, 108.4583),
+    # Miền Nam
+    "Hồ Chí Minh": (10.7769, 106.7009), "Bà Rịa Vũng Tàu": (10.3460, 107.0843),
+    "Bình Dương": (10.9804, 106.6519), "Bình Phước": (11.5349, 106.8832),
+    "Đồng Nai": (10.9574, 106.8427), "Tây Ninh": (11.3100, 106.0983),
+    "An Giang": (10.3864, 105.4352), "Bạc Liêu": (9.2940, 105.7216),
+    "Bến Tre": (10.2434, 106.3756), "Cà Mau": (9.1769, 105.1524),
+    "Cần Thơ": (10.0452, 105.7469), "Đồng Tháp": (10.4602, 105.6329),
+    "Hậu Giang": (9.7845, 105.4701), "Kiên Giang": (10.0125, 105.0809),
+    "Long An": (10.5359, 106.4137), "Sóc Trăng": (9.6025, 105.9739),
+    "Tiền Giang": (10.3600, 106.3600), "Trà Vinh": (9.9347, 106.3453),
+    "Vĩnh Long": (10.2537, 105.9722),
+}
+
+# Tên gọi khác của tỉnh/thành
+PROVINCE_ALIASES: Dict[str, str] = {
+    "hanoi": "Hà Nội", "tp ho chi minh": "Hồ Chí Minh", "tp hcm": "Hồ Chí Minh",
+    "tphcm": "Hồ Chí Minh", "hcmc": "Hồ Chí Minh", "ho chi minh city": "Hồ Chí Minh",
+    "sai gon": "Hồ Chí Minh", "saigon": "Hồ Chí Minh", "danang": "Đà Nẵng",
+    "hue": "Thừa Thiên Huế", "vung tau": "Bà Rịa Vũng Tàu", "nha trang": "Khánh Hòa",
+    "da lat": "Lâm Đồng", "dalat": "Lâm Đồng", "quy nhon": "Bình Định",
+    "buon ma thuot": "Đắk Lắk", "bien hoa": "Đồng Nai",
+    "thu dau mot": "Bình Dương", "ha long": "Quảng Ninh", "pleiku": "Gia Lai",
+}
+
+DISTRICT_CENTROIDS: Dict[str, Tuple[float, float]] = {
+    # TP.HCM
+    "thu duc": (10.8494, 106.7537), "binh thanh": (10.8106, 106.7091),
+    "quan 1": (10.7756, 106.7019), "quan 3": (10.7843, 106.6844),
+    "quan 7": (10.7340, 106.7218), "phu nhuan": (10.7992, 106.6803),
+    "go vap": (10.8387, 106.6653), "tan binh": (10.8015, 106.6527),
+    # Hà Nội
+    "ha dong": (20.9714, 105.7788), "dong anh": (21.1367, 105.8489),
+    "cau giay": (21.0362, 105.7906), "tay ho": (21.0702, 105.8188),
+    "hoan kiem": (21.0288, 105.8525), "dong da": (21.0181, 105.8298),
+    "ba dinh": (21.0341, 105.8140), "hai ba trung": (21.0058, 105.8576),
+    # Đà Nẵng
+    "hai chau": (16.0471, 108.2068), "son tra": (16.1067, 108.2520),
+    "ngu hanh son": (16.0006, 108.2512), "thanh khe": (16.0645, 108.1858),
+    "lien chieu": (16.0718, 108.1503),
+}
+
+
+def _build_table() -> Dict[str, Tuple[str, float, float, int]]:
+    """folded name -> (display name, lat, lon, specificity); districts beat provinces."""
+    table: Dict[str, Tuple[str, float, float, int]] = {}
+    for name, (lat, lon) in PROVINCE_CENTROIDS.items():
+        table[fold(name)] = (name, lat, lon, 1)
+    for alias, name in PROVINCE_ALIASES.items():
+        lat, lon = PROVINCE_CENTROIDS[name]
+        table.setdefault(alias, (name, lat, lon, 1))
+    for key, (lat, lon) in DISTRICT_CENTROIDS.items():
+        table[key] = (key.title(), lat, lon, 2)
+    return table
+
+
+LOCATION_TABLE = _build_table()
+
+# Dài trước để "quan 10" không bị "quan 1" nuốt; \b tránh khớp giữa từ
+_LOCATION_RE = re.compile(
+    r"\b(" + "|".join(re.escape(k) for k in sorted(LOCATION_TABLE, key=len, reverse=True)) + r")\b"
+)
+
+
+def resolve_location(text: str) -> Optional[Dict[str, object]]:
+    """
+    Find the most specific known place in the text.
+    Returns {"name", "lat", "lon", "level"} or None.
+    """
+    t = fold(text)
+    best = None
+    for m in _LOCATION_RE.finditer(t):
+        name, lat, lon, spec = LOCATION_TABLE[m.group(1)]
+        if best is None or spec > best[3]:
+            best = (name, lat, lon, spec)
+    if best is None:
+        return None
+    return {
+        "name": best[0],
+        "lat": best[1],
+        "lon": best[2],
+        "level": "district" if best[3] == 2 else "province",
+    }
@@ -0,0 +1,519 @@
+#!/usr/bin/env python3
+"""
+SQLite provider catalog
+=======================
+
+Single source of truth for provider data (the per-city JSON files become an
+import/export format):
+
+- `providers` table, one row per provider, upserted on the same key as
+  `database_fetcher.dedupe_providers` (lower(name), lower(address))
+- Indexes on city and category
+- FTS5 index over name, address and category (diacritics-insensitive)
+- `catalog_cities` keeps a revision counter per city, bumped by every write
+  that changes something, so in-memory readers can cheaply tell whether a
+  city changed; each row stores the revision that last touched it (`rev`),
+  so readers can fetch only the rows changed since the revision they hold.
+  `catalog_meta.revision` moves with every city revision, so a reader of
+  all cities checks one row instead of one per city
+- Incremental refresh: rows carry a content hash and a last-seen timestamp;
+  unchanged rows only get `last_seen` bumped, rows not seen for a while are
+  tombstoned (`deleted = 1`) instead of being removed, and `fetch_log`
+  records when each (city, term) query last ran
+- A provider that moves to another city leaves a `provider_moves` row in
+  the city it left, so readers of that city see it as deleted
+
+Usage
+-----
+   python provider_catalog.py import            # database/*_therapists.json -> catalog
+   python provider_catalog.py export --outdir database
+   python provider_catalog.py search "tâm lý trẻ em" --city "Da Nang"
+"""
+
+from __future__ import annotations
+import os
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import tempfile
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+DEFAULT_PATH = os.path.join(os.path.dirname(__file__), "database", "providers.sqlite3")
+
+# Cột lưu trong catalog = schema của database_fetcher.normalize_local_item
+PROVIDER_FIELDS = (
+    "name", "address", "rating", "reviews", "phone", "website",
+    "category", "google_maps_url", "latitude", "longitude",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS providers (
+    id INTEGER PRIMARY KEY,
+    dedupe_key TEXT NOT NULL UNIQUE,
+    city TEXT NOT NULL,
+    name TEXT,
+    address TEXT,
+    rating REAL,
+    reviews INTEGER,
+    phone TEXT,
+    website TEXT,
+    category TEXT,
+    google_maps_url TEXT,
+    latitude REAL,
+    longitude REAL,
+    updated_at REAL NOT NULL,
+    content_hash TEXT,
+    last_seen REAL,
+    rev INTEGER NOT NULL DEFAULT 0,
+    deleted INTEGER NOT NULL DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS ix_providers_city ON providers(city);
+CREATE INDEX IF NOT EXISTS ix_providers_category ON providers(category);
+
+CREATE TABLE IF NOT EXISTS catalog_cities (
+    city TEXT PRIMARY KEY,
+    revision INTEGER NOT NULL DEFAULT 0,
+    updated_at REAL NOT NULL
+);
+
+-- Bộ đếm toàn catalog: tăng mỗi khi revision của một city đổi
+CREATE TABLE IF NOT EXISTS catalog_meta (
+    key TEXT PRIMARY KEY,
+    value INTEGER NOT NULL
+);
+
+-- Tombstone ở city cũ khi provider đổi city (dedupe_key là UNIQUE nên row chỉ nằm ở city mới)
+CREATE TABLE IF NOT EXISTS provider_moves (
+    dedupe_key TEXT NOT NULL,
+    city TEXT NOT NULL,
+    rev INTEGER NOT NULL,
+    PRIMARY KEY (city, dedupe_key)
+);
+
+CREATE TABLE IF NOT EXISTS fetch_log (
+    city TEXT NOT NULL,
+    term TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    items INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (city, term)
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS providers_fts USING fts5(
+    name, address, category,
+    content='providers', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+
+CREATE TRIGGER IF NOT EXISTS providers_ai AFTER INSERT ON providers BEGIN
+    INSERT INTO providers_fts(rowid, name, address, category)
+    VALUES (new.id, new.name, new.address, new.category);
+END;
+CREATE TRIGGER IF NOT EXISTS providers_ad AFTER DELETE ON providers BEGIN
+    INSERT INTO providers_fts(providers_fts, rowid, name, address, category)
+    VALUES ('delete', old.id, old.name, old.address, old.category);
+END;
+"""
+
+# Chạy sau _migrate: cần cột rev, và trigger cũ (AFTER UPDATE mọi cột) phải được thay
+POST_MIGRATE = """
+CREATE INDEX IF NOT EXISTS ix_providers_city_rev ON providers(city, rev);
+
+-- Chỉ đánh index lại khi cột được index đổi (bump last_seen không đụng FTS)
+CREATE TRIGGER IF NOT EXISTS providers_au AFTER UPDATE OF name, address, category ON providers BEGIN
+    INSERT INTO providers_fts(providers_fts, rowid, name, address, category)
+    VALUES ('delete', old.id, old.name, old.address, old.category);
+    INSERT INTO providers_fts(rowid, name, address, category)
+    VALUES (new.id, new.name, new.address, new.category);
+END;
+"""
+
+# Cột thêm sau bản đầu của catalog -> ALTER TABLE cho file cũ
+_ADDED_COLUMNS = (
+    ("content_hash", "TEXT"),
+    ("last_seen", "REAL"),
+    ("rev", "INTEGER NOT NULL DEFAULT 0"),
+    ("deleted", "INTEGER NOT NULL DEFAULT 0"),
+)
+
+
+def dedupe_key(p: Dict[str, Any]) -> str:
+    """(lower(name), lower(address)) joined into one string."""
+    return (
+        (p.get("name") or "").strip().lower()
+        + "\x1f"
+        + (p.get("address") or "").strip().lower()
+    )
+
+
+def _text(v) -> Optional[str]:
+    if v is None:
+        return None
+    if isinstance(v, list):
+        return " ".join(str(x) for x in v if x)
+    return str(v)
+
+
+def _num(v, cast):
+    try:
+        return cast(v) if v is not None and v != "" else None
+    except (TypeError, ValueError):
+        return None
+
+
+def _row_values(p: Dict[str, Any]) -> Tuple[Any, ...]:
+    """Provider fields in PROVIDER_FIELDS order, coerced to the column types."""
+    return (
+        _text(p.get("name")), _text(p.get("address")),
+        _num(p.get("rating"), float), _num(p.get("reviews"), int),
+        _text(p.get("phone")), _text(p.get("website")),
+        _text(p.get("category")), _text(p.get("google_maps_url")),
+        _num(p.get("latitude"), float), _num(p.get("longitude"), float),
+    )
+
+
+def content_hash(p: Dict[str, Any]) -> str:
+    """Stable hash of the stored fields; equal hashes mean nothing to update."""
+    blob = json.dumps(_row_values(p), ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha1(blob.encode("utf-8")).hexdigest()
+
+
+def catalog_path() -> str:
+    return os.getenv("PROVIDER_CATALOG_PATH", DEFAULT_PATH)
+
+
+def connect(path: Optional[str] = None) -> sqlite3.Connection:
+    """Open (and create if needed) the catalog database."""
+    path = path or catalog_path()
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path, timeout=10, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    conn.executescript(SCHEMA)
+    _migrate(conn)
+    conn.executescript(POST_MIGRATE)
+    return conn
+
+
+def open_reader(path: Optional[str] = None) -> sqlite3.Connection:
+    """
+    Plain connection to a catalog that connect() has already created and
+    migrated: no DDL, so it is cheap enough to open per thread.
+    """
+    conn = sqlite3.connect(path or catalog_path(), timeout=10, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def _migrate(conn: sqlite3.Connection) -> None:
+    """Bring a catalog created by an older version up to the current columns."""
+    have = {r["name"] for r in conn.execute("PRAGMA table_info(providers)")}
+    missing = [(name, decl) for name, decl in _ADDED_COLUMNS if name not in have]
+    if not missing:
+        return
+    with conn:
+        for name, decl in missing:
+            conn.execute(f"ALTER TABLE providers ADD COLUMN {name} {decl}")
+        conn.execute("DROP TRIGGER IF EXISTS providers_au")
+        conn.execute("UPDATE providers SET last_seen = updated_at WHERE last_seen IS NULL")
+
+
+def _next_revision(conn: sqlite3.Connection, city: str) -> int:
+    return (city_revision(conn, city) or 0) + 1
+
+
+def _set_revision(conn: sqlite3.Connection, city: str, rev: int, now: float) -> None:
+    conn.execute(
+        "INSERT INTO catalog_cities(city, revision, updated_at) VALUES (?, ?, ?) "
+        "ON CONFLICT(city) DO UPDATE SET revision = excluded.revision, updated_at = excluded.updated_at",
+        (city, rev, now),
+    )
+    conn.execute(
+        "INSERT INTO catalog_meta(key, value) VALUES ('revision', 1) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + 1"
+    )
+
+
+def apply_diff(conn: sqlite3.Connection, city: str,
+               providers: Iterable[Dict[str, Any]], now: Optional[float] = None) -> Dict[str, int]:
+    """
+    Merge freshly fetched providers of a city in one transaction.
+
+    New keys are inserted, rows whose content hash changed (or that were
+    tombstoned) are rewritten, and unchanged rows only get `last_seen`
+    bumped. Changed rows are stamped with the next city revision; the
+    revision itself only moves when something changed. A row that comes
+    from another city also bumps that city's revision and leaves a
+    tombstone there (see changes_since).
+
+    Returns {"inserted", "updated", "unchanged"}.
+    """
+    now = time.time() if now is None else now
+    counts = {"inserted": 0, "updated": 0, "unchanged": 0}
+    with conn:
+        rev = _next_revision(conn, city)
+        moved_from: Dict[str, int] = {}
+        for p in providers:
+            key = dedupe_key(p)
+            h = content_hash(p)
+            cur = conn.execute(
+                "SELECT id, city, content_hash, deleted FROM providers WHERE dedupe_key=?", (key,)
+            ).fetchone()
+            if cur is None:
+                conn.execute(
+                    """
+                    INSERT INTO providers (dedupe_key, city, name, address, rating, reviews, phone,
+                                           website, category, google_maps_url, latitude, longitude,
+                                           updated_at, content_hash, last_seen, rev, deleted)
+                    VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,0)
+                    """,
+                    (key, city, *_row_values(p), now, h, now, rev),
+                )
+                counts["inserted"] += 1
+            elif cur["content_hash"] != h or cur["deleted"] or cur["city"] != city:
+                conn.execute(
+                    """
+                    UPDATE providers SET
+                        city=?, name=?, address=?, rating=?, reviews=?, phone=?, website=?,
+                        category=?, google_maps_url=?, latitude=?, longitude=?,
+                        updated_at=?, content_hash=?, last_seen=?, rev=?, deleted=0
+                    WHERE id=?
+                    """,
+                    (city, *_row_values(p), now, h, now, rev, cur["id"]),
+                )
+                if cur["city"] != city:
+                    old = cur["city"]
+                    if old not in moved_from:
+                        moved_from[old] = _next_revision(conn, old)
+                    conn.execute(
+                        "INSERT OR REPLACE INTO provider_moves(dedupe_key, city, rev) VALUES (?, ?, ?)",
+                        (key, old, moved_from[old]),
+                    )
+                    # Quay lại city mà trước đó đã rời -> bỏ tombstone cũ ở city này
+                    conn.execute(
+                        "DELETE FROM provider_moves WHERE city=? AND dedupe_key=?", (city, key)
+                    )
+                counts["updated"] += 1
+            else:
+                conn.execute("UPDATE providers SET last_seen=? WHERE id=?", (now, cur["id"]))
+                counts["unchanged"] += 1
+        if counts["inserted"] or counts["updated"]:
+            _set_revision(conn, city, rev, now)
+        for old, old_rev in moved_from.items():
+            _set_revision(conn, old, old_rev, now)
+    return counts
+
+
+def upsert_providers(conn: sqlite3.Connection, city: str,
+                     providers: Iterable[Dict[str, Any]]) -> Tuple[int, int]:
+    """
+    Insert or update providers of a city in one transaction.
+    Returns (inserted, updated); unchanged rows are not counted as updated.
+    """
+    d = apply_diff(conn, city, providers)
+    return d["inserted"], d["updated"]
+
+
+def tombstone_unseen(conn: sqlite3.Connection, city: str, before: float,
+                     now: Optional[float] = None) -> int:
+    """Mark live providers of a city not seen since `before` as deleted. Returns how many."""
+    now = time.time() if now is None else now
+    with conn:
+        rev = _next_revision(conn, city)
+        n = conn.execute(
+            "UPDATE providers SET deleted=1, rev=?, updated_at=? "
+            "WHERE city=? AND deleted=0 AND last_seen < ?",
+            (rev, now, city, before),
+        ).rowcount
+        if n:
+            _set_revision(conn, city, rev, now)
+    return n
+
+
+def changes_since(conn: sqlite3.Connection, city: str,
+                  rev: int) -> Tuple[List[Dict[str, Any]], List[str]]:
+    """
+    Rows of a city touched after revision `rev`: (live providers, tombstoned
+    dedupe keys). Providers that moved to another city after `rev` are
+    reported as tombstoned too.
+    """
+    upserts: List[Dict[str, Any]] = []
+    deleted: List[str] = []
+    for r in conn.execute(
+        "SELECT * FROM providers WHERE city=? AND rev>? ORDER BY id", (city, int(rev))
+    ):
+        if r["deleted"]:
+            deleted.append(r["dedupe_key"])
+        else:
+            upserts.append(row_to_provider(r))
+    deleted += [
+        r["dedupe_key"]
+        for r in conn.execute(
+            "SELECT dedupe_key FROM provider_moves WHERE city=? AND rev>? ORDER BY rev", (city, int(rev))
+        )
+    ]
+    return upserts, deleted
+
+
+def record_fetch(conn: sqlite3.Connection, city: str, term: str, items: int,
+                 now: Optional[float] = None) -> None:
+    with conn:
+        conn.execute(
+            "INSERT INTO fetch_log(city, term, fetched_at, items) VALUES (?, ?, ?, ?) "
+            "ON CONFLICT(city, term) DO UPDATE SET fetched_at=excluded.fetched_at, items=excluded.items",
+            (city, term, time.time() if now is None else now, int(items)),
+        )
+
+
+def stale_terms(conn: sqlite3.Connection, city: str, terms: Iterable[str],
+                max_age_s: float, now: Optional[float] = None) -> List[str]:
+    """Terms of a city never fetched, or last fetched more than max_age_s ago."""
+    now = time.time() if now is None else now
+    last = {
+        r["term"]: r["fetched_at"]
+        for r in conn.execute("SELECT term, fetched_at FROM fetch_log WHERE city=?", (city,))
+    }
+    return [t for t in terms if t not in last or now - last[t] > max_age_s]
+
+
+def row_to_provider(row: sqlite3.Row) -> Dict[str, Any]:
+    return {k: row[k] for k in PROVIDER_FIELDS}
+
+
+def city_revision(conn: sqlite3.Connection, city: str) -> Optional[int]:
+    """Revision counter of a city, or None if the catalog has never seen it."""
+    row = conn.execute("SELECT revision FROM catalog_cities WHERE city=?", (city,)).fetchone()
+    return row["revision"] if row else None
+
+
+def national_revision(conn: sqlite3.Connection) -> int:
+    """Catalog-wide counter bumped with every city revision (0 if nothing was written yet)."""
+    row = conn.execute("SELECT value FROM catalog_meta WHERE key='revision'").fetchone()
+    return row["value"] if row else 0
+
+
+def cities(conn: sqlite3.Connection) -> List[str]:
+    return [r["city"] for r in conn.execute("SELECT city FROM catalog_cities ORDER BY city")]
+
+
+def query_providers(conn: sqlite3.Connection, city: Optional[str] = None,
+                    category_like: Optional[str] = None,
+                    limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Filter providers with indexed SQL predicates, in insertion order."""
+    sql = "SELECT * FROM providers WHERE deleted=0"
+    args: List[Any] = []
+    if city is not None:
+        sql += " AND city=?"
+        args.append(city)
+    if category_like:
+        sql += " AND category LIKE ?"
+        args.append(f"%{category_like}%")
+    sql += " ORDER BY id"
+    if limit:
+        sql += " LIMIT ?"
+        args.append(int(limit))
+    return [row_to_provider(r) for r in conn.execute(sql, args)]
+
+
+def _fts_query(text: str) -> str:
+    """Turn free text into an FTS5 prefix query: each word quoted and starred."""
+    words = [w.replace('"', "") for w in text.split()]
+    return " ".join(f'"{w}"*' for w in words if w)
+
+
+def search(conn: sqlite3.Connection, text: str, city: Optional[str] = None,
+           limit: int = 20) -> List[Dict[str, Any]]:
+    """Full-text search over name, address and category, best bm25 first."""
+    q = _fts_query(text)
+    if not q:
+        return []
+    sql = (
+        "SELECT p.* FROM providers_fts f JOIN providers p ON p.id = f.rowid "
+        "WHERE providers_fts MATCH ? AND p.deleted=0"
+    )
+    args: List[Any] = [q]
+    if city is not None:
+        sql += " AND p.city=?"
+        args.append(city)
+    sql += " ORDER BY bm25(providers_fts) LIMIT ?"
+    args.append(int(limit))
+    return [row_to_provider(r) for r in conn.execute(sql, args)]
+
+
+# ---------------------------
+# JSON import / export
+# ---------------------------
+
+def import_json(conn: sqlite3.Connection, city: str, path: str) -> Tuple[int, int]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return upsert_providers(conn, city, [p for p in data if isinstance(p, dict)])
+
+
+def export_json(conn: sqlite3.Connection, city: str, out_path: str) -> int:
+    """Write a city's providers to JSON atomically (same format as database_fetcher)."""
+    data = query_providers(conn, city=city)
+    dir_name = os.path.dirname(out_path) or "."
+    os.makedirs(dir_name, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix=".tmp_", dir=dir_name, text=True)
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+        os.replace(tmp_path, out_path)
+    except Exception:
+        try:
+            os.remove(tmp_path)
+        except Exception:
+            pass
+        raise
+    return len(data)
+
+
+def city_from_filename(fname: str) -> str:
+    """'Ho_Chi_Minh_City_therapists.json' -> 'Ho Chi Minh City'."""
+    stem = os.path.basename(fname)
+    if stem.endswith("_therapists.json"):
+        stem = stem[: -len("_therapists.json")]
+    return stem.replace("_", " ")
+
+
+def _main() -> None:
+    parser = argparse.ArgumentParser(description="Provider catalog (SQLite + FTS5)")
+    parser.add_argument("--db", default=None, help="Catalog path (default: database/providers.sqlite3)")
+    sub = parser.add_subparsers(dest="cmd", required=True)
+
+    p_imp = sub.add_parser("import", help="Import database/*_therapists.json")
+    p_imp.add_argument("--dir", default=os.path.join(os.path.dirname(__file__), "database"))
+
+    p_exp = sub.add_parser("export", help="Export every city to <City>_therapists.json")
+    p_exp.add_argument("--outdir", default=os.path.join(os.path.dirname(__file__), "database"))
+
+    p_s = sub.add_parser("search", help="Full-text search")
+    p_s.add_argument("text")
+    p_s.add_argument("--city", default=None)
+    p_s.add_argument("--limit", type=int, default=10)
+
+    args = parser.parse_args()
+    conn = connect(args.db)
+
+    if args.cmd == "import":
+        for fname in sorted(os.listdir(args.dir)):
+            if not fname.endswith("_therapists.json"):
+                continue
+            city = city_from_filename(fname)
+            ins, upd = import_json(conn, city, os.path.join(args.dir, fname))
+            print(f"[Import] {city}: +{ins} new, {upd} updated")
+    elif args.cmd == "export":
+        for city in cities(conn):
+            out_path = os.path.join(args.outdir, f"{city.replace(' ', '_')}_therapists.json")
+            n = export_json(conn, city, out_path)
+            print(f"[Export] {city}: {n} providers -> {out_path}")
+    elif args.cmd == "search":
+        for p in search(conn, args.text, city=args.city, limit=args.limit):
+            print(f"- {p['name']} | {p['category']} | {p['address']}")
+
+
+if __name__ == "__main__":
+    _main()
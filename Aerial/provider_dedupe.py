@@ -0,0 +1,308 @@
+"""
+Fuzzy provider deduplication
+============================
+
+SerpAPI returns the same clinic for several search terms with slightly
+different strings ("Phòng khám Tâm lý An Nhiên" / "Phong Kham Tam Ly An
+Nhien - Quận 3"), so exact (name, address) matching keeps both.
+
+Pairs are only compared inside blocks, so the cost grows with the number of
+records plus the (small) block sizes instead of n²:
+
+- exact block: same `dedupe_key` -> always merged (old behaviour)
+- phone block: same normalized phone number
+- geo block: same or adjacent geohash cell (precision 7, ≈150 m)
+
+Inside a block a pair is merged when the accent-folded names are similar
+enough (difflib ratio, also on sorted tokens) and the places are close.
+Matches are joined with union-find, so A~B and B~C end up in one cluster.
+
+A merged record keeps the name and address (hence the catalog key) of one
+member chosen independently of review counts: the provider already in the
+catalog if the cluster has one, else the smallest key. Fresh results are
+clustered together with the city's catalog rows they share a block with
+(`KnownProviders`), so a clinic found by another search term, or in an
+earlier run, keeps its row.
+"""
+
+from __future__ import annotations
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+try:
+    from .geo import geohash_cell, haversine_km, valid_coords
+    from .locations import fold
+    from .provider_catalog import dedupe_key
+except ImportError:  # chạy trực tiếp bằng CLI
+    from geo import geohash_cell, haversine_km, valid_coords
+    from locations import fold
+    from provider_catalog import dedupe_key
+
+GEOHASH_PRECISION = 7
+GEO_MAX_KM = 0.15          # cùng toạ độ Google Maps, chỉ lệch vài chục mét
+GEO_NAME_MIN = 0.80        # tên gần giống + gần nhau -> cùng một nơi
+PHONE_NAME_MIN = 0.50      # trùng số điện thoại thì chấp nhận tên khác nhiều hơn
+PHONE_MAX_KM = 2.0         # chuỗi phòng khám dùng chung hotline nhưng khác chi nhánh
+MAX_BLOCK = 200            # block lớn hơn (vd. tổng đài chung) bị bỏ qua
+
+_PAREN_RE = re.compile(r"\([^)]*\)")
+_NON_ALNUM_RE = re.compile(r"[^a-z0-9]+")
+
+
+def normalize_name(name: Any) -> str:
+    """Accent-folded, lowercase, punctuation-free name; parenthesised notes dropped."""
+    if not isinstance(name, str):
+        return ""
+    s = fold(_PAREN_RE.sub(" ", name))
+    return " ".join(_NON_ALNUM_RE.sub(" ", s).split())
+
+
+def normalize_phone(phone: Any) -> Optional[str]:
+    """Digits only, +84 / 84 country code -> leading 0. None if too short to be useful."""
+    if not isinstance(phone, str):
+        return None
+    digits = re.sub(r"\D", "", phone)
+    if digits.startswith("84") and len(digits) >= 11:
+        digits = "0" + digits[2:]
+    return digits if len(digits) >= 9 else None
+
+
+def name_similarity(a: str, b: str) -> float:
+    """Best of difflib ratio on the raw normalized names and on their sorted tokens."""
+    if not a or not b:
+        return 0.0
+    if a == b:
+        return 1.0
+    best = SequenceMatcher(None, a, b).ratio()
+    ta, tb = " ".join(sorted(a.split())), " ".join(sorted(b.split()))
+    if ta != a or tb != b:
+        best = max(best, SequenceMatcher(None, ta, tb).ratio())
+    return best
+
+
+def _ratio_upper_bound(a: str, b: str) -> float:
+    """difflib ratio can never exceed 2*min/(la+lb); lets us skip hopeless pairs cheaply."""
+    la, lb = len(a), len(b)
+    return 2.0 * min(la, lb) / (la + lb) if la + lb else 0.0
+
+
+class UnionFind:
+    def __init__(self, n: int):
+        self.parent = list(range(n))
+
+    def find(self, x: int) -> int:
+        root = x
+        while self.parent[root] != root:
+            root = self.parent[root]
+        while self.parent[x] != root:  # nén đường đi
+            self.parent[x], x = root, self.parent[x]
+        return root
+
+    def union(self, a: int, b: int) -> None:
+        ra, rb = self.find(a), self.find(b)
+        if ra != rb:
+            # gốc nhỏ hơn thắng -> đại diện cụm là bản ghi xuất hiện trước
+            if ra < rb:
+                self.parent[rb] = ra
+            else:
+                self.parent[ra] = rb
+
+
+class _Rec:
+    __slots__ = ("name", "phone", "coord")
+
+    def __init__(self, p: Dict[str, Any]):
+        self.name = normalize_name(p.get("name"))
+        self.phone = normalize_phone(p.get("phone"))
+        lat, lon = p.get("latitude"), p.get("longitude")
+        self.coord: Optional[Tuple[float, float]] = (lat, lon) if valid_coords(lat, lon) else None
+
+
+def _distance(a: _Rec, b: _Rec) -> Optional[float]:
+    if a.coord is None or b.coord is None:
+        return None
+    return haversine_km(a.coord[0], a.coord[1], b.coord[0], b.coord[1])
+
+
+def _geo_match(a: _Rec, b: _Rec) -> bool:
+    d = _distance(a, b)
+    if d is None or d > GEO_MAX_KM:
+        return False
+    if _ratio_upper_bound(a.name, b.name) < GEO_NAME_MIN:
+        return False
+    return name_similarity(a.name, b.name) >= GEO_NAME_MIN
+
+
+def _phone_match(a: _Rec, b: _Rec) -> bool:
+    d = _distance(a, b)
+    if d is not None and d > PHONE_MAX_KM:
+        return False
+    if _ratio_upper_bound(a.name, b.name) < PHONE_NAME_MIN:
+        return False
+    return name_similarity(a.name, b.name) >= PHONE_NAME_MIN
+
+
+def cluster_providers(providers: List[Dict[str, Any]]) -> List[List[int]]:
+    """
+    Group indices of providers that describe the same place.
+    Clusters are ordered by their first member; members keep input order.
+    """
+    n = len(providers)
+    recs = [_Rec(p) for p in providers]
+    uf = UnionFind(n)
+
+    by_key: Dict[str, int] = {}
+    by_phone: Dict[str, List[int]] = {}
+    by_cell: Dict[Tuple[int, int], List[int]] = {}
+    for i, (p, r) in enumerate(zip(providers, recs)):
+        k = dedupe_key(p)
+        if k in by_key:
+            uf.union(by_key[k], i)
+        else:
+            by_key[k] = i
+        if r.phone:
+            by_phone.setdefault(r.phone, []).append(i)
+        if r.coord is not None:
+            by_cell.setdefault(geohash_cell(r.coord[0], r.coord[1], GEOHASH_PRECISION), []).append(i)
+
+    for members in by_phone.values():
+        if len(members) < 2 or len(members) > MAX_BLOCK:
+            continue
+        for x in range(len(members)):
+            for y in range(x + 1, len(members)):
+                i, j = members[x], members[y]
+                if uf.find(i) != uf.find(j) and _phone_match(recs[i], recs[j]):
+                    uf.union(i, j)
+
+    for (row, col), members in by_cell.items():
+        if len(members) > MAX_BLOCK:
+            continue
+        # So với ô hiện tại và 4 ô lân cận "phía sau" -> mỗi cặp ô chỉ duyệt một lần
+        for dr, dc in ((0, 0), (0, 1), (1, -1), (1, 0), (1, 1)):
+            other = members if (dr, dc) == (0, 0) else by_cell.get((row + dr, col + dc))
+            if not other or len(other) > MAX_BLOCK:
+                continue
+            for x, i in enumerate(members):
+                for j in (members[x + 1:] if other is members else other):
+                    if uf.find(i) != uf.find(j) and _geo_match(recs[i], recs[j]):
+                        uf.union(i, j)
+
+    clusters: Dict[int, List[int]] = {}
+    for i in range(n):
+        clusters.setdefault(uf.find(i), []).append(i)
+    return sorted(clusters.values(), key=lambda c: c[0])
+
+
+class KnownProviders:
+    """
+    Providers already stored for a city, indexed by the same blocks as
+    cluster_providers. A fresh page is matched against the rows sharing a
+    block with it instead of the whole city; `add` keeps the index current
+    as merged records are written.
+    """
+
+    def __init__(self, providers: Iterable[Dict[str, Any]] = ()):
+        self._by_key: Dict[str, Dict[str, Any]] = {}
+        self._blocks: Dict[str, Tuple[Optional[str], Optional[Tuple[int, int]]]] = {}
+        self._by_phone: Dict[str, set] = {}
+        self._by_cell: Dict[Tuple[int, int], set] = {}
+        for p in providers:
+            self.add(p)
+
+    def __len__(self) -> int:
+        return len(self._by_key)
+
+    @staticmethod
+    def _block_of(p: Dict[str, Any]) -> Tuple[Optional[str], Optional[Tuple[int, int]]]:
+        r = _Rec(p)
+        cell = geohash_cell(r.coord[0], r.coord[1], GEOHASH_PRECISION) if r.coord is not None else None
+        return r.phone, cell
+
+    def add(self, p: Dict[str, Any]) -> None:
+        """Insert or replace (same dedupe_key) a stored provider."""
+        key = dedupe_key(p)
+        old_phone, old_cell = self._blocks.get(key, (None, None))
+        if old_phone:
+            self._by_phone[old_phone].discard(key)
+        if old_cell is not None:
+            self._by_cell[old_cell].discard(key)
+        phone, cell = self._block_of(p)
+        self._by_key[key] = p
+        self._blocks[key] = (phone, cell)
+        if phone:
+            self._by_phone.setdefault(phone, set()).add(key)
+        if cell is not None:
+            self._by_cell.setdefault(cell, set()).add(key)
+
+    def candidates(self, providers: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Stored providers that could match one of `providers` (same key, phone or nearby cell)."""
+        keys = set()
+        for p in providers:
+            key = dedupe_key(p)
+            if key in self._by_key:
+                keys.add(key)
+            phone, cell = self._block_of(p)
+            if phone:
+                keys.update(self._by_phone.get(phone, ()))
+            if cell is not None:
+                # cả 8 ô lân cận: cặp khớp theo toạ độ có thể nằm ở ô bên cạnh
+                for dr in (-1, 0, 1):
+                    for dc in (-1, 0, 1):
+                        keys.update(self._by_cell.get((cell[0] + dr, cell[1] + dc), ()))
+        return [self._by_key[k] for k in sorted(keys)]
+
+
+def _filled(p: Dict[str, Any]) -> int:
+    return sum(1 for v in p.values() if v not in (None, "", []))
+
+
+def merge_cluster(records: List[Dict[str, Any]],
+                  anchor: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Keep the most complete record (most reviews, then most filled fields) and
+    fill its empty fields from the others; reviews takes the maximum.
+
+    Name and address come from `anchor` (default: the record with the
+    smallest dedupe_key), so the merged key does not move when review
+    counts do.
+    """
+    if anchor is None:
+        anchor = min(records, key=dedupe_key)
+    if len(records) == 1 and records[0] is anchor:
+        return anchor
+    best = max(records, key=lambda p: (p.get("reviews") or 0, _filled(p)))
+    merged = dict(best)
+    for p in records:
+        for k, v in p.items():
+            if merged.get(k) in (None, "", []) and v not in (None, "", []):
+                merged[k] = v
+    reviews = [p.get("reviews") for p in records if isinstance(p.get("reviews"), (int, float))]
+    if reviews:
+        merged["reviews"] = max(reviews)
+    merged["name"], merged["address"] = anchor.get("name"), anchor.get("address")
+    return merged
+
+
+def fuzzy_dedupe(providers: List[Dict[str, Any]],
+                 existing: Iterable[Dict[str, Any]] = ()) -> List[Dict[str, Any]]:
+    """
+    One merged record per cluster, in order of first appearance.
+
+    `existing` are providers already stored (the city's catalog rows). They
+    are clustered with `providers`, and a cluster containing one keeps its
+    key; clusters of existing rows only are not returned.
+    """
+    existing = list(existing)
+    records = existing + list(providers)
+    n_old = len(existing)
+    merged: List[Tuple[int, Dict[str, Any]]] = []
+    for c in cluster_providers(records):
+        new = [i for i in c if i >= n_old]
+        if not new:
+            continue
+        old = [records[i] for i in c if i < n_old]
+        anchor = min(old, key=dedupe_key) if old else None
+        merged.append((new[0], merge_cluster([records[i] for i in new], anchor)))
+    merged.sort(key=lambda m: m[0])
+    return [p for _, p in merged]
@@ -0,0 +1,240 @@
+"""
+Process-level provider store for the recommender
+================================================
+
+`load_city` used to reopen and re-parse the city JSON on every request.
+`ProviderStore` keeps one immutable `CitySnapshot` per city in memory:
+
+- Providers are normalized once (list fields joined into strings)
+- Fields used by scoring are precomputed (lowercased category, site text,
+  numeric rating/reviews)
+- The snapshot is rebuilt when the source version changes (JSON file mtime,
+  or the catalog's per-city revision); the new snapshot is fully built before
+  it replaces the old one, so concurrent requests see either the old or the
+  new city, never a half-loaded one
+- With a `delta_loader`, a version change is applied as a patch: only the
+  rows changed since the held version are re-normalized, the rest of the
+  snapshot is reused
+"""
+
+from __future__ import annotations
+import os, json, threading
+from dataclasses import dataclass
+from typing import Callable, Dict, Any, List, Tuple, Optional
+
+try:
+    from .provider_ranking import ProviderColumns, build_columns
+    from .provider_catalog import dedupe_key
+except ImportError:  # chạy trực tiếp bằng CLI
+    from provider_ranking import ProviderColumns, build_columns
+    from provider_catalog import dedupe_key
+
+LIST_FIELDS = ("category", "website", "address")
+
+
+def _as_lower_text(v) -> str:
+    if v is None:
+        return ""
+    if isinstance(v, list):
+        return " ".join(str(x) for x in v if x is not None).lower()
+    return str(v).lower()
+
+
+def _to_float(v) -> float:
+    try:
+        return float(v or 0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(v) -> int:
+    try:
+        return int(v or 0)
+    except (TypeError, ValueError):
+        return 0
+
+
+def normalize_provider(p: Dict[str, Any]) -> Dict[str, Any]:
+    """Join list-valued text fields into plain strings (same rule as the old load_city)."""
+    q = dict(p)
+    for k in LIST_FIELDS:
+        if isinstance(q.get(k), list):
+            q[k] = " ".join(str(x) for x in q[k] if x)
+    return q
+
+
+@dataclass(frozen=True)
+class CitySnapshot:
+    """Immutable, fully-built view of one city's providers."""
+    city: str
+    source: str        # đường dẫn JSON hoặc "catalog"
+    version: Any       # mtime_ns của file / revision của catalog
+    providers: Tuple[Dict[str, Any], ...]
+    category_l: Tuple[str, ...]
+    site_text: Tuple[str, ...]
+    rating: Tuple[float, ...]
+    reviews: Tuple[int, ...]
+    columns: Optional[ProviderColumns] = None  # None nếu không có numpy
+    keys: Tuple[str, ...] = ()                 # dedupe_key từng dòng, dùng khi vá snapshot
+
+    def __len__(self) -> int:
+        return len(self.providers)
+
+
+_Row = Tuple[Dict[str, Any], str, str, float, int, str]
+
+
+def _derive(p: Dict[str, Any]) -> _Row:
+    """(provider, category_l, site_text, rating, reviews, key) for one raw provider."""
+    q = normalize_provider(p)
+    return (
+        q,
+        _as_lower_text(q.get("category")),
+        _as_lower_text(q.get("website")) + " " + _as_lower_text(q.get("name")),
+        _to_float(q.get("rating")),
+        _to_int(q.get("reviews")),
+        dedupe_key(q),
+    )
+
+
+def _assemble(city: str, source: str, version: Any, rows: List[_Row]) -> CitySnapshot:
+    providers = tuple(r[0] for r in rows)
+    category_l = tuple(r[1] for r in rows)
+    site_text = tuple(r[2] for r in rows)
+    rating = tuple(r[3] for r in rows)
+    reviews = tuple(r[4] for r in rows)
+    return CitySnapshot(
+        city=city,
+        source=source,
+        version=version,
+        providers=providers,
+        category_l=category_l,
+        site_text=site_text,
+        rating=rating,
+        reviews=reviews,
+        columns=build_columns([p.get("city") for p in providers], category_l, site_text, rating, reviews),
+        keys=tuple(r[5] for r in rows),
+    )
+
+
+def build_snapshot(city: str, source: str, version: Any, raw: List[Dict[str, Any]]) -> CitySnapshot:
+    return _assemble(city, source, version, [_derive(p) for p in raw if isinstance(p, dict)])
+
+
+def patch_snapshot(snap: CitySnapshot, version: Any, upserts: List[Dict[str, Any]],
+                   deleted_keys: List[str]) -> CitySnapshot:
+    """
+    New snapshot = `snap` with changed rows replaced, new rows appended and
+    tombstoned rows dropped. Unchanged rows keep their derived fields.
+    Applying the same delta twice gives the same result.
+    """
+    rows: List[Optional[_Row]] = [
+        (p, snap.category_l[i], snap.site_text[i], snap.rating[i], snap.reviews[i], snap.keys[i])
+        for i, p in enumerate(snap.providers)
+    ]
+    pos = {k: i for i, k in enumerate(snap.keys)}
+    for p in upserts:
+        row = _derive(p)
+        i = pos.get(row[5])
+        if i is None:
+            pos[row[5]] = len(rows)
+            rows.append(row)
+        else:
+            rows[i] = row
+    for k in deleted_keys:
+        i = pos.get(k)
+        if i is not None:
+            rows[i] = None
+    return _assemble(snap.city, snap.source, version, [r for r in rows if r is not None])
+
+
+def load_json(path: str) -> List[Dict[str, Any]]:
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return data if isinstance(data, list) else []
+
+
+def json_source(resolve_path: Callable[[str], str]) -> Callable[[str], Tuple[str, Any]]:
+    """Source resolver for plain JSON files: (path, mtime_ns)."""
+    def resolve(city: str) -> Tuple[str, Any]:
+        path = resolve_path(city)
+        return path, os.stat(path).st_mtime_ns
+    return resolve
+
+
+class ProviderStore:
+    """
+    Cache of CitySnapshot objects keyed by city.
+
+    resolve_source: city -> (source, version); must be cheap, it runs per request
+    loader: (city, source) -> raw provider dicts
+    delta_loader: (city, source, old_version) -> (upserts, deleted keys), or None
+        when the source cannot produce a delta (the city is then fully reloaded)
+    """
+
+    def __init__(self, resolve_source: Callable[[str], Tuple[str, Any]],
+                 loader: Callable[[str, str], List[Dict[str, Any]]] = lambda city, path: load_json(path),
+                 delta_loader: Optional[Callable[[str, str, Any],
+                                                 Optional[Tuple[List[Dict[str, Any]], List[str]]]]] = None):
+        self._resolve_source = resolve_source
+        self._loader = loader
+        self._delta_loader = delta_loader
+        self._snapshots: Dict[str, CitySnapshot] = {}
+        self._locks: Dict[str, threading.Lock] = {}
+        self._locks_guard = threading.Lock()
+        self.reloads = 0
+        self.patches = 0
+
+    def _lock_for(self, city: str) -> threading.Lock:
+        with self._locks_guard:
+            lock = self._locks.get(city)
+            if lock is None:
+                lock = self._locks[city] = threading.Lock()
+            return lock
+
+    def get(self, city: str) -> CitySnapshot:
+        """Return the current snapshot, reloading only if the source changed."""
+        source, version = self._resolve_source(city)
+        snap = self._snapshots.get(city)
+        if snap is not None and snap.source == source and snap.version == version:
+            return snap
+
+        with self._lock_for(city):
+            # Một request khác có thể vừa nạp xong trong lúc chờ lock
+            snap = self._snapshots.get(city)
+            if snap is not None and snap.source == source and snap.version == version:
+                return snap
+            fresh = self._patched(snap, city, source, version)
+            if fresh is None:
+                fresh = build_snapshot(city, source, version, self._loader(city, source))
+                self.reloads += 1
+            self._snapshots[city] = fresh  # thay tham chiếu một lần -> atomic với reader
+            return fresh
+
+    def _patched(self, snap: Optional[CitySnapshot], city: str, source: str,
+                 version: Any) -> Optional[CitySnapshot]:
+        if self._delta_loader is None or snap is None or snap.source != source:
+            return None
+        delta = self._delta_loader(city, source, snap.version)
+        if delta is None:
+            return None
+        upserts, deleted = delta
+        self.patches += 1
+        return patch_snapshot(snap, version, upserts, deleted)
+
+    def peek(self, city: str) -> Optional[CitySnapshot]:
+        """Current snapshot without checking the source."""
+        return self._snapshots.get(city)
+
+    def invalidate(self, city: Optional[str] = None) -> None:
+        if city is None:
+            self._snapshots.clear()
+        else:
+            self._snapshots.pop(city, None)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "cities": {c: len(s) for c, s in self._snapshots.items()},
+            "reloads": self.reloads,
+            "patches": self.patches,
+        }
@@ -0,0 +1,142 @@
+"""
+Multi-pattern substring matcher (Aho–Corasick)
+==============================================
+
+`PatternAutomaton` compiles a list of (pattern, payload) pairs once into a
+deterministic automaton: one dict lookup per input character, whatever the
+number of patterns, and every occurrence is reported (overlapping ones too),
+exactly like running `pattern in text` for each pattern.
+
+`MultiScanner` drives several automata over one text in a single pass,
+each seeing the characters through its own mapping (e.g. accent folding).
+Its transitions are built lazily on the product of the automata states and
+memoized, so after warm-up a character costs one dict lookup in total.
+"""
+
+from __future__ import annotations
+import threading
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Set, Tuple
+
+
+class PatternAutomaton:
+    def __init__(self, patterns: Iterable[Tuple[str, Any]]):
+        self.patterns: List[str] = []
+        self.payloads: List[Any] = []
+        goto: List[Dict[str, int]] = [{}]
+        out: List[List[int]] = [[]]
+        for pat, payload in patterns:
+            if not pat:
+                continue
+            state = 0
+            for ch in pat:
+                nxt = goto[state].get(ch)
+                if nxt is None:
+                    nxt = goto[state][ch] = len(goto)
+                    goto.append({})
+                    out.append([])
+                state = nxt
+            out[state].append(len(self.patterns))
+            self.patterns.append(pat)
+            self.payloads.append(payload)
+
+        # BFS: fail link + bảng chuyển đầy đủ (delta[s] kế thừa delta[fail[s]])
+        fail = [0] * len(goto)
+        delta: List[Dict[str, int]] = [dict(goto[0])] + [{} for _ in range(len(goto) - 1)]
+        queue = deque(goto[0].values())
+        while queue:
+            s = queue.popleft()
+            out[s].extend(out[fail[s]])
+            delta[s] = dict(delta[fail[s]])
+            delta[s].update(goto[s])
+            for ch, nxt in goto[s].items():
+                fail[nxt] = delta[fail[s]].get(ch, 0) if s else 0
+                queue.append(nxt)
+
+        self.delta = delta
+        self.out: List[Tuple[int, ...]] = [tuple(o) for o in out]
+
+    def __len__(self) -> int:
+        return len(self.patterns)
+
+    def match_ids(self, text: str) -> Set[int]:
+        """Ids of every pattern occurring in text."""
+        delta, out = self.delta, self.out
+        found: Set[int] = set()
+        state = 0
+        for ch in text:
+            state = delta[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+    def match_payloads(self, text: str) -> List[Any]:
+        """Payloads of every pattern occurring in text, in pattern order."""
+        return [self.payloads[i] for i in sorted(self.match_ids(text))]
+
+
+_Emit = Optional[Tuple[Tuple[int, ...], ...]]
+
+
+class MultiScanner:
+    """
+    Run several PatternAutomaton over the same text in one pass.
+
+    char_maps[i] turns one input character into the characters automaton i
+    sees ("" drops it); None means the character as is.
+    """
+
+    def __init__(self, automata: Sequence[PatternAutomaton],
+                 char_maps: Sequence[Optional[Callable[[str], str]]]):
+        self.automata = list(automata)
+        self.char_maps = list(char_maps)
+        zero = tuple(0 for _ in self.automata)
+        self._states: List[Tuple[int, ...]] = [zero]
+        self._index: Dict[Tuple[int, ...], int] = {zero: 0}
+        self._trans: List[Dict[str, Tuple[int, _Emit]]] = [{}]
+        self._lock = threading.Lock()
+
+    def _state_id(self, comp: Tuple[int, ...]) -> int:
+        with self._lock:
+            sid = self._index.get(comp)
+            if sid is None:
+                sid = self._index[comp] = len(self._states)
+                self._states.append(comp)
+                self._trans.append({})
+            return sid
+
+    def _step(self, sid: int, ch: str) -> Tuple[int, _Emit]:
+        comp = list(self._states[sid])
+        emitted: List[Tuple[int, ...]] = []
+        any_hit = False
+        for i, ac in enumerate(self.automata):
+            cmap = self.char_maps[i]
+            hits: List[int] = []
+            s = comp[i]
+            for c in (cmap(ch) if cmap else ch):
+                s = ac.delta[s].get(c, 0)
+                hits.extend(ac.out[s])
+            comp[i] = s
+            emitted.append(tuple(hits))
+            any_hit = any_hit or bool(hits)
+        result = (self._state_id(tuple(comp)), tuple(emitted) if any_hit else None)
+        self._trans[sid][ch] = result
+        return result
+
+    def scan(self, text: str) -> List[Set[int]]:
+        """Matched pattern ids, one set per automaton."""
+        trans = self._trans
+        emits = []
+        sid = 0
+        for ch in text:
+            try:
+                sid, emit = trans[sid][ch]
+            except KeyError:
+                sid, emit = self._step(sid, ch)
+            if emit is not None:
+                emits.append(emit)
+        found: List[Set[int]] = [set() for _ in self.automata]
+        for emit in emits:
+            for f, ids in zip(found, emit):
+                f.update(ids)
+        return found
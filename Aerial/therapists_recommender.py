@@ -36,11 +36,29 @@ How to Use
 """
 
 from __future__ import annotations
-import os, json, re, unicodedata
-from typing import Dict, Any, List
+import os, json, re, heapq, threading, unicodedata
+from dataclasses import dataclass
+from typing import Dict, Any, List, Tuple
 from functools import lru_cache
 from dotenv import load_dotenv
 
+try:
+    from .analysis_cache import open_default_cache
+    from .provider_store import ProviderStore, CitySnapshot, json_source, load_json
+    from . import provider_catalog as catalog
+    from .provider_ranking import score_columns, top_k_indices
+    from .geo import GridIndex, haversine_km
+    from .locations import resolve_location, PROVINCE_CENTROIDS, DISTRICT_CENTROIDS
+    from .text_matcher import PatternAutomaton, MultiScanner
+except ImportError:  # chạy trực tiếp bằng CLI
+    from analysis_cache import open_default_cache
+    from provider_store import ProviderStore, CitySnapshot, json_source, load_json
+    import provider_catalog as catalog
+    from provider_ranking import score_columns, top_k_indices
+    from geo import GridIndex, haversine_km
+    from locations import resolve_location, PROVINCE_CENTROIDS, DISTRICT_CENTROIDS
+    from text_matcher import PatternAutomaton, MultiScanner
+
 # -----------------------------------------------------------------------------
 # Utility: Accent removal (for Vietnamese text normalization)
 # -----------------------------------------------------------------------------
@@ -67,8 +85,10 @@ def _init_gemini():
         raise SystemExit("Missing API key. Add GEMINI_API_KEY to your .env file.")
 
     genai.configure(api_key=api_key)
-    model_name = os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
-    return genai.GenerativeModel(model_name)
+    return genai.GenerativeModel(_model_name())
+
+def _model_name() -> str:
+    return os.getenv("GEMINI_MODEL", "gemini-2.5-pro")
 
 # -----------------------------------------------------------------------------
 # Language Detection
@@ -78,9 +98,7 @@ _VI_HINTS = {"tôi","mình","ở","bác sĩ","tâm lý","tâm thần","trực ti
 
 def detect_language(text: str) -> str:
     """Detects whether the text is likely English or Vietnamese."""
-    t = text.lower()
-    en_hits = sum(1 for w in _EN_WORDS if w in t)
-    vi_hits = sum(1 for w in _VI_HINTS if w in t)
+    _, en_hits, vi_hits = _scan_hints(text)
     if en_hits > vi_hits:
         return "en"
     if vi_hits > en_hits:
@@ -165,21 +183,48 @@ CITY_ALIASES = {
     "da nang": HUB_DN, "thanh pho da nang": HUB_DN,
 }
 
+REGION_ALIAS = {"mien bac": HUB_HANOI, "mien trung": HUB_DN, "mien nam": HUB_HCMC}
+
+def _district_hubs() -> Dict[str, str]:
+    """Every district in locations.DISTRICT_CENTROIDS -> the closest hub."""
+    hub_points = {
+        HUB_HCMC: PROVINCE_CENTROIDS["Hồ Chí Minh"],
+        HUB_HANOI: PROVINCE_CENTROIDS["Hà Nội"],
+        HUB_DN: PROVINCE_CENTROIDS["Đà Nẵng"],
+    }
+    return {
+        d: min(hub_points, key=lambda h: haversine_km(lat, lon, *hub_points[h]))
+        for d, (lat, lon) in DISTRICT_CENTROIDS.items()
+    }
+
+# Thứ tự pattern = thứ tự ưu tiên cũ: CITY_ALIASES > PROVINCE_TO_HUB > SUBREGION_ALIAS
+# > miền; quận/huyện mới thêm xếp cuối để không đổi kết quả cũ. Rank thấp nhất thắng.
+_LOCATION_AC = PatternAutomaton(
+    list(CITY_ALIASES.items())
+    + list(PROVINCE_TO_HUB.items())
+    + list(SUBREGION_ALIAS.items())
+    + list(REGION_ALIAS.items())
+    + list(_district_hubs().items())
+)
+_LANG_AC = PatternAutomaton([(w, "en") for w in _EN_WORDS] + [(w, "vi") for w in _VI_HINTS])
+# Địa danh khớp trên chữ đã bỏ dấu (từng ký tự, "" với dấu rời), ngôn ngữ trên chữ thường
+_HINT_SCANNER = MultiScanner([_LOCATION_AC, _LANG_AC], [_deaccent, None])
+
+@lru_cache(maxsize=512)
+def _scan_hints(text: str) -> Tuple[str | None, int, int]:
+    """
+    One pass over the lowercased text for location and language hints.
+    Returns (hub or None, english hits, vietnamese hits).
+    """
+    loc_ids, lang_ids = _HINT_SCANNER.scan((text or "").lower())
+    hub = _LOCATION_AC.payloads[min(loc_ids)] if loc_ids else None
+    en_hits = sum(1 for i in lang_ids if _LANG_AC.payloads[i] == "en")
+    return hub, en_hits, len(lang_ids) - en_hits
+
 def resolve_nearest_major_city(user_text: str) -> str:
     """Return the most likely major city hub (HCMC/Hanoi/Da Nang)."""
-    raw = (user_text or "").lower()
-    t = _deaccent(raw)
-
-    for k, hub in CITY_ALIASES.items():
-        if k in t: return hub
-    for prov, hub in PROVINCE_TO_HUB.items():
-        if prov in t: return hub
-    for sub, hub in SUBREGION_ALIAS.items():
-        if sub in t: return hub
-    if "mien bac" in t: return HUB_HANOI
-    if "mien trung" in t: return HUB_DN
-    if "mien nam" in t: return HUB_HCMC
-    return HUB_HCMC
+    hub, _, _ = _scan_hints(user_text or "")
+    return hub or HUB_HCMC
 
 # -----------------------------------------------------------------------------
 # Gemini-based Needs Extraction
@@ -195,12 +240,29 @@ ANALYZE_SYS_PROMPT = (
 def _cached_model():
     return _init_gemini()
 
-def analyze_user_text(text: str) -> Dict[str, Any]:
-    """Parse user input using Gemini + heuristic fallbacks."""
-    lang = detect_language(text)
-    user_tl = text.lower()
-    model = _cached_model()
+@lru_cache(maxsize=1)
+def _analysis_cache():
+    return open_default_cache(ANALYZE_SYS_PROMPT)
+
+def normalize_query_text(text: str) -> str:
+    """Cache key text: deaccented, lowercased, whitespace-collapsed."""
+    return " ".join(_deaccent(text or "").lower().split())
+
+def analysis_cache_stats() -> Dict[str, Any]:
+    """Statistics of the analyze_user_text cache (for /api/health)."""
+    return _analysis_cache().stats()
 
+def _gemini_payload(text: str, lang: str) -> Dict[str, Any]:
+    """Ask Gemini for the structured needs JSON; cached per normalized text + model + language hint."""
+    cache = _analysis_cache()
+    key_text = normalize_query_text(text)
+    model_name = _model_name()
+    # lang đi vào prompt -> phải nằm trong khóa, nếu không có thể trả kết quả sai ngôn ngữ
+    cached = cache.get(key_text, model_name, lang)
+    if cached is not None:
+        return cached
+
+    model = _cached_model()
     user_msg = (
         f"{ANALYZE_SYS_PROMPT}\nUser language hint: {lang}.\nInput:\n{text.strip()}"
     )
@@ -217,7 +279,16 @@ def analyze_user_text(text: str) -> Dict[str, Any]:
                 pass
 
     if not payload or not isinstance(payload, dict):
-        payload = {}
+        return {}
+    # Chỉ cache khi Gemini trả JSON hợp lệ
+    cache.put(key_text, model_name, payload, lang)
+    return payload
+
+def analyze_user_text(text: str) -> Dict[str, Any]:
+    """Parse user input using Gemini + heuristic fallbacks."""
+    lang = detect_language(text)
+    user_tl = text.lower()
+    payload = _gemini_payload(text, lang)
 
     out = {
         "city": _coerce_str(payload.get("city")),
@@ -242,53 +313,104 @@ def _safe(s: str) -> str:
     s = re.sub(r"[^a-z0-9]+", "_", s.lower())
     return s.strip("_")
 
+def _find_city_file(city: str) -> str | None:
+    """Locate <city>_therapists.json; file names may keep the fetcher's casing (Da_Nang_...)."""
+    target = f"{_safe(city)}_therapists.json"
+    path = os.path.join(DB_DIR, target)
+    if os.path.exists(path):
+        return path
+    if os.path.isdir(DB_DIR):
+        for name in os.listdir(DB_DIR):
+            if name.lower() == target:
+                return os.path.join(DB_DIR, name)
+    return None
+
 def ensure_city_database(city: str) -> str:
     """Ensure a city-specific JSON database exists; build if missing."""
-    path = os.path.join(DB_DIR, f"{_safe(city)}_therapists.json")
-    if os.path.exists(path):
+    path = _find_city_file(city)
+    if path:
         return path
     from database_fetcher import build_city
     os.makedirs(DB_DIR, exist_ok=True)
     build_city(city)
-    return path
+    return _find_city_file(city) or os.path.join(DB_DIR, f"{_safe(city)}_therapists.json")
+
+_catalog_local = threading.local()
+_catalog_lock = threading.Lock()
+_catalog_ready = False
+
+def _catalog_conn():
+    """
+    Per-thread read connection to the provider catalog, or None if it was never built.
+    Schema and migrations run once per process; threads then open plain connections.
+    """
+    global _catalog_ready
+    conn = getattr(_catalog_local, "conn", None)
+    if conn is None:
+        if not _catalog_ready:
+            with _catalog_lock:
+                if not _catalog_ready:
+                    if not os.path.exists(catalog.catalog_path()):
+                        return None
+                    catalog.connect().close()
+                    _catalog_ready = True
+        conn = _catalog_local.conn = catalog.open_reader()
+    return conn
+
+def _provider_source(city: str) -> Tuple[str, Any]:
+    """Catalog (versioned by city revision) when it knows the city, else the JSON file (mtime)."""
+    conn = _catalog_conn()
+    if conn is not None:
+        rev = catalog.city_revision(conn, city)
+        if rev is not None:
+            return "catalog", rev
+    return _json_source(city)
+
+def _load_providers(city: str, source: str) -> List[Dict[str, Any]]:
+    if source == "catalog":
+        # Lọc theo city bằng index thay vì đọc cả file
+        return catalog.query_providers(_catalog_conn(), city=city)
+    return load_json(source)
+
+def _load_changes(city: str, source: str, since: Any):
+    """Rows changed after revision `since` (catalog only; JSON files are reloaded whole)."""
+    if source != "catalog" or not isinstance(since, int):
+        return None
+    return catalog.changes_since(_catalog_conn(), city, since)
+
+_json_source = json_source(ensure_city_database)
+
+# Mỗi process chỉ nạp một city một lần; revision đổi -> chỉ vá các dòng thay đổi,
+# mtime JSON đổi -> nạp lại cả file
+PROVIDER_STORE = ProviderStore(_provider_source, _load_providers, _load_changes)
+
+def city_snapshot(city: str) -> CitySnapshot:
+    """Return the in-memory, pre-normalized providers of a city."""
+    return PROVIDER_STORE.get(city)
 
 def load_city(city: str) -> List[Dict[str, Any]]:
     """Load and normalize provider data from a JSON city database."""
-    path = ensure_city_database(city)
-    with open(path, "r", encoding="utf-8") as f:
-        data = json.load(f)
-    normed = []
-    for p in data:
-        q = dict(p)
-        for k in ["category", "website", "address"]:
-            if isinstance(q.get(k), list):
-                q[k] = " ".join(str(x) for x in q[k] if x)
-        normed.append(q)
-    return normed
+    return [dict(p) for p in city_snapshot(city).providers]
 
 # -----------------------------------------------------------------------------
 # Scoring Logic
 # -----------------------------------------------------------------------------
-def score_provider(p: Dict[str, Any], needs: Dict[str, Any]) -> float:
-    """Compute a relevance score for a single provider."""
+def _score_fields(city, cat: str, site_text: str, rating: float, reviews: int,
+                  needs: Dict[str, Any], langs: set) -> float:
+    """Scoring rules over pre-normalized fields (shared by dict and snapshot paths)."""
     score = 0.0
 
-    if p.get("city") == needs.get("nearest_major_city"):
+    if city == needs.get("nearest_major_city"):
         score += 3.0
 
-    cat = _as_lower_text(p.get("category"))
     if needs.get("need_psychiatrist") and "psychiat" in cat:
         score += 2.2
     if not needs.get("need_psychiatrist") and any(x in cat for x in ["psycholog", "counsel", "clinic"]):
         score += 1.6
 
-    rating = float(p.get("rating") or 0)
-    reviews = int(p.get("reviews") or 0)
     score += min(rating, 5.0) * 0.6
     score += min(reviews, 1500) * 0.002
 
-    langs = set(needs.get("language", []))
-    site_text = _as_lower_text(p.get("website")) + " " + _as_lower_text(p.get("name"))
     if "en" in langs and any(k in site_text for k in ["english", "/en"]):
         score += 0.6
     if "vi" in langs:
@@ -296,6 +418,133 @@ def score_provider(p: Dict[str, Any], needs: Dict[str, Any]) -> float:
 
     return score
 
+def score_provider(p: Dict[str, Any], needs: Dict[str, Any]) -> float:
+    """Compute a relevance score for a single provider."""
+    return _score_fields(
+        p.get("city"),
+        _as_lower_text(p.get("category")),
+        _as_lower_text(p.get("website")) + " " + _as_lower_text(p.get("name")),
+        float(p.get("rating") or 0),
+        int(p.get("reviews") or 0),
+        needs,
+        set(needs.get("language", [])),
+    )
+
+def score_snapshot(snap: CitySnapshot, needs: Dict[str, Any]) -> List[float]:
+    """Score every provider of a snapshot using its precomputed fields."""
+    langs = set(needs.get("language", []))
+    return [
+        _score_fields(p.get("city"), cat, site, rating, reviews, needs, langs)
+        for p, cat, site, rating, reviews in zip(
+            snap.providers, snap.category_l, snap.site_text, snap.rating, snap.reviews
+        )
+    ]
+
+def rank_snapshot(snap: CitySnapshot, needs: Dict[str, Any], top_k: int) -> List[int]:
+    """Row indices of the top_k providers, best first (vectorized when numpy is available)."""
+    if snap.columns is not None:
+        return top_k_indices(score_columns(snap.columns, needs), top_k).tolist()
+    scores = score_snapshot(snap, needs)
+    # nlargest trên (score, -index) giữ thứ tự ổn định như sort(reverse=True)
+    best = heapq.nlargest(top_k, ((s, -i) for i, s in enumerate(scores)))
+    return [-neg_i for _, neg_i in best]
+
+# -----------------------------------------------------------------------------
+# Nationwide Geospatial Search
+# -----------------------------------------------------------------------------
+GEO_CANDIDATES_MIN = 20     # số cơ sở gần nhất đem đi chấm điểm
+DISTANCE_WEIGHT = 3.0       # điểm cộng tối đa khi ở ngay cạnh người dùng
+DISTANCE_SCALE_KM = 10.0    # khoảng cách mà điểm cộng giảm còn một nửa
+
+@dataclass(frozen=True)
+class NationalIndex:
+    """Grid index over the providers of every loaded city file."""
+    key: Tuple[Any, Any]                # _national_version() lúc dựng
+    snapshots: Tuple[CitySnapshot, ...]
+    rows: Tuple[Tuple[int, int], ...]   # point index -> (snapshot index, row index)
+    grid: GridIndex
+
+_NATIONAL_INDEX: NationalIndex | None = None
+_NATIONAL_LOCK = threading.Lock()
+
+def all_city_names() -> List[str]:
+    """Every city in the catalog or with a database file; hub files map back to the hub names."""
+    hubs = {_safe(h): h for h in (HUB_HCMC, HUB_HANOI, HUB_DN)}
+    names: List[str] = []
+    conn = _catalog_conn()
+    if conn is not None:
+        names.extend(catalog.cities(conn))
+    if os.path.isdir(DB_DIR):
+        for fname in sorted(os.listdir(DB_DIR)):
+            if fname.endswith("_therapists.json"):
+                stem = fname[: -len("_therapists.json")]
+                names.append(hubs.get(_safe(stem), stem.replace("_", " ")))
+    seen, out = set(), []
+    for n in names:
+        if _safe(n) not in seen:
+            seen.add(_safe(n))
+            out.append(n)
+    return out
+
+def _national_version() -> Tuple[Any, Any]:
+    """
+    (catalog-wide revision, mtime of the database folder). City JSON files
+    are written by rename, which updates the folder mtime, so two cheap
+    lookups tell whether any city changed.
+    """
+    conn = _catalog_conn()
+    rev = catalog.national_revision(conn) if conn is not None else None
+    try:
+        mtime = os.stat(DB_DIR).st_mtime_ns
+    except OSError:
+        mtime = None
+    return rev, mtime
+
+def national_index() -> NationalIndex:
+    """Return the nationwide index; cities are rechecked only when the national version moved."""
+    global _NATIONAL_INDEX
+    key = _national_version()
+    current = _NATIONAL_INDEX
+    if current is not None and current.key == key:
+        return current
+    with _NATIONAL_LOCK:
+        current = _NATIONAL_INDEX
+        if current is not None and current.key == key:
+            return current
+        snaps = tuple(city_snapshot(c) for c in all_city_names())
+        rows, points = [], []
+        for si, snap in enumerate(snaps):
+            for ri, p in enumerate(snap.providers):
+                rows.append((si, ri))
+                lat, lon = p.get("latitude"), p.get("longitude")
+                points.append((lat, lon) if lat is not None and lon is not None else None)
+        _NATIONAL_INDEX = NationalIndex(key, snaps, tuple(rows), GridIndex(points))
+        return _NATIONAL_INDEX
+
+def distance_bonus(d_km: float) -> float:
+    return DISTANCE_WEIGHT / (1.0 + d_km / DISTANCE_SCALE_KM)
+
+def rank_nearby(lat: float, lon: float, needs: Dict[str, Any], top_k: int) -> List[Tuple[Dict[str, Any], float]]:
+    """
+    k nearest providers nationwide, re-ranked by score_provider + distance bonus.
+    Returns [(provider, distance_km)], best first.
+    """
+    idx = national_index()
+    near = idx.grid.nearest(lat, lon, max(top_k * 4, GEO_CANDIDATES_MIN))
+    langs = set(needs.get("language", []))
+    scored = []
+    for d, i in near:
+        si, ri = idx.rows[i]
+        snap = idx.snapshots[si]
+        base = _score_fields(
+            snap.providers[ri].get("city"), snap.category_l[ri], snap.site_text[ri],
+            snap.rating[ri], snap.reviews[ri], needs, langs,
+        )
+        scored.append((base + distance_bonus(d), d, snap.providers[ri]))
+    # near đã theo khoảng cách tăng dần -> sort ổn định ưu tiên cơ sở gần hơn khi bằng điểm
+    scored.sort(key=lambda x: x[0], reverse=True)
+    return [(p, d) for _, d, p in scored[:top_k]]
+
 # -----------------------------------------------------------------------------
 # Public API
 # -----------------------------------------------------------------------------
@@ -303,22 +552,35 @@ def recommend(text: str, top_k: int = 5) -> Dict[str, Any]:
     """
     Main pipeline:
     1. Analyze user input via Gemini
-    2. Resolve nearest major city
-    3. Load corresponding provider database
+    2. Resolve nearest major city (and a district/province centroid if any)
+    3. Nearest providers nationwide when a centroid is known, otherwise
+       the corresponding hub database
     4. Rank and return top matches
     """
     needs = analyze_user_text(text)
     nearest = needs.get("nearest_major_city") or resolve_nearest_major_city(text)
     needs["nearest_major_city"] = nearest
-    providers = load_city(nearest)
 
-    scored = [(score_provider(p, needs), p) for p in providers]
-    scored.sort(key=lambda x: x[0], reverse=True)
+    # Có tỉnh/quận cụ thể -> tìm cơ sở gần nhất trên toàn quốc
+    loc = resolve_location(text) or resolve_location(needs.get("city") or "")
+    if loc:
+        nearby = rank_nearby(loc["lat"], loc["lon"], needs, top_k)
+        if nearby:
+            return {
+                "needs": needs,
+                "city": nearest,
+                "location": loc,
+                "results": [dict(p, distance_km=round(d, 2)) for p, d in nearby],
+            }
+
+    snap = city_snapshot(nearest)
+    top = rank_snapshot(snap, needs, top_k)
 
     return {
         "needs": needs,
         "city": nearest,
-        "results": [p for _, p in scored[:top_k]]
+        # copy để caller sửa kết quả không làm hỏng snapshot dùng chung
+        "results": [dict(snap.providers[i]) for i in top]
     }
 
 # -----------------------------------------------------------------------------
@@ -1,4 +1,4 @@
-from models import User, ExpertProfile
+from models import User, ExpertProfile, UserForumStats
 
 
 def get_expert_profile(db, user_id: int):
@@ -10,6 +10,9 @@ def get_expert_profile(db, user_id: int):
     
     if not profile:
         return None
+
+    # Hoạt động forum: một dòng bộ đếm theo khoá chính, không đếm lại answers
+    forum = db.get(UserForumStats, user_id)
     
     return {
         "user_id": profile.user_id,
@@ -23,7 +26,9 @@ def get_expert_profile(db, user_id: int):
         "verification_status": profile.verification_status,
         "is_active": profile.is_active,
         "created_at": profile.created_at.isoformat() if profile.created_at else None,
-        "updated_at": profile.updated_at.isoformat() if profile.updated_at else None
+        "updated_at": profile.updated_at.isoformat() if profile.updated_at else None,
+        "forum_answer_count": forum.answer_count if forum else 0,
+        "forum_last_active_at": forum.last_active_at if forum else None
     }
 
 
@@ -1,7 +1,9 @@
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, session as flask_session
 from sentence_transformers import util, SentenceTransformer
 from models import ExpertProfile, User
 from database import TherapySession
+from db import get_db
+from .suggest import suggest, log_query
 import torch
 
 sbert_model  = SentenceTransformer("keepitreal/vietnamese-sbert")
@@ -21,6 +23,15 @@ def to_dict(expert, user):
         "is_online": user.is_online
     }
 
+@search_specialization_bp.route("/api/search_suggest", methods=["GET"])
+def search_suggest():
+    """Gợi ý khi đang gõ: chỉ tra chỉ mục FTS5, không encode SBERT"""
+    prefix = request.args.get("q", "").strip()
+    resp = jsonify(suggest(get_db(), prefix))
+    # Gợi ý không phụ thuộc người dùng -> trình duyệt cache theo từng tiền tố
+    resp.headers["Cache-Control"] = "public, max-age=60"
+    return resp
+
 @search_specialization_bp.route("/api/search_specialization", methods=["GET"])
 def search_experts():
     user_query = request.args.get("query", "").strip()
@@ -75,6 +86,10 @@ def search_experts():
         # Sắp xếp theo điểm số từ cao xuống thấp
         results.sort(key=lambda x: x['score'], reverse=True)
 
+        # Truy vấn có kết quả -> ghi log, đủ nhiều user khác nhau gõ sẽ thành gợi ý
+        if results:
+            log_query(get_db(), user_query, flask_session.get("user_id"))
+
         return jsonify(results)
 
     except Exception as e:
@@ -0,0 +1,265 @@
+"""
+Typeahead suggestions for the expert search box
+===============================================
+
+`/api/search_specialization` encodes the query with SBERT, which is far
+too slow to run on every keystroke. Suggestions come from a plain SQLite
+FTS5 index instead, so the user can settle on a good query before the
+semantic search runs.
+
+- search_terms(norm, display, kind, weight): one row per distinct
+  suggestion. `norm` is deaccented, lowercased text, so "tram cam" finds
+  "Trầm cảm". `kind` is "expert" (a specialization of a verified expert),
+  "post" (a published forum title) or "query" (a search typed by at least
+  MIN_QUERY_USERS different signed-in users).
+- search_terms_fts: an FTS5 index over `norm` with prefix indexes of
+  2-4 characters, kept in sync by triggers. The last word typed is a
+  prefix query, and every other word must match a whole token.
+- search_queries: a log of submitted searches (see log_query), and
+  search_query_users: which signed-in users typed each one. A query only
+  becomes a public suggestion once enough different users typed it, so
+  one person's personal text, or one person repeating a query to plant it,
+  never shows up for others. Anonymous searches are logged but not
+  counted.
+
+New forum titles and popular queries are added as they happen. `rebuild`
+recomputes everything from the source tables (verified experts change
+rarely). It runs at startup and then every REBUILD_MINUTES.
+
+Results are kept for CACHE_SECONDS per typed prefix. Short prefixes match
+many rows, and every user types the same first letters.
+"""
+
+import logging
+import re
+import sqlite3
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+from db import DATABASE
+from timefmt import utc_now_str
+from loginforum.extensions import socketio
+
+SUGGEST_LIMIT = 8
+MIN_PREFIX = 2            # ít hơn 2 ký tự thì chưa gợi ý
+MAX_TERM_LEN = 80         # tiêu đề dài hơn là câu văn, không phải từ khóa
+MIN_QUERY_USERS = 3       # truy vấn phải được ít nhất 3 user khác nhau gõ mới thành gợi ý
+EXPERT_WEIGHT = 3         # mỗi chuyên gia đã xác minh có chuyên môn này
+POST_WEIGHT = 1           # mỗi bài forum có tiêu đề này
+REBUILD_MINUTES = 30
+CACHE_SECONDS = 60        # tiền tố ngắn ("tr", "lo") khớp nhiều dòng -> giữ kết quả một lúc
+CACHE_ENTRIES = 2048
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS search_queries (
+    norm VARCHAR PRIMARY KEY,
+    display VARCHAR NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    last_at VARCHAR
+);
+CREATE TABLE IF NOT EXISTS search_query_users (
+    norm VARCHAR NOT NULL,
+    user_id INTEGER NOT NULL,
+    PRIMARY KEY (norm, user_id)
+);
+CREATE TABLE IF NOT EXISTS search_terms (
+    id INTEGER PRIMARY KEY,
+    norm TEXT NOT NULL UNIQUE,
+    display TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    weight INTEGER NOT NULL DEFAULT 0
+);
+CREATE VIRTUAL TABLE IF NOT EXISTS search_terms_fts USING fts5(
+    norm, content='search_terms', content_rowid='id', prefix='2 3 4'
+);
+CREATE TRIGGER IF NOT EXISTS search_terms_ai AFTER INSERT ON search_terms BEGIN
+    INSERT INTO search_terms_fts(rowid, norm) VALUES (new.id, new.norm);
+END;
+CREATE TRIGGER IF NOT EXISTS search_terms_ad AFTER DELETE ON search_terms BEGIN
+    INSERT INTO search_terms_fts(search_terms_fts, rowid, norm) VALUES ('delete', old.id, old.norm);
+END;
+CREATE TRIGGER IF NOT EXISTS search_terms_au AFTER UPDATE OF norm ON search_terms BEGIN
+    INSERT INTO search_terms_fts(search_terms_fts, rowid, norm) VALUES ('delete', old.id, old.norm);
+    INSERT INTO search_terms_fts(rowid, norm) VALUES (new.id, new.norm);
+END;
+"""
+
+_NON_WORD = re.compile(r"[^\w]+")
+# Chuyên môn thường nhập dạng "Trầm cảm, Lo âu; Stress"
+_SPEC_SPLIT = re.compile(r"[,;/|\n]+")
+
+
+def normalize(text):
+    """'Trầm cảm, Lo âu!' -> 'tram cam lo au' (bỏ dấu, chữ thường, chỉ giữ chữ/số)"""
+    if not text:
+        return ""
+    s = unicodedata.normalize("NFD", text.replace("đ", "d").replace("Đ", "D"))
+    s = "".join(ch for ch in s if unicodedata.category(ch) != "Mn").lower()
+    return " ".join(_NON_WORD.sub(" ", s).split())
+
+
+def _display(text):
+    return " ".join(text.split())
+
+
+def ensure_schema(conn):
+    conn.executescript(SCHEMA)
+
+
+def _add_term(conn, text, kind, weight):
+    norm = normalize(text)
+    if len(norm) < MIN_PREFIX or len(norm) > MAX_TERM_LEN:
+        return
+    conn.execute(
+        "INSERT INTO search_terms(norm, display, kind, weight) VALUES(?,?,?,?) "
+        "ON CONFLICT(norm) DO UPDATE SET weight = weight + excluded.weight",
+        (norm, _display(text), kind, weight)
+    )
+
+
+def add_post_titles(conn, titles):
+    """Tiêu đề bài vừa được duyệt; gọi trước commit của người gọi"""
+    for title in titles:
+        _add_term(conn, title, "post", POST_WEIGHT)
+
+
+def log_query(conn, query, user_id=None):
+    """
+    Ghi một lần tìm kiếm; đủ MIN_QUERY_USERS user khác nhau thì thành gợi ý.
+    user_id None (khách) -> chỉ ghi log, không tính. Tự commit.
+    """
+    norm = normalize(query)
+    if len(norm) < MIN_PREFIX or len(norm) > MAX_TERM_LEN:
+        return
+    conn.execute(
+        "INSERT INTO search_queries(norm, display, hits, last_at) VALUES(?,?,1,?) "
+        "ON CONFLICT(norm) DO UPDATE SET hits = hits + 1, last_at = excluded.last_at",
+        (norm, _display(query), utc_now_str())
+    )
+    # Cùng một user gõ lại không được tính thêm
+    if user_id is not None and conn.execute(
+        "INSERT OR IGNORE INTO search_query_users(norm, user_id) VALUES(?, ?)", (norm, user_id)
+    ).rowcount:
+        users = conn.execute(
+            "SELECT COUNT(*) FROM search_query_users WHERE norm=?", (norm,)
+        ).fetchone()[0]
+        if users == MIN_QUERY_USERS:
+            _add_term(conn, query, "query", users)
+        elif users > MIN_QUERY_USERS:
+            _add_term(conn, query, "query", 1)
+    conn.commit()
+
+
+def _match_expr(norm):
+    """'tram ca' -> '"tram" "ca"*': các từ trước khớp nguyên token, từ cuối là tiền tố"""
+    words = norm.split()
+    return " ".join(f'"{w}"' for w in words[:-1]) + (" " if len(words) > 1 else "") + f'"{words[-1]}"*'
+
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def suggest(conn, prefix, limit=SUGGEST_LIMIT):
+    """[{"text", "kind"}] cho chuỗi đang gõ, trọng số cao trước, câu ngắn trước"""
+    norm = normalize(prefix)[:MAX_TERM_LEN]
+    if len(norm) < MIN_PREFIX:
+        return []
+    key = (norm, limit)
+    now = time.monotonic()
+    with _cache_lock:
+        hit = _cache.get(key)
+        if hit is not None and hit[0] > now:
+            _cache.move_to_end(key)
+            return hit[1]
+    rows = conn.execute(
+        "SELECT t.display, t.kind FROM search_terms_fts f JOIN search_terms t ON t.id = f.rowid "
+        "WHERE search_terms_fts MATCH ? ORDER BY t.weight DESC, length(t.norm) LIMIT ?",
+        (_match_expr(norm), limit)
+    ).fetchall()
+    result = [{"text": r[0], "kind": r[1]} for r in rows]
+    with _cache_lock:
+        _cache[key] = (now + CACHE_SECONDS, result)
+        _cache.move_to_end(key)
+        if len(_cache) > CACHE_ENTRIES:
+            _cache.popitem(last=False)
+    return result
+
+
+def rebuild(conn):
+    """Dựng lại toàn bộ search_terms từ chuyên gia, bài forum và log truy vấn; trả về số gợi ý"""
+    ensure_schema(conn)
+    terms = {}
+
+    def add(text, kind, weight):
+        norm = normalize(text)
+        if len(norm) < MIN_PREFIX or len(norm) > MAX_TERM_LEN:
+            return
+        entry = terms.get(norm)
+        if entry is None:
+            terms[norm] = [_display(text), kind, weight]
+        else:
+            entry[2] += weight
+
+    # Thứ tự nạp = thứ tự ưu tiên của kind khi trùng chữ: expert > post > query
+    for (spec,) in conn.execute(
+        "SELECT e.specialization FROM expert_profiles e JOIN users u ON u.id = e.user_id "
+        "WHERE e.verification_status = 'VERIFIED' AND upper(u.role) = 'EXPERT' "
+        "AND e.specialization IS NOT NULL"
+    ):
+        for part in _SPEC_SPLIT.split(spec):
+            add(part, "expert", EXPERT_WEIGHT)
+    for (title,) in conn.execute("SELECT title FROM posts WHERE status = 'published'"):
+        add(title, "post", POST_WEIGHT)
+    for display, users in conn.execute(
+        "SELECT q.display, COUNT(*) FROM search_query_users u JOIN search_queries q ON q.norm = u.norm "
+        "GROUP BY u.norm HAVING COUNT(*) >= ?", (MIN_QUERY_USERS,)
+    ):
+        add(display, "query", users)
+
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    conn.execute("DELETE FROM search_terms")
+    conn.executemany(
+        "INSERT INTO search_terms(norm, display, kind, weight) VALUES(?,?,?,?)",
+        [(norm, d, k, w) for norm, (d, k, w) in terms.items()]
+    )
+    # Gộp các segment FTS sau khi xoá / nạp lại hàng loạt
+    conn.execute("INSERT INTO search_terms_fts(search_terms_fts) VALUES('optimize')")
+    conn.commit()
+    with _cache_lock:
+        _cache.clear()
+    return len(terms)
+
+
+def _rebuild_loop(database, interval):
+    while True:
+        try:
+            conn = sqlite3.connect(database, timeout=10)
+            try:
+                rebuild(conn)
+            finally:
+                conn.close()
+        except Exception:
+            logging.exception("Search suggestion rebuild failed")
+        time.sleep(interval)
+
+
+def start_rebuilder(database=DATABASE, interval=REBUILD_MINUTES * 60):
+    """Dựng chỉ mục gợi ý khi khởi động rồi định kỳ (background task của Socket.IO)"""
+    # Tạo bảng ngay: worker kiểm duyệt có thể thêm tiêu đề trước lần rebuild đầu
+    conn = sqlite3.connect(database, timeout=10)
+    try:
+        ensure_schema(conn)
+    finally:
+        conn.close()
+    socketio.start_background_task(_rebuild_loop, database, interval)
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DATABASE)
+    print(f"{rebuild(conn)} suggestions")
+    conn.close()
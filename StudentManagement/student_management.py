@@ -1,5 +1,8 @@
 from flask import Blueprint, render_template, request, jsonify, session, redirect, url_for
 from datetime import datetime
+from timefmt import vn_format
+from loginforum.matchmaking import matchmaker
+from loginforum.user_tags import set_status_tag
 import sqlite3
 
 student_mgmt_bp = Blueprint('student_mgmt', __name__, template_folder='templates')
@@ -103,8 +106,11 @@ def toggle_status(student_id):
     conn = get_db_connection()
     user = conn.execute('SELECT status_tag FROM users WHERE id=?', (student_id,)).fetchone()
     new_status = 'CURED' if user['status_tag'] != 'CURED' else 'ILL'
-    conn.execute('UPDATE users SET status_tag = ? WHERE id = ?', (new_status, student_id))
+    # status_tag + user_tags cùng một transaction
+    set_status_tag(conn, student_id, new_status)
     conn.commit()
+    # Đổi CURED/ILL -> cập nhật pool helper của matchmaking
+    matchmaker.refresh_user(conn, student_id)
     conn.close()
     return jsonify({'new_status': new_status})
 
@@ -136,8 +142,11 @@ def view_report(student_id):
         (student_id,)
     ).fetchall()
 
+    # Hoạt động forum: đọc bộ đếm user_forum_stats, không đếm lại posts
     student_row = conn.execute(
-        'SELECT username FROM users WHERE id=?',
+        'SELECT u.username, COALESCE(f.post_count, 0) AS forum_post_count, '
+        'f.last_active_at AS forum_last_active_at '
+        'FROM users u LEFT JOIN user_forum_stats f ON f.user_id = u.id WHERE u.id=?',
         (student_id,)
     ).fetchone()
 
@@ -148,13 +157,9 @@ def view_report(student_id):
     moods = [dict(r) for r in moods_rows]
     student = dict(student_row) if student_row else {"username": "Unknown"}
 
-    # ✅ Convert created_at -> string cho chắc (tránh datetime/object lạ)
-    for q in quizzes:
-        if q.get("created_at") is not None:
-            q["created_at"] = str(q["created_at"])
-    for m in moods:
-        if m.get("created_at") is not None:
-            m["created_at"] = str(m["created_at"])
+    # created_at lưu UTC -> chuỗi giờ VN (bảng + nhãn biểu đồ đều dùng)
+    for row in quizzes + moods:
+        row["created_at"] = vn_format(row.get("created_at"), "%Y-%m-%d %H:%M")
 
     return render_template('view_report.html', quizzes=quizzes, moods=moods, student=student)
 
@@ -1,6 +1,6 @@
 from datetime import datetime
 from sqlalchemy import select
-from models import User, ExpertProfile
+from models import User, ExpertProfile, ForumStat
 
 
 def is_admin(db, user_id: int) -> bool:
@@ -159,6 +159,9 @@ def get_admin_stats(db):
     rejected_experts = db.query(ExpertProfile).filter_by(
         verification_status="REJECTED"
     ).count()
+
+    # Forum: đọc bộ đếm có sẵn (forum_stats), không đếm lại posts / answers
+    forum = {row.key: row.value for row in db.query(ForumStat).all()}
     
     return {
         "total_users": total_users,
@@ -167,5 +170,8 @@ def get_admin_stats(db):
         "total_admins": total_admins,
         "pending_experts": pending_experts,
         "verified_experts": verified_experts,
-        "rejected_experts": rejected_experts
+        "rejected_experts": rejected_experts,
+        "forum_posts": forum.get("posts", 0),
+        "forum_unanswered": forum.get("unanswered", 0),
+        "forum_answers": forum.get("answers", 0)
     }
\ No newline at end of file
@@ -17,19 +17,23 @@ from diary.diary import diary_bp
 from Aerial.Chatbot import chatbot_bp
 
 from loginforum.extensions import socketio
-from loginforum.chat import chat
+from loginforum.chat import chat, match_scheduler
+from loginforum.write_behind import message_buffer
 from  profile_dealing.expertUpdateProfile import expert_bp
 from streak.routes import streak_bp
 from admin_verify.routes import admin_bp
 from ExpertProfile.routes import expert_profile_bp
 
 from db import close_db, init_db
+import timefmt
 from loginforum.history_conversation import history_bp
 from loginforum.auth import auth
-from loginforum.forum import forum
+from loginforum.forum import forum, moderation_worker
+from loginforum.forum_stats import start_reconciler
 from loginforum.chat_expert import chat_expert_bp
 from Booking.booking import booking_bp
 from Search.search_specialization import search_specialization_bp
+from Search.suggest import start_rebuilder as start_suggest_rebuilder
 from StudentManagement.student_management import student_mgmt_bp
     
 from database import TherapySession
@@ -43,9 +47,27 @@ app.secret_key = "my-dev-secret-key"
 # init socketio cho app ngoài
 socketio.init_app(app)
 
+# Chỉ mục gợi ý tìm kiếm (FTS5): tạo bảng + dựng lại lúc khởi động và định kỳ
+start_suggest_rebuilder()
+
+# Worker kiểm duyệt bài forum (xử lý luôn các bài còn pending từ lần chạy trước)
+moderation_worker.start()
+
+# Ghi tin nhắn chat theo lô (flush khi đủ số dòng / sau vài trăm ms / lúc tắt server)
+message_buffer.start()
+
+# Ghép cặp chat theo lô trên chat_queue
+match_scheduler.start()
+
+# Đối soát bộ đếm forum (forum_stats, user_forum_stats, posts.answer_count) lúc khởi động + định kỳ
+start_reconciler()
+
 # --- Teardown DB ---
 app.teardown_appcontext(close_db)
 
+# --- Jinja filter vntime: hiển thị timestamp (UTC trong DB) theo giờ VN ---
+timefmt.init_app(app)
+
 # --- Đăng ký blueprint ---
 app.register_blueprint(auth)
 app.register_blueprint(forum)
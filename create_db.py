@@ -1,9 +1,12 @@
 import models
 from database import Base, TherapyEngine
+from migrations.migrate import migrate
 import os
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
 DB_URL = f"sqlite:///{os.path.join(BASE_DIR, 'therapy.db')}"
 
 
-Base.metadata.create_all(TherapyEngine)
\ No newline at end of file
+Base.metadata.create_all(TherapyEngine)
+# Bảng/index không khai báo trong models + ghi version vào schema_migrations
+migrate(os.path.join(BASE_DIR, "therapy.db"))
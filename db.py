@@ -37,39 +37,78 @@ def init_db():
     db_conn.close()
     print("Database created successfully!")
 
-def get_all_forum_posts():
+# SQLite giới hạn số tham số mỗi câu lệnh (mặc định 999) -> chia nhỏ danh sách id
+_IN_CHUNK = 900
+
+
+def load_answers(db, post_ids):
     """
-    Lấy tất cả posts, trả về dict có đủ fields:
-    id, title, content, user_id, username, tag, created_at, answers
+    Answers của nhiều post trong một query IN (...) (chia lô nếu quá nhiều id).
+    Trả về {post_id: [answer dict, ...]} theo thứ tự thời gian.
+    """
+    ids = list(dict.fromkeys(post_ids))
+    grouped = {pid: [] for pid in ids}
+    for i in range(0, len(ids), _IN_CHUNK):
+        chunk = ids[i:i + _IN_CHUNK]
+        placeholders = ",".join("?" * len(chunk))
+        rows = db.execute(f"""
+            SELECT a.id, a.post_id, a.content, a.created_at, u.username AS expert_username
+            FROM answers a
+            JOIN users u ON a.expert_id = u.id
+            WHERE a.post_id IN ({placeholders})
+            ORDER BY a.created_at, a.id
+        """, chunk).fetchall()
+        for a in rows:
+            grouped[a["post_id"]].append(dict(a))
+    return grouped
+
+
+def load_forum_posts(post_ids=None):
+    """
+    Posts kèm answers với đúng 2 query (posts + answers IN (...)), không N+1.
+    post_ids=None -> tất cả posts đã duyệt; ngược lại chỉ các id đã cho, giữ thứ tự truyền vào.
+    Bài đang chờ / bị từ chối kiểm duyệt không bao giờ được trả về.
+    Mỗi post: id, title, content, user_id, username, tag, created_at, answers
     """
     db = get_db()
-    cursor = db.execute("""
-        SELECT p.id, p.title, p.content, p.tag, p.created_at, p.user_id, u.username
+    sql = """
+        SELECT p.id, p.title, p.content, p.tag, p.created_at, p.user_id, p.answer_count, u.username
         FROM posts p
         JOIN users u ON p.user_id = u.id
-    """)
-    posts = cursor.fetchall()
-    result = []
-    for row in posts:
-        # Lấy danh sách answers cho post này
-        ans_cursor = db.execute("""
-            SELECT a.content, u.username AS expert_username
-            FROM answers a
-            JOIN users u ON a.expert_id = u.id
-            WHERE a.post_id = ?
-        """, (row["id"],))
-        answers = [{"content": a["content"], "expert_username": a["expert_username"]} for a in ans_cursor.fetchall()]
-
-        result.append({
-            "id": row["id"],
-            "title": row["title"],
-            "content": row["content"],
-            "tag": row["tag"],
-            "created_at": row["created_at"],
-            "username": row["username"],
-            "answers": answers
-        })
-    return result
+        WHERE p.status = 'published'
+    """
+    if post_ids is None:
+        rows = db.execute(sql).fetchall()
+    else:
+        wanted = list(dict.fromkeys(post_ids))
+        rows = []
+        for i in range(0, len(wanted), _IN_CHUNK):
+            chunk = wanted[i:i + _IN_CHUNK]
+            rows += db.execute(f"{sql} AND p.id IN ({','.join('?' * len(chunk))})", chunk).fetchall()
+        order = {pid: i for i, pid in enumerate(wanted)}
+        rows.sort(key=lambda r: order[r["id"]])
+
+    # posts.answer_count (bộ đếm) = 0 -> khỏi đưa vào IN (...)
+    answers = load_answers(db, [r["id"] for r in rows if r["answer_count"]])
+    return [dict(r, answers=answers.get(r["id"], [])) for r in rows]
+
+
+def get_forum_post_texts():
+    """
+    id, title, content của mọi post đã duyệt, không kèm answers (1 query).
+    Dùng để chấm điểm tìm kiếm; bài trúng thì nạp đủ bằng load_forum_posts(ids).
+    """
+    return get_db().execute(
+        "SELECT id, title, content FROM posts WHERE status = 'published'"
+    ).fetchall()
+
+
+def get_all_forum_posts():
+    """
+    Lấy tất cả posts, trả về dict có đủ fields:
+    id, title, content, user_id, username, tag, created_at, answers
+    """
+    return load_forum_posts()
 
 
 # Dùng cho chạy độc lập (tạo DB mới)
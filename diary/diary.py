@@ -4,7 +4,7 @@ from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
 from database import TherapySession
 from models import DiaryEntry, User
-from datetime import datetime
+from timefmt import utc_now_str, vn_format
 from models import DiaryEntry  
 import os
 
@@ -140,7 +140,7 @@ def edit_diary(entry_id):
             entry.mood_score = int(request.form.get("mood_score", 3))
             entry.tags = request.form.get("tags", "").strip()
             entry.is_private = int(request.form.get("is_private", 1))
-            entry.updated_at = datetime.now().isoformat(timespec="seconds")
+            entry.updated_at = utc_now_str()
             
             s.commit()
             
@@ -180,15 +180,8 @@ def mood_stats(student_id):
 
         stats = []
         for entry in entries:
-            dt = entry.created_at
-            if isinstance(dt, str):
-                # nếu string ISO "YYYY-MM-DDTHH:MM:SS"
-                dt_str = dt[:10]
-            else:
-                dt_str = dt.strftime("%Y-%m-%d")
-
             stats.append({
-                "date": dt_str,
+                "date": vn_format(entry.created_at, "%Y-%m-%d"),
                 "mood": entry.mood,
                 "mood_score": entry.mood_score,
                 "title": entry.title
@@ -224,15 +217,7 @@ def mood_series_api():
         if e.mood_score is None:
             continue
 
-        dt = e.created_at
-        if isinstance(dt, str):
-            try:
-                dt = datetime.fromisoformat(dt)
-            except Exception:
-                # fallback nếu format lạ
-                dt = datetime.strptime(dt[:10], "%Y-%m-%d")
-
-        labels.append(dt.strftime("%d/%m"))
+        labels.append(vn_format(e.created_at, "%d/%m"))
         data.append(float(e.mood_score))
 
     return jsonify({"labels": labels, "data": data})
@@ -2,16 +2,17 @@
 from flask import Blueprint, render_template, request, redirect, session, flash, current_app, jsonify, url_for, g
 import sqlite3
 import os
-import uuid
 import logging
 from .extensions import socketio
+from .matchmaking import matchmaker
+from .match_scheduler import MatchScheduler
+from .write_behind import message_buffer
+from .chat_pages import conversation_page, page_args, page_meta
+from timefmt import utc_now_str
 from flask_socketio import emit, join_room, leave_room
 
 chat = Blueprint("chat", __name__, template_folder= "htmltemplates")
 
-#Dùng set để lưu ID của seeker đang chờ
-WAITING_USERS = set()
-
 
 # ============ TEMPORARY ONLY ============
 _basedir = os.path.abspath(os.path.dirname(__file__))
@@ -39,104 +40,8 @@ def close_db(e=None):
 # -----------------------------------------------
 # --- LOGIC MATCHING
 # -----------------------------------------------
-def find_match_for_user(seeker_id, illness, prefer_anonymous=False):
-    conn = get_db()
-    helper_id = None
-    is_expert = 0
-
-    tag_to_match = f"cured_{illness}" 
-    # Chuỗi tìm kiếm trong SQLite: ví dụ: "%,cured_anxiety,%"
-    sql_tag_pattern = f'%,{tag_to_match},%'
-
-    if not prefer_anonymous:
-        # -----------------------------------------------------------------
-        # Step 1A (Ưu tiên): Tìm Cured Student có TAG MATCH CHÍNH XÁC
-        # -----------------------------------------------------------------
-        cured_helper_specific = conn.execute(
-            """
-            SELECT id FROM users
-            WHERE (',' || status_tag || ',') LIKE ? 
-            AND role != 'expert'
-            AND (chat_opt_in=1 OR chat_opt_in='1') AND id != ?
-            AND id NOT IN (SELECT helper_id FROM chat_sessions WHERE status='active')
-            AND id NOT IN (SELECT seeker_id FROM chat_sessions WHERE status='active')
-            ORDER BY RANDOM() LIMIT 1
-            """,
-            (sql_tag_pattern, seeker_id)
-        ).fetchone()
-
-        # print("CURED1")
-
-        if cured_helper_specific:
-            helper_id = cured_helper_specific["id"]
-        
-        # -----------------------------------------------------------------
-        # Step 1B (Fallback): Tìm Cured Student BẤT KỂ status_tag nào
-        # (Chỉ chạy nếu Step 1A không tìm thấy)
-        # -----------------------------------------------------------------
-        if helper_id is None:
-            cured_helper_broad = conn.execute(
-                """
-                SELECT id FROM users
-                WHERE UPPER(status_tag) LIKE 'CURED%' AND LOWER(role) != 'expert' AND (chat_opt_in=1 OR chat_opt_in='1') AND id != ?
-                AND NOT EXISTS (
-                SELECT 1
-                FROM chat_sessions cs
-                WHERE cs.status = 'active'
-                AND (cs.helper_id = users.id OR cs.seeker_id = users.id)
-            )
-                ORDER BY RANDOM() LIMIT 1
-                """,
-                (seeker_id,)
-            ).fetchone()
-            
-            if cured_helper_broad:
-                helper_id = cured_helper_broad["id"]
-        # print("CURER2")
-        # print(helper_id)
-
-    # -----------------------------------------------------------------
-    # Step 2: Fallback sang Expert
-    # -----------------------------------------------------------------
-    if not helper_id:
-        expert_helper = conn.execute(
-            """
-            SELECT id FROM users
-            WHERE role='expert' AND (chat_opt_in=1 OR chat_opt_in='1')
-            AND id != ?
-            AND id NOT IN (SELECT helper_id FROM chat_sessions WHERE status='active')
-            AND id NOT IN (SELECT seeker_id FROM chat_sessions WHERE status='active')
-            ORDER BY RANDOM() LIMIT 1
-            """,
-            (seeker_id,)
-        ).fetchone()
-        
-        if expert_helper:
-            helper_id = expert_helper["id"]
-            is_expert = 1
-        # print("CURE3")
-
-    if not helper_id:
-        return None
-
-    # Tạo session chat
-    new_session_key = str(uuid.uuid4())
-    try:
-        conn.execute(
-    """
-    INSERT INTO chat_sessions
-    (session_key, seeker_id, helper_id, status, is_expert_fallback)
-    VALUES (?, ?, ?, ?, ?)
-    """,
-    (new_session_key, seeker_id, helper_id, "active", is_expert)
-)
-
-        conn.commit()
-        return {"session_key": new_session_key, "helper_id": helper_id}
-    except Exception as e:
-        logging.error(f"Lỗi tạo session chat: {e}")
-        conn.rollback()
-        return None
+# Ghép theo lô trên chat_queue (match_scheduler.py), chọn helper trong bộ nhớ (matchmaking.py)
+match_scheduler = MatchScheduler(matchmaker)
 
 # -----------------------------------------------
 # --- ROUTES
@@ -165,32 +70,28 @@ def chat_room(session_key):
 
     session['current_room_key'] = session_key
 
-    # --- Lấy lịch sử chat từ DB ---
-    chat_history = conn.execute(
-        "SELECT * FROM conversation_history WHERE session_key=? ORDER BY timestamp ASC",
-        (session_key,)
-    ).fetchall()
-
-    return render_template("chat_room.html", session_key=session_key, chat_history=chat_history)
+    # Lịch sử chat do client tải theo trang (history.get_history), không nạp ở đây
+    return render_template("chat_room.html", session_key=session_key)
 
 # API trả về lịch sử chat (dùng khi reload page)
 @chat.route("/api/get_history/<string:session_key>")
 def get_history(session_key):
+    message_buffer.sync()
     conn = get_db()
-    history = conn.execute(
-        "SELECT * FROM conversation_history WHERE session_key=? ORDER BY timestamp ASC",
-        (session_key,)
-    ).fetchall()
+    # Một trang, mới nhất trước; ?before_id= để lấy trang cũ hơn
+    before_id, limit = page_args(request.args)
+    history, next_before_id = conversation_page(conn, session_key, before_id, limit)
     # Convert thành list dict
     result = []
     for msg in history:
         result.append({
+            "id": msg["id"],
             "user_id": msg["user_id"],
             "user_message": msg["user_message"],
             "system_response": msg["system_response"],
             "timestamp": msg["timestamp"]
         })
-    return jsonify({"history": result})
+    return jsonify({"history": result, **page_meta(next_before_id)})
 
 # -----------------------------------------------
 # --- SOCKETIO EVENTS
@@ -225,21 +126,17 @@ def on_send_message(data):
     emit("receive_message", {"message": message_content, "sender": "Người lạ"}, to=room_key, skip_sid=request.sid)
 
     # --- Chỉ lưu tin nhắn mới vào DB (tránh duplicate khi reload) ---
-    conn = get_db()
-    try:
-        conn.execute(
-            "INSERT INTO conversation_history (user_id, session_type, session_key, user_message, system_response) VALUES (?, ?, ?, ?, ?)",
-            (user_id, "chat", room_key, message_content, None)
+    # Ghi trễ theo lô (write_behind.py); timestamp lấy lúc nhận, không phải lúc flush
+    now = utc_now_str()
+    message_buffer.add(
+        "INSERT INTO conversation_history (user_id, session_type, session_key, user_message, system_response, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+        (user_id, "chat", room_key, message_content, None, now)
+    )
+    if data.get("system_response"):
+        message_buffer.add(
+            "INSERT INTO conversation_history (user_id, session_type, session_key, user_message, system_response, timestamp) VALUES (?, ?, ?, ?, ?, ?)",
+            (user_id, "chatbot", room_key, None, data["system_response"], now)
         )
-        if data.get("system_response"):
-            conn.execute(
-                "INSERT INTO conversation_history (user_id, session_type, session_key, user_message, system_response) VALUES (?, ?, ?, ?, ?)",
-                (user_id, "chatbot", room_key, None, data["system_response"])
-            )
-        conn.commit()
-    except Exception as e:
-        logging.error(f"Lỗi lưu tin nhắn: {e}")
-        conn.rollback()
 
 @socketio.on('leave_chat')
 def on_leave(data):
@@ -257,9 +154,17 @@ def on_leave(data):
         session.pop('current_room_key', None)
         conn.execute("UPDATE chat_sessions SET status='ended' WHERE session_key=?", (room_key,))
         conn.commit()
+        matchmaker.end_session(room_key)
         emit("chat_ended", {"message": "Một người dùng đã kết thúc cuộc trò chuyện."}, to=room_key)
 
 
+@chat.route("/api/chat/buffer_stats")
+def buffer_stats():
+    """Độ sâu hàng đợi ghi tin nhắn + số lần flush (cho admin)"""
+    if session.get("role") != "admin":
+        return jsonify({"error": "forbidden"}), 403
+    return jsonify(message_buffer.stats())
+
 @chat.route("/chat/toggle-opt-in", methods=["POST"])
 def toggle_opt_in():
     if "user_id" not in session:
@@ -272,6 +177,7 @@ def toggle_opt_in():
     conn.execute("UPDATE users SET chat_opt_in=? WHERE id=?", (new_status, session["user_id"]))
     conn.execute("UPDATE users SET is_online=? WHERE id=?", (new_status, session["user_id"]))
     conn.commit()
+    matchmaker.refresh_user(conn, session["user_id"])
     session["chat_opt_in"] = new_status
     return redirect("/chat/waiting")
 
@@ -289,12 +195,18 @@ def on_disconnect():
         leave_room(user_id_room)
         if session.get("role")=="expert":
             leave_room("experts_room")
+        try:
+            # Đóng trang khi đang chờ -> bỏ khỏi hàng chờ
+            match_scheduler.cancel(get_db(), session["user_id"])
+        except Exception as e:
+            logging.error(f"Lỗi huỷ hàng chờ của user {session['user_id']}: {e}")
         room_key = session.pop('current_room_key', None)
         if room_key:
             try:
                 conn = get_db()
                 conn.execute("UPDATE chat_sessions SET status='ended' WHERE session_key=?", (room_key,))
                 conn.commit()
+                matchmaker.end_session(room_key)
                 socketio.emit("chat_ended", {"message":"Người dùng kia đã ngắt kết nối."}, to=room_key)
             except Exception as e:
                 logging.error(f"Lỗi khi dọn dẹp session {room_key}: {e}")
@@ -305,18 +217,19 @@ def on_request_match(data):
         return
     illness = data.get('illness')
     seeker_id = session.get('user_id')
-    print("############################", seeker_id)
     seeker_room = f'user_{seeker_id}'
     prefer_anonymous = data.get('anonymous', False)  # frontend gửi lên nếu muốn chat ẩn danh
-    match_result = find_match_for_user(seeker_id, illness, prefer_anonymous=prefer_anonymous)
-    if match_result:
-        helper_id = match_result["helper_id"]
-        session_key = match_result["session_key"]
-        room_url = f"/chat/room/{session_key}"
-        helper_room = f'user_{helper_id}'
-        # Ép helper join room
-        socketio.emit("force_join_room", {"room_url": room_url}, to=helper_room)
-        # Gửi về student
-        socketio.emit("match_found", {"room_url": room_url}, to=seeker_room)
-    else:
-        socketio.emit("match_failed", {"message":"Không tìm thấy ai rảnh."}, to=seeker_room)
\ No newline at end of file
+    conn = get_db()
+    # Đang trong một session active -> không mở thêm session thứ hai
+    if matchmaker.is_busy(conn, seeker_id):
+        socketio.emit("match_failed", {"message": "Bạn đang trong một cuộc trò chuyện khác."}, to=seeker_room)
+        return
+    # Chỉ xếp hàng; scheduler ghép cả lô rồi gửi match_found / force_join_room
+    position = match_scheduler.enqueue(conn, seeker_id, illness, prefer_expert=prefer_anonymous)
+    socketio.emit("match_queued", {"position": position}, to=seeker_room)
+
+@socketio.on('cancel_match')
+def on_cancel_match(data=None):
+    if "user_id" not in session:
+        return
+    match_scheduler.cancel(get_db(), session["user_id"])
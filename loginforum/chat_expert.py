@@ -2,6 +2,8 @@
 from flask import Blueprint, redirect, render_template, request, jsonify, session, url_for
 from db import get_db
 from .extensions import socketio
+from .write_behind import message_buffer
+from .chat_pages import messages_page, page_args, page_meta
 from flask_socketio import emit, join_room
 from datetime import datetime
 
@@ -44,6 +46,7 @@ def chat_page():
 # ============================================================
 @chat_expert_bp.route("/api/get_peers/<int:user_id>")
 def get_peers(user_id):
+    message_buffer.sync()
     conn = get_db()
     rows = conn.execute("""
         SELECT DISTINCT 
@@ -75,6 +78,7 @@ def get_peers(user_id):
 # ============================================================
 @chat_expert_bp.route("/api/get_experts_for_student/<int:uid>")
 def get_experts_for_student(uid):
+    message_buffer.sync()
     conn = get_db()
     experts = conn.execute("SELECT id, username FROM users WHERE UPPER(role)='EXPERT'").fetchall()
     result = []
@@ -99,30 +103,30 @@ def get_experts_for_student(uid):
 # ============================================================
 @chat_expert_bp.route("/api/get_messages/<int:user_id>/<int:peer_id>")
 def get_messages(user_id, peer_id):
+    message_buffer.sync()
     conn = get_db()
-    rows = conn.execute("""
-        SELECT * FROM messages
-        WHERE (sender_id=? AND receiver_id=?)
-        OR (sender_id=? AND receiver_id=?)
-        ORDER BY created_at ASC
-    """, (user_id, peer_id, peer_id, user_id)).fetchall()
+    # Một trang, mới nhất trước; ?before_id= để lấy trang cũ hơn
+    before_id, limit = page_args(request.args)
+    rows, next_before_id = messages_page(conn, user_id, peer_id, before_id, limit)
 
     messages = [{
+        "id": r["id"],
         "sender_id": r["sender_id"],
         "receiver_id": r["receiver_id"],
         "message": r["message"],
         "timestamp": r["created_at"]
     } for r in rows]
 
-    # Đánh dấu đã đọc
-    conn.execute("""
-        UPDATE messages
-        SET is_read=1
-        WHERE receiver_id=? AND sender_id=? AND is_read=0
-    """, (user_id, peer_id))
-    conn.commit()
+    # Đánh dấu đã đọc (một lần, khi mở hội thoại; trang cũ hơn không cần)
+    if before_id is None:
+        conn.execute("""
+            UPDATE messages
+            SET is_read=1
+            WHERE receiver_id=? AND sender_id=? AND is_read=0
+        """, (user_id, peer_id))
+        conn.commit()
 
-    return jsonify({"messages": messages})
+    return jsonify({"messages": messages, **page_meta(next_before_id)})
 
 # ============================================================
 # 6) API: Lấy danh sách chuyên gia
@@ -139,6 +143,7 @@ def get_all_experts():
 # ============================================================
 @chat_expert_bp.route("/api/get_unread/<role>/<int:uid>")
 def get_unread(role, uid):
+    message_buffer.sync()
     conn = get_db()
     row = conn.execute(
         "SELECT COUNT(*) AS cnt FROM messages WHERE receiver_id=? AND is_read=0",
@@ -187,13 +192,11 @@ def handle_send(data):
         "timestamp": str(datetime.now())
     }, to=room)
 
-    # Lưu DB
-    conn = get_db()
-    conn.execute("""
+    # Lưu DB: ghi trễ theo lô (write_behind.py), không commit cho từng tin
+    message_buffer.add("""
         INSERT INTO messages(sender_id, receiver_id, message, created_at)
         VALUES (?, ?, ?, ?)
     """, (sender, peer, msg, datetime.now()))
-    conn.commit()
 
 # ============================================================
 # 10) SOCKET.IO — đánh dấu đã đọc realtime
@@ -203,6 +206,8 @@ def handle_mark_read(data):
     user_id = session.get("user_id")
     peer_id = data.get("peer_id")
 
+    # Tin vừa gửi có thể còn trong buffer -> ghi trước khi đánh dấu đã đọc
+    message_buffer.sync()
     conn = get_db()
     conn.execute("""
         UPDATE messages SET is_read=1
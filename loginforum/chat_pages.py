@@ -0,0 +1,68 @@
+"""
+Cursor pagination for chat history
+==================================
+
+The history endpoints used to return every row of a conversation, ordered
+by timestamp, which is not indexed. A long conversation was read and sent
+in full on every page load and every reconnect.
+
+They now return one page, newest first:
+
+- `?limit=` rows per page (PAGE_SIZE by default, at most MAX_PAGE_SIZE)
+- `?before_id=` only rows with a smaller id (the `next_before_id` of the
+  previous page); without it, the latest page
+
+Rows in a page are still returned oldest first, so clients render them in
+order. `has_more` / `next_before_id` tell the client whether there is an
+older page to fetch when the user scrolls up.
+
+The id is the insertion order. The write-behind buffer keeps that order
+too, so it matches the send order. Each page is a range scan on:
+
+- conversation_history: ix_conversation_history_session_id (session_key, id)
+- messages: ix_messages_pair_id (min(sender_id, receiver_id),
+  max(sender_id, receiver_id), id). The query must use exactly these
+  expressions, or SQLite cannot use the index.
+"""
+
+PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+_NO_CURSOR = 2 ** 63 - 1  # id lớn nhất của SQLite: không có before_id = trang mới nhất
+
+
+def page_args(args):
+    """(before_id, limit) từ request.args; giá trị sai -> mặc định"""
+    before_id = args.get("before_id", type=int)
+    limit = args.get("limit", PAGE_SIZE, type=int)
+    return before_id, max(1, min(limit, MAX_PAGE_SIZE))
+
+
+def _page(rows, limit):
+    """Lấy dư một dòng để biết còn trang cũ hơn; trả về (rows cũ -> mới, next_before_id)"""
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    rows.reverse()
+    return rows, (rows[0]["id"] if has_more else None)
+
+
+def conversation_page(conn, session_key, before_id=None, limit=PAGE_SIZE):
+    rows = conn.execute(
+        "SELECT * FROM conversation_history WHERE session_key=? AND id < ? "
+        "ORDER BY id DESC LIMIT ?",
+        (session_key, before_id or _NO_CURSOR, limit + 1)
+    ).fetchall()
+    return _page(rows, limit)
+
+
+def messages_page(conn, user_id, peer_id, before_id=None, limit=PAGE_SIZE):
+    rows = conn.execute(
+        "SELECT * FROM messages "
+        "WHERE min(sender_id, receiver_id)=? AND max(sender_id, receiver_id)=? AND id < ? "
+        "ORDER BY id DESC LIMIT ?",
+        (min(user_id, peer_id), max(user_id, peer_id), before_id or _NO_CURSOR, limit + 1)
+    ).fetchall()
+    return _page(rows, limit)
+
+
+def page_meta(next_before_id):
+    return {"has_more": next_before_id is not None, "next_before_id": next_before_id}
@@ -0,0 +1,210 @@
+"""
+Expert inbox: unanswered forum questions ranked per expert
+==========================================================
+
+Experts used to scroll the whole forum looking for tag='unanswered'. The
+inbox keeps, for every expert, the unanswered published posts already
+sorted by priority:
+
+    priority = CRISIS_WEIGHT * crisis + MATCH_WEIGHT * match + AGE_WEIGHT * hours_waiting
+
+- crisis: how close the post is to the crisis phrases (SBERT similarity),
+  computed once when the post passes moderation and stored in posts.crisis_score
+- match: cosine between the post embedding (posts.embedding) and the
+  expert's specialization
+- hours_waiting grows at the same rate for every post, so ordering by
+  priority equals ordering by the constant
+  CRISIS_WEIGHT * crisis + MATCH_WEIGHT * match - AGE_WEIGHT * created_hours,
+  and each list can stay sorted without ever being re-ranked
+
+A publish inserts into every loaded list (bisect). An expert reply removes
+the post from every list. Reading the top N is a slice.
+"""
+
+import bisect
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+
+from timefmt import parse_db_time
+
+CRISIS_WEIGHT = 2.0
+MATCH_WEIGHT = 1.0
+AGE_WEIGHT = 0.02          # mỗi giờ chờ ~ 0.02 -> một ngày ~ 0.5
+INBOX_LIMIT = 20
+MAX_LIMIT = 100
+
+# Câu mẫu cho điểm khủng hoảng: bài càng gần nghĩa với các câu này càng cần ưu tiên
+CRISIS_PHRASES = [
+    "tôi muốn tự tử",
+    "tôi không muốn sống nữa",
+    "tôi muốn chết",
+    "tôi đang tự làm hại bản thân",
+    "tôi tuyệt vọng, không còn lối thoát",
+    "tôi bị bạo hành, bị đánh đập",
+    "tôi hoảng loạn, không thở được",
+]
+
+
+def to_blob(vec):
+    return np.asarray(vec, dtype=np.float32).tobytes()
+
+
+def from_blob(blob):
+    return np.frombuffer(blob, dtype=np.float32) if blob else None
+
+
+@dataclass
+class _Post:
+    id: int
+    title: str
+    username: str
+    created_at: str
+    created_hours: float
+    crisis: float
+    vec: object  # np.ndarray đã chuẩn hoá, hoặc None
+
+
+class _ExpertQueue:
+    """Danh sách (khoá tĩnh, post_id) đã sắp xếp của một expert; khoá nhỏ = ưu tiên cao"""
+
+    def __init__(self, specialization, vec):
+        self.specialization = specialization
+        self.vec = vec
+        self.items = []
+        self.keys = {}
+
+    def key(self, post):
+        match = float(post.vec @ self.vec) if self.vec is not None and post.vec is not None else 0.0
+        priority = CRISIS_WEIGHT * post.crisis + MATCH_WEIGHT * match - AGE_WEIGHT * post.created_hours
+        return (-priority, post.id), match
+
+    def add(self, post):
+        if post.id in self.keys:
+            return
+        k, _ = self.key(post)
+        self.keys[post.id] = k
+        bisect.insort(self.items, k)
+
+    def remove(self, post_id):
+        k = self.keys.pop(post_id, None)
+        if k is not None:
+            i = bisect.bisect_left(self.items, k)
+            del self.items[i]
+
+
+class ExpertInbox:
+    """
+    encode: list[str] -> ma trận embedding đã chuẩn hoá (một dòng mỗi text)
+    """
+
+    def __init__(self, encode, limit=INBOX_LIMIT):
+        self.encode = encode
+        self.limit = limit
+        self._posts = {}
+        self._queues = {}
+        self._crisis_vecs = None
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    # --- Điểm cho bài mới ---
+    def annotate(self, texts):
+        """[(embedding blob, crisis score)] cho từng text (title + content của bài)"""
+        if not texts:
+            return []
+        if self._crisis_vecs is None:
+            self._crisis_vecs = np.asarray(self.encode(CRISIS_PHRASES), dtype=np.float32)
+        vecs = np.asarray(self.encode(texts), dtype=np.float32)
+        crisis = (vecs @ self._crisis_vecs.T).max(axis=1).clip(min=0.0)
+        return [(to_blob(v), float(c)) for v, c in zip(vecs, crisis)]
+
+    # --- Nạp từ DB (một lần) ---
+    def _entry(self, row):
+        dt = parse_db_time(row["created_at"])
+        return _Post(
+            id=row["id"],
+            title=row["title"],
+            username=row["username"],
+            created_at=row["created_at"],
+            created_hours=dt.timestamp() / 3600.0 if dt else 0.0,
+            crisis=row["crisis_score"] or 0.0,
+            vec=from_blob(row["embedding"]),
+        )
+
+    def ensure_loaded(self, conn):
+        """
+        Nạp các bài chưa trả lời (partial index ix_posts_unanswered).
+        Bài cũ chưa có embedding được tính một lượt rồi ghi lại vào DB.
+        """
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            rows = [dict(r) for r in conn.execute(
+                "SELECT posts.id, posts.title, posts.content, posts.created_at, posts.crisis_score, "
+                "posts.embedding, users.username "
+                "FROM posts JOIN users ON posts.user_id = users.id "
+                "WHERE posts.tag = 'unanswered' AND posts.status = 'published' "
+                "ORDER BY posts.created_at"
+            ).fetchall()]
+            missing = [r for r in rows if r["embedding"] is None]
+            if missing:
+                scores = self.annotate([f"{r['title']} {r['content']}" for r in missing])
+                for r, (blob, crisis) in zip(missing, scores):
+                    r["embedding"], r["crisis_score"] = blob, crisis
+                conn.executemany(
+                    "UPDATE posts SET embedding=?, crisis_score=? WHERE id=?",
+                    [(r["embedding"], r["crisis_score"], r["id"]) for r in missing]
+                )
+                conn.commit()
+            for r in rows:
+                self._posts[r["id"]] = self._entry(r)
+            self._loaded = True
+
+    # --- Cập nhật tăng dần ---
+    def add(self, row):
+        """Bài vừa được duyệt (row có id, title, username, created_at, crisis_score, embedding)"""
+        with self._lock:
+            if not self._loaded:
+                return  # lần nạp đầu sẽ đọc từ DB
+            post = self._entry(row)
+            self._posts[post.id] = post
+            for q in self._queues.values():
+                q.add(post)
+
+    def remove(self, post_id):
+        """Bài đã được expert trả lời"""
+        with self._lock:
+            if self._posts.pop(post_id, None) is None:
+                return
+            for q in self._queues.values():
+                q.remove(post_id)
+
+    # --- Đọc ---
+    def _queue_for(self, expert_id, specialization):
+        q = self._queues.get(expert_id)
+        if q is not None and q.specialization == specialization:
+            return q
+        # Expert mới hoặc vừa đổi chuyên môn -> dựng lại danh sách của riêng expert này
+        vec = None
+        if specialization and specialization.strip():
+            vec = np.asarray(self.encode([specialization]), dtype=np.float32)[0]
+        q = _ExpertQueue(specialization, vec)
+        for post in self._posts.values():
+            q.add(post)
+        self._queues[expert_id] = q
+        return q
+
+    def top(self, conn, expert_id, specialization, limit=None):
+        """Top N bài cho expert: [(post, match score)], ưu tiên cao nhất trước"""
+        self.ensure_loaded(conn)
+        limit = max(1, min(limit or self.limit, MAX_LIMIT))
+        with self._lock:
+            q = self._queue_for(expert_id, specialization)
+            out = []
+            for _, post_id in q.items[:limit]:
+                post = self._posts[post_id]
+                out.append((post, q.key(post)[1]))
+            return out
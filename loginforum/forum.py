@@ -1,45 +1,25 @@
-from flask import Blueprint, render_template, request, redirect, session, url_for
+import logging
+from flask import Blueprint, render_template, request, redirect, session, url_for, jsonify, make_response
+from markupsafe import Markup
 from sentence_transformers import SentenceTransformer, util
-from .toxic_filter import is_toxic
-from db import get_db, get_all_forum_posts
-from datetime import datetime
-from zoneinfo import ZoneInfo
+from .toxic_filter import toxic_flags
+from .fragment_cache import forum_cache
+from .extensions import socketio
+from .moderation import ModerationWorker, PENDING, PUBLISHED, run_blocking
+from .expert_inbox import ExpertInbox
+from .forum_stats import forum_totals, record_answer, record_published
+from flask_socketio import join_room
+from db import get_db, get_forum_post_texts, load_answers, load_forum_posts
+from Search.suggest import add_post_titles
+from timefmt import vn_format
 
 
 forum = Blueprint("forum", __name__, url_prefix="/forum", template_folder="htmltemplates")
 
 model = SentenceTransformer("keepitreal/vietnamese-sbert")
 
-VN_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
-
-def to_vn_time(value):
-    """
-    value: có thể là string 'YYYY-MM-DD HH:MM:SS' (hoặc có .ffffff) hoặc datetime
-    Trả về datetime đã convert về Asia/Ho_Chi_Minh
-    """
-    if value is None:
-        return None
-
-    if isinstance(value, str):
-        s = value.strip()
-        # thử các format phổ biến
-        for fmt in ("%Y-%m-%d %H:%M:%S.%f", "%Y-%m-%d %H:%M:%S", "%Y-%m-%dT%H:%M:%S.%f", "%Y-%m-%dT%H:%M:%S"):
-            try:
-                dt = datetime.strptime(s, fmt)
-                break
-            except ValueError:
-                dt = None
-        if dt is None:
-            return None
-    else:
-        dt = value
-
-    # Nếu dt không có tzinfo, giả sử DB lưu UTC (thường gặp)
-    if dt.tzinfo is None:
-        dt = dt.replace(tzinfo=ZoneInfo("UTC"))
-
-    return dt.astimezone(VN_TZ)
-
+# Số bài mỗi trang forum (trang đầu và mỗi lần cuộn thêm)
+FORUM_PAGE_SIZE = 10
 
 def compute_similarity(query_text, posts, top_k=5):
     """So sánh độ tương đồng giữa query và posts trong DB"""
@@ -63,52 +43,231 @@ def compute_similarity(query_text, posts, top_k=5):
         r["score"] = float(scored[i][0])
     return results
 
+def encode_cursor(created_at, post_id):
+    """Cursor của trang kế tiếp = (created_at, id) của bài cuối trang hiện tại"""
+    return f"{created_at}|{post_id}"
+
+
+def decode_cursor(cursor):
+    """Trả về (created_at, id) hoặc None nếu cursor rỗng/sai định dạng"""
+    if not cursor or "|" not in cursor:
+        return None
+    created_at, _, post_id = cursor.rpartition("|")
+    try:
+        return created_at, int(post_id)
+    except ValueError:
+        return None
+
+
+def post_url(created_at, post_id):
+    """
+    Link tới trang forum bắt đầu bằng bài này: cursor (created_at, id + 1) chỉ
+    lấy các bài cũ hơn hoặc bằng nó, nên bài là thẻ đầu tiên dù đã bị đẩy khỏi trang 1
+    """
+    return url_for("forum.show_forum", cursor=encode_cursor(created_at, post_id + 1)) + f"#post-{post_id}"
+
+
+def fetch_forum_page(conn, cursor=None, limit=FORUM_PAGE_SIZE):
+    """
+    Một trang bài viết, mới nhất trước, kèm answers.
+    Keyset pagination trên (created_at, id) -> dùng index ix_posts_created_at_id,
+    chi phí mỗi trang không phụ thuộc tổng số bài.
+    Trả về (posts, next_cursor); next_cursor là None khi hết bài.
+    """
+    sql = ("SELECT posts.id, posts.title, posts.content, posts.user_id, posts.tag, posts.created_at,"
+           " posts.answer_count, users.username"
+           " FROM posts JOIN users ON posts.user_id = users.id"
+           " WHERE posts.status = ?")
+    args = [PUBLISHED]  # bài pending_review / rejected không hiện
+    key = decode_cursor(cursor)
+    if key is not None:
+        sql += " AND (posts.created_at, posts.id) < (?, ?)"
+        args.extend(key)
+    sql += " ORDER BY posts.created_at DESC, posts.id DESC LIMIT ?"
+    args.append(limit + 1)  # lấy dư 1 dòng để biết còn trang sau không
+    rows = conn.execute(sql, args).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    posts = [dict(r) for r in rows]
+
+    # Toàn bộ answers của trang trong một query IN (...) thay vì một query mỗi bài;
+    # answer_count = 0 thì khỏi hỏi
+    answers = load_answers(conn, [p["id"] for p in posts if p["answer_count"]])
+    for p in posts:
+        p["answers"] = answers.get(p["id"], [])
+
+    next_cursor = encode_cursor(rows[-1]["created_at"], rows[-1]["id"]) if has_more else None
+    return posts, next_cursor
+
+
+def _viewer_variant():
+    """Những gì trong session làm thay đổi HTML của forum (nút đăng nhập, nút tạo bài, ô trả lời)"""
+    return (bool(session.get("user_id")), session.get("role"), session.get("chat_opt_in"))
+
+
+def render_post_cards(posts, post_versions):
+    """HTML từng bài; mỗi thẻ được cache theo (id, version của bài, có phải expert không)"""
+    is_expert = bool(session.get("user_id")) and session.get("role") == "expert"
+    return [
+        forum_cache.get_or_render(
+            ("card", p["id"], post_versions.get(p["id"], 0), is_expert),
+            lambda p=p: Markup(render_template("forum_post_card.html", post=p)),
+        )
+        for p in posts
+    ]
+
+
+def _render_page(template, cursor):
+    """
+    (html, next_cursor) của một trang; chỉ chạm DB khi version forum đã đổi
+    kể từ lần render trước với cùng cursor và cùng kiểu người xem.
+    """
+    version, post_versions = forum_cache.snapshot()  # lấy trước khi đọc DB
+
+    def render():
+        conn = get_db()
+        posts, next_cursor = fetch_forum_page(conn, cursor)
+        cards = render_post_cards(posts, post_versions)
+        html = render_template(template, cards=cards, next_cursor=next_cursor, stats=forum_totals(conn))
+        return html, next_cursor
+
+    key = (template, decode_cursor(cursor), version, _viewer_variant())
+    return forum_cache.get_or_render(key, render)
+
+
+def _conditional(build):
+    """
+    ETag theo (version forum, URL, kiểu người xem); trình duyệt gửi lại
+    If-None-Match khớp thì trả 304 mà không render gì cả.
+    """
+    tag = forum_cache.etag(forum_cache.version, request.full_path, _viewer_variant())
+    if request.if_none_match.contains_weak(tag):
+        resp = make_response("", 304)
+    else:
+        resp = make_response(build())
+    resp.set_etag(tag, weak=True)
+    # private: HTML khác nhau theo người đăng nhập; no-cache: luôn hỏi lại bằng ETag
+    resp.headers["Cache-Control"] = "private, no-cache"
+    resp.vary.add("Cookie")
+    return resp
+
+
 @forum.route("/")
 def show_forum():
-    conn = get_db()
-    # Lấy tất cả post kèm tên người đăng
-    posts = conn.execute(
-        "SELECT posts.*, users.username FROM posts JOIN users ON posts.user_id = users.id ORDER BY created_at DESC"
-    ).fetchall()
+    cursor = request.args.get("cursor")
+    return _conditional(lambda: _render_page("forum.html", cursor)[0])
 
-    posts_with_answers = []
-    for post in posts:
-        answers = conn.execute(
-            "SELECT answers.*, users.username AS expert_username "
-            "FROM answers JOIN users ON answers.expert_id = users.id "
-            "WHERE post_id=?",
-            (post["id"],)
-        ).fetchall()
 
-        post_dict = dict(post)
+@forum.route("/page")
+def forum_page():
+    """Trang kế tiếp cho infinite scroll: HTML các bài + cursor tiếp theo"""
+    cursor = request.args.get("cursor")
 
-        vn_dt = to_vn_time(post_dict.get("created_at"))
-        if vn_dt:
-            post_dict["created_date"] = vn_dt.strftime("%d/%m/%Y")
-            post_dict["created_time"] = vn_dt.strftime("%H:%M")
-        else:
-            post_dict["created_date"] = ""
-            post_dict["created_time"] = ""
+    def build():
+        html, next_cursor = _render_page("forum_posts.html", cursor)
+        return jsonify(html=html, next_cursor=next_cursor)
 
-        ans_list = []
-        for a in answers:
-            a_dict = dict(a)
+    return _conditional(build)
 
-            vn_a = to_vn_time(a_dict.get("created_at"))
-            if vn_a:
-                a_dict["created_date"] = vn_a.strftime("%d/%m/%Y")
-                a_dict["created_time"] = vn_a.strftime("%H:%M")
-            else:
-                a_dict["created_date"] = ""
-                a_dict["created_time"] = ""
+# Namespace Socket.IO riêng của trang forum: đóng / rời tab forum không chạy
+# on_disconnect của namespace mặc định (kết thúc chat, huỷ hàng chờ ghép cặp)
+FORUM_NAMESPACE = "/forum"
+# Room của những ai đang mở trang forum
+FORUM_ROOM = "forum"
 
-            ans_list.append(a_dict)
 
-        post_dict["answers"] = ans_list
-        posts_with_answers.append(post_dict)
+@socketio.on("connect", namespace=FORUM_NAMESPACE)
+def on_forum_connect():
+    """
+    Trang forum (kể cả khách chưa đăng nhập) nhận bài / câu trả lời mới;
+    tác giả nhận post_moderated ở room user_<id> của namespace này
+    """
+    join_room(FORUM_ROOM)
+    if session.get("user_id"):
+        join_room(f'user_{session["user_id"]}')
+
 
+def _time_fields(created_at):
+    return {"date": vn_format(created_at, "%d/%m/%Y"), "time": vn_format(created_at, "%H:%M")}
+
+
+def broadcast_post(conn, post_id):
+    """Phát sự kiện forum_post gọn (không kèm HTML) cho room forum"""
+    row = conn.execute(
+        "SELECT posts.id, posts.title, posts.content, posts.tag, posts.created_at, users.username "
+        "FROM posts JOIN users ON posts.user_id = users.id WHERE posts.id=?",
+        (post_id,)
+    ).fetchone()
+    if row is None:
+        return
+    payload = {k: row[k] for k in ("id", "title", "content", "tag", "username")}
+    payload.update(_time_fields(row["created_at"]))
+    socketio.emit("forum_post", payload, to=FORUM_ROOM, namespace=FORUM_NAMESPACE)
+
+
+def broadcast_answer(conn, answer_id):
+    """Phát sự kiện forum_answer; tag cho biết bài đã chuyển sang answered chưa"""
+    row = conn.execute(
+        "SELECT answers.id, answers.post_id, answers.content, answers.created_at, "
+        "users.username AS expert_username, posts.tag "
+        "FROM answers JOIN users ON answers.expert_id = users.id "
+        "JOIN posts ON answers.post_id = posts.id WHERE answers.id=?",
+        (answer_id,)
+    ).fetchone()
+    if row is None:
+        return
+    payload = {k: row[k] for k in ("id", "post_id", "content", "expert_username", "tag")}
+    payload.update(_time_fields(row["created_at"]))
+    socketio.emit("forum_answer", payload, to=FORUM_ROOM, namespace=FORUM_NAMESPACE)
+
+
+# Hộp thư expert: bài chưa trả lời xếp theo độ gấp / độ hợp chuyên môn / thời gian chờ
+expert_inbox = ExpertInbox(lambda texts: model.encode(texts, normalize_embeddings=True))
+
+
+def _on_moderated(conn, decisions):
+    """Sau mỗi lô kiểm duyệt: bài được duyệt mới xuất hiện trên forum và trong hộp thư expert"""
+    published = [r for r, status in decisions if status == PUBLISHED]
+    if not published:
+        return
+    # Tiêu đề mới vào chỉ mục gợi ý tìm kiếm
+    add_post_titles(conn, [r["title"] for r in published])
+    conn.commit()
+    # Bài đã publish -> hiện trên forum trước, không phụ thuộc SBERT bên dưới
+    forum_cache.bump()
+    for r in published:
+        broadcast_post(conn, r["id"])
+
+    # Embedding + điểm khủng hoảng tính một lần cho cả lô, lưu lại để khỏi tính lại khi restart
+    try:
+        scores = run_blocking(expert_inbox.annotate, [f"{r['title']} {r['content']}" for r in published])
+    except Exception:
+        # embedding vẫn NULL -> ensure_loaded tính lại lần nạp hộp thư sau
+        logging.exception("Expert inbox scoring failed")
+        return
+    conn.executemany(
+        "UPDATE posts SET embedding=?, crisis_score=? WHERE id=?",
+        [(blob, crisis, r["id"]) for r, (blob, crisis) in zip(published, scores)]
+    )
+    conn.commit()
+    for r in published:
+        row = conn.execute(
+            "SELECT posts.id, posts.title, posts.created_at, posts.crisis_score, posts.embedding, users.username "
+            "FROM posts JOIN users ON posts.user_id = users.id WHERE posts.id=?",
+            (r["id"],)
+        ).fetchone()
+        expert_inbox.add(row)
+
+
+# Kiểm duyệt nền: title + content của cả lô qua classifier trong một lần gọi
+moderation_worker = ModerationWorker(
+    toxic_flags, _on_moderated, namespace=FORUM_NAMESPACE,
+    # bộ đếm cập nhật cùng transaction với việc đổi status
+    on_decided=lambda conn, decisions: record_published(
+        conn, [r for r, status in decisions if status == PUBLISHED]),
+)
 
-    return render_template("forum.html", posts=posts_with_answers)
 
 @forum.route("/post/new", methods=["GET","POST"])
 def new_post():
@@ -122,15 +281,16 @@ def new_post():
         title = request.form["title"]
         content = request.form["content"]
 
-        if is_toxic(content) or is_toxic(title):
-            return render_template("new_post.html", error="Nội dung câu hỏi/tiêu đề không phù hợp. Vui lòng viết lại.")
+        # Không chạy classifier ở đây: lưu pending_review, worker kiểm duyệt theo lô
+        # rồi báo kết quả cho tác giả qua Socket.IO (post_moderated)
         conn = get_db()
         conn.execute(
-            "INSERT INTO posts(title, content, user_id, tag) VALUES(?,?,?,?)",
-            (title, content, session["user_id"], "unanswered")
+            "INSERT INTO posts(title, content, user_id, tag, status) VALUES(?,?,?,?,?)",
+            (title, content, session["user_id"], "unanswered", PENDING)
         )
         conn.commit()
-        return redirect("/forum")
+        moderation_worker.enqueue()
+        return redirect(url_for("forum.show_forum", submitted=1))
 
     return render_template("new_post.html")
 
@@ -143,8 +303,8 @@ def reply_post(post_id):
     post = conn.execute(
         "SELECT posts.*, users.username "
         "FROM posts JOIN users ON posts.user_id = users.id "
-        "WHERE posts.id=?",
-        (post_id,)
+        "WHERE posts.id=? AND posts.status=?",
+        (post_id, PUBLISHED)
     ).fetchone()
     if not post:
         return "Bài viết không tồn tại", 404
@@ -157,22 +317,58 @@ def reply_post(post_id):
             return render_template("reply_post.html", post=post, error="Bạn chưa nhập nội dung.")
 
         # Lưu câu trả lời (ai cũng có thể trả lời)
-        conn.execute(
+        cur = conn.execute(
             "INSERT INTO answers(content, expert_id, post_id) VALUES(?,?,?)",
             (content, session["user_id"], post_id)
         )
 
-        # chỉ expert mới mark answered
+        # chỉ expert mới mark answered; rowcount = 1 khi bài vừa chuyển unanswered -> answered
+        answered_now = False
         if session.get("role") == "expert":
-            conn.execute("UPDATE posts SET tag='answered' WHERE id=?", (post_id,))
+            answered_now = conn.execute(
+                "UPDATE posts SET tag='answered' WHERE id=? AND tag!='answered'", (post_id,)
+            ).rowcount == 1
 
+        record_answer(conn, post_id, session["user_id"], answered_now)
         conn.commit()
-        return redirect(url_for("forum.show_forum") + f"#post-{post_id}")
+        if answered_now:
+            expert_inbox.remove(post_id)
+        forum_cache.bump(post_id)  # sau commit: thẻ bài này + các trang chứa nó
+        broadcast_answer(conn, cur.lastrowid)
+        return redirect(post_url(post["created_at"], post_id))
 
 
     return render_template("reply_post.html", post=post)
 
 
+@forum.route("/inbox")
+def inbox():
+    """Hộp thư expert: top N bài chưa trả lời, ưu tiên cao nhất trước (JSON)"""
+    if "user_id" not in session or session.get("role") != "expert":
+        return jsonify(error="Chỉ expert mới có hộp thư câu hỏi"), 403
+
+    conn = get_db()
+    profile = conn.execute(
+        "SELECT specialization FROM expert_profiles WHERE user_id=?", (session["user_id"],)
+    ).fetchone()
+    specialization = profile["specialization"] if profile else None
+    limit = request.args.get("limit", type=int)
+
+    items = expert_inbox.top(conn, session["user_id"], specialization, limit)
+    return jsonify(posts=[
+        {
+            "id": post.id,
+            "title": post.title,
+            "username": post.username,
+            "created_at": vn_format(post.created_at),
+            "crisis_score": round(post.crisis, 3),
+            "match_score": round(match, 3),
+            "url": post_url(post.created_at, post.id),
+        }
+        for post, match in items
+    ])
+
+
 # @forum.route("/search_forum", methods=["GET"])
 # def search_forum():
 #     query = request.args.get("q", "").strip()
@@ -193,41 +389,13 @@ def search_forum():
     if not query:
         return render_template("search_results.html", query=query, posts=[])
 
-    posts = get_all_forum_posts()
-    top_results = compute_similarity(query, posts)
-    filtered_results = [p for p in top_results if not is_toxic(p["content"])]
-    db = get_db()
-    for post in filtered_results:
-        # convert timezone + tạo field hiển thị
-        vn_dt = to_vn_time(post.get("created_at"))
-        if vn_dt:
-            post["created_date"] = vn_dt.strftime("%d/%m/%Y")
-            post["created_time"] = vn_dt.strftime("%H:%M")
-        else:
-            post["created_date"] = ""
-            post["created_time"] = ""
-
-        answers = db.execute(
-            "SELECT a.content, a.created_at, u.username as expert_username "
-            "FROM answers a "
-            "JOIN users u ON a.expert_id = u.id "
-            "WHERE a.post_id=?",
-            (post["id"],)
-        ).fetchall()
-
-        ans_list = []
-        for a in answers:
-            vn_a = to_vn_time(a["created_at"])
-            ans_list.append({
-                "content": a["content"],
-                "expert_username": a["expert_username"],
-                "created_date": vn_a.strftime("%d/%m/%Y") if vn_a else "",
-                "created_time": vn_a.strftime("%H:%M") if vn_a else "",
-            })
-
-        post["answers"] = ans_list
-
-    return render_template("search_results.html", posts=filtered_results, query=query)
+    # Chấm điểm trên title + content (không nạp answers), rồi chỉ nạp đủ các bài top:
+    # tổng cộng 3 query dù forum có bao nhiêu bài.
+    # Chỉ có bài đã qua hàng đợi kiểm duyệt -> không cần chạy lại classifier từng kết quả
+    scores = {p["id"]: p["score"] for p in compute_similarity(query, get_forum_post_texts())}
+    top_results = [dict(p, score=scores[p["id"]]) for p in load_forum_posts(list(scores))]
+
+    return render_template("search_results.html", posts=top_results, query=query)
 
 
 # print(is_toxic("fuck"))   # phải trả về True
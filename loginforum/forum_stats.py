@@ -0,0 +1,174 @@
+"""
+Materialized forum counters
+===========================
+
+Counts that used to need a full load of posts/answers are kept as rows and
+updated in the same transaction as the write that changes them:
+
+- forum_stats(key, value): "posts" (published), "unanswered", "answers"
+- posts.answer_count
+- user_forum_stats(user_id, post_count, answer_count, last_active_at)
+
+The writers are reply_post (record_answer) and the moderation batch
+(record_published). Nothing is counted at new_post, because a pending
+post is not visible yet.
+
+`reconcile` recomputes everything from posts/answers and fixes any drift
+(manual DB edits, a crash between two statements). It runs at startup
+and then every RECONCILE_HOURS, or from the CLI:
+
+    python -m loginforum.forum_stats
+"""
+
+import logging
+import sqlite3
+import time
+
+from db import DATABASE
+from timefmt import utc_now_str
+from .extensions import socketio
+
+FORUM_KEYS = ("posts", "unanswered", "answers")
+RECONCILE_HOURS = 6
+
+
+def _bump(conn, key, delta):
+    conn.execute(
+        "INSERT INTO forum_stats(key, value) VALUES(?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = value + excluded.value",
+        (key, delta)
+    )
+
+
+def _bump_user(conn, user_id, posts=0, answers=0):
+    conn.execute(
+        "INSERT INTO user_forum_stats(user_id, post_count, answer_count, last_active_at) VALUES(?,?,?,?) "
+        "ON CONFLICT(user_id) DO UPDATE SET "
+        "post_count = post_count + excluded.post_count, "
+        "answer_count = answer_count + excluded.answer_count, "
+        "last_active_at = excluded.last_active_at",
+        (user_id, posts, answers, utc_now_str())
+    )
+
+
+def record_published(conn, rows):
+    """Bài vừa được duyệt (rows có user_id); gọi trước commit của lô kiểm duyệt"""
+    if not rows:
+        return
+    _bump(conn, "posts", len(rows))
+    _bump(conn, "unanswered", len(rows))
+    for r in rows:
+        _bump_user(conn, r["user_id"], posts=1)
+
+
+def record_answer(conn, post_id, user_id, answered_now):
+    """
+    Một answer mới; answered_now = bài vừa chuyển unanswered -> answered.
+    Gọi trước conn.commit() của reply_post.
+    """
+    conn.execute("UPDATE posts SET answer_count = answer_count + 1 WHERE id=?", (post_id,))
+    _bump(conn, "answers", 1)
+    if answered_now:
+        _bump(conn, "unanswered", -1)
+    _bump_user(conn, user_id, answers=1)
+
+
+def forum_totals(conn):
+    """{"posts", "unanswered", "answers"}: đọc thẳng bảng forum_stats, không đếm lại"""
+    totals = dict.fromkeys(FORUM_KEYS, 0)
+    totals.update((r[0], r[1]) for r in conn.execute("SELECT key, value FROM forum_stats"))
+    return totals
+
+
+def reconcile(conn):
+    """
+    Đếm lại từ posts / answers, sửa chỗ lệch, trả về số giá trị đã sửa
+    theo từng nhóm: {"forum": n, "posts": n, "users": n}.
+    """
+    # Giữ write lock suốt lần đếm: reply / kiểm duyệt chen vào giữa sẽ không bị ghi đè
+    if conn.in_transaction:
+        conn.commit()
+    conn.execute("BEGIN IMMEDIATE")
+    expected = {
+        "posts": conn.execute("SELECT COUNT(*) FROM posts WHERE status='published'").fetchone()[0],
+        "unanswered": conn.execute(
+            "SELECT COUNT(*) FROM posts WHERE status='published' AND tag='unanswered'"
+        ).fetchone()[0],
+        "answers": conn.execute("SELECT COUNT(*) FROM answers").fetchone()[0],
+    }
+    current = forum_totals(conn)
+    forum_fixed = 0
+    for key, value in expected.items():
+        if current.get(key) != value:
+            conn.execute(
+                "INSERT INTO forum_stats(key, value) VALUES(?, ?) "
+                "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+                (key, value)
+            )
+            forum_fixed += 1
+
+    posts_fixed = conn.execute("""
+        UPDATE posts SET answer_count = (SELECT COUNT(*) FROM answers WHERE answers.post_id = posts.id)
+        WHERE answer_count != (SELECT COUNT(*) FROM answers WHERE answers.post_id = posts.id)
+    """).rowcount
+
+    users = {}
+    for user_id, n, last in conn.execute(
+        "SELECT user_id, COUNT(*), MAX(created_at) FROM posts WHERE status='published' GROUP BY user_id"
+    ):
+        users[user_id] = [n, 0, last]
+    for user_id, n, last in conn.execute(
+        "SELECT expert_id, COUNT(*), MAX(created_at) FROM answers GROUP BY expert_id"
+    ):
+        entry = users.setdefault(user_id, [0, 0, None])
+        entry[1] = n
+        entry[2] = max(filter(None, (entry[2], last)), default=None)
+    stored = {
+        r[0]: (r[1], r[2]) for r in conn.execute("SELECT user_id, post_count, answer_count FROM user_forum_stats")
+    }
+    users_fixed = 0
+    for user_id, (posts, answers, last) in users.items():
+        if stored.pop(user_id, None) != (posts, answers):
+            conn.execute(
+                "INSERT INTO user_forum_stats(user_id, post_count, answer_count, last_active_at) VALUES(?,?,?,?) "
+                "ON CONFLICT(user_id) DO UPDATE SET post_count = excluded.post_count, "
+                "answer_count = excluded.answer_count, "
+                "last_active_at = COALESCE(last_active_at, excluded.last_active_at)",
+                (user_id, posts, answers, last)
+            )
+            users_fixed += 1
+    for user_id in stored:  # user không còn bài / answer nào
+        users_fixed += conn.execute(
+            "UPDATE user_forum_stats SET post_count=0, answer_count=0 WHERE user_id=? "
+            "AND (post_count != 0 OR answer_count != 0)",
+            (user_id,)
+        ).rowcount
+
+    conn.commit()
+    return {"forum": forum_fixed, "posts": posts_fixed, "users": users_fixed}
+
+
+def _reconcile_loop(database, interval):
+    while True:
+        try:
+            conn = sqlite3.connect(database, timeout=10)
+            try:
+                drift = reconcile(conn)
+            finally:
+                conn.close()
+            if any(drift.values()):
+                logging.warning("Forum counters drifted, fixed: %s", drift)
+        except Exception:
+            logging.exception("Forum counter reconciliation failed")
+        time.sleep(interval)
+
+
+def start_reconciler(database=DATABASE, interval=RECONCILE_HOURS * 3600):
+    """Đối soát ngay khi khởi động rồi định kỳ (background task của Socket.IO)"""
+    socketio.start_background_task(_reconcile_loop, database, interval)
+
+
+if __name__ == "__main__":
+    conn = sqlite3.connect(DATABASE)
+    print(reconcile(conn))
+    conn.close()
@@ -0,0 +1,96 @@
+"""
+Rendered-fragment cache for the forum
+=====================================
+
+The forum only changes when `new_post` or `reply_post` writes, yet every
+visit re-rendered every post card. HTML is cached at two levels:
+
+- post card: keyed by (post id, post version, viewer variant)
+- page: keyed by (cursor, forum version, viewer variant)
+
+Writes bump version stamps instead of deleting entries: `bump()` after a new
+post (every page shifts), `bump(post_id)` after a reply (that card and every
+page). Stale entries are simply never looked up again and age out of the LRU.
+
+Versions live in process memory. The ETag also carries a per-process epoch,
+so an ETag issued before a restart never matches a reset counter.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+MAX_ENTRIES = 2000
+
+
+class FragmentCache:
+    def __init__(self, max_entries: int = MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.epoch = f"{os.getpid():x}{int(time.time()):x}"
+        self._version = 0
+        self._post_versions: Dict[int, int] = {}
+        self._entries: "OrderedDict[Hashable, Any]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def version(self) -> int:
+        return self._version
+
+    def bump(self, post_id: Optional[int] = None) -> None:
+        """Invalidate every page, and the card of post_id if given."""
+        with self._lock:
+            self._version += 1
+            if post_id is not None:
+                self._post_versions[post_id] = self._post_versions.get(post_id, 0) + 1
+
+    def get_or_render(self, key: Hashable, render: Callable[[], Any]) -> Any:
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return self._entries[key]
+            self.misses += 1
+        # Render ngoài lock: hai request cùng miss chỉ render trùng, không chặn nhau
+        value = render()
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def snapshot(self) -> Tuple[int, Dict[int, int]]:
+        """
+        (forum version, post versions) taken before reading the DB. Keys built
+        from it can only hold data at least as new as the stamps, because
+        writers bump after their commit.
+        """
+        with self._lock:
+            return self._version, dict(self._post_versions)
+
+    def etag(self, version: int, *parts: Any) -> str:
+        """Opaque (unquoted) ETag for a response built at forum `version`."""
+        # parts có thể chứa cursor người dùng gửi lên -> băm để ETag luôn hợp lệ
+        digest = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()[:16]
+        return f"{self.epoch}-{version}-{digest}"
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "version": self._version,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+        }
+
+
+forum_cache = FragmentCache()
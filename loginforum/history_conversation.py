@@ -1,6 +1,8 @@
 ﻿# history_conversation.py
 from flask import Blueprint, request, jsonify, render_template, current_app
 from db import get_db  # Hàm trả về conn SQLite (dict row)
+from .write_behind import message_buffer
+from .chat_pages import conversation_page, page_args, page_meta
 import logging
 
 # --- Tạo Blueprint ---
@@ -39,11 +41,11 @@ def save_history():
 @history_bp.route('/api/get_history/<string:session_key>', methods=['GET'])
 def get_history(session_key):
     try:
+        message_buffer.sync()
         conn = get_db()
-        records = conn.execute(
-            "SELECT * FROM conversation_history WHERE session_key=? ORDER BY timestamp ASC",
-            (session_key,)
-        ).fetchall()
+        # Một trang, mới nhất trước; ?before_id= để lấy trang cũ hơn
+        before_id, limit = page_args(request.args)
+        records, next_before_id = conversation_page(conn, session_key, before_id, limit)
 
         history_list = []
         for r in records:
@@ -57,7 +59,7 @@ def get_history(session_key):
                 "timestamp": r["timestamp"]
             })
 
-        return jsonify({"status": "success", "history": history_list}), 200
+        return jsonify({"status": "success", "history": history_list, **page_meta(next_before_id)}), 200
 
     except Exception as e:
         logging.error(f"Error fetching history: {e}")
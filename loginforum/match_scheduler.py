@@ -0,0 +1,192 @@
+"""
+Batch matching over chat_queue
+==============================
+
+`request_match` used to match synchronously inside the Socket.IO handler,
+and a seeker who found nobody free got `match_failed` straight away. Now
+the handler only writes the seeker into chat_queue (status `waiting`) and
+wakes this scheduler.
+
+The scheduler runs as a Socket.IO background task. On each wake-up, or
+every TICK_SECONDS, it:
+
+1. expires entries that have waited longer than QUEUE_TIMEOUT_SECONDS
+   (`expired`, the seeker gets `match_failed`)
+2. matches every waiting seeker against the free helpers in one
+   `Matchmaker.assign` call. It respects illness tags and serves seekers
+   who have waited longest first.
+3. creates all the chat sessions of the batch and flips their queue rows
+   to `matched` in one transaction, then emits `match_found` /
+   `force_join_room`
+
+A seeker who is not matched simply stays in the queue for the next tick,
+so a helper who comes online a few seconds later still gets them.
+Cancelled entries (`cancel_match`, disconnect) become `cancelled`.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+import uuid
+
+from db import DATABASE
+from .extensions import socketio
+
+WAITING = "waiting"
+MATCHED = "matched"
+CANCELLED = "cancelled"
+EXPIRED = "expired"
+
+TICK_SECONDS = 2
+BATCH_LIMIT = 500        # người chờ lâu nhất trước; phần còn lại sang lượt kế tiếp
+QUEUE_TIMEOUT_SECONDS = 120
+RETRY_SECONDS = 5
+
+
+class MatchScheduler:
+    def __init__(self, matchmaker, database=DATABASE, tick=TICK_SECONDS, timeout=QUEUE_TIMEOUT_SECONDS):
+        self.matchmaker = matchmaker
+        self.database = database
+        self.tick = tick
+        self.timeout = timeout
+        self._wake = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self.matched = 0
+        self.expired = 0
+        self.batches = 0
+
+    def start(self):
+        with self._start_lock:
+            if not self._started:
+                self._started = True
+                socketio.start_background_task(self._run)
+
+    # --- Gọi từ handler (connection của request) ---
+    def enqueue(self, conn, seeker_id, illness, prefer_expert=False):
+        """
+        Đưa seeker vào hàng chờ (đã chờ rồi thì chỉ đổi chủ đề, giữ nguyên
+        thời điểm xếp hàng), commit, đánh thức scheduler.
+        Trả về vị trí trong hàng chờ (1 = người chờ lâu nhất).
+        """
+        updated = conn.execute(
+            "UPDATE chat_queue SET illness_type=?, prefer_expert=? WHERE user_id=? AND status=?",
+            (illness, int(bool(prefer_expert)), seeker_id, WAITING)
+        ).rowcount
+        if not updated:
+            conn.execute(
+                "INSERT INTO chat_queue(user_id, illness_type, status, prefer_expert) VALUES(?,?,?,?)",
+                (seeker_id, illness, WAITING, int(bool(prefer_expert)))
+            )
+        conn.commit()
+        position = conn.execute(
+            "SELECT COUNT(*) FROM chat_queue WHERE status=? AND id <= "
+            "(SELECT id FROM chat_queue WHERE user_id=? AND status=?)",
+            (WAITING, seeker_id, WAITING)
+        ).fetchone()[0]
+        self.start()
+        self._wake.set()
+        return position
+
+    def cancel(self, conn, seeker_id):
+        """Huỷ lượt chờ của seeker (nếu có); trả về True nếu có lượt bị huỷ"""
+        n = conn.execute(
+            "UPDATE chat_queue SET status=? WHERE user_id=? AND status=?",
+            (CANCELLED, seeker_id, WAITING)
+        ).rowcount
+        conn.commit()
+        return n > 0
+
+    # --- Vòng lặp nền ---
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.tick)
+            self._wake.clear()
+            try:
+                conn = self._connect()
+                try:
+                    self.run_batch(conn)
+                finally:
+                    conn.close()
+            except Exception:
+                logging.exception("Chat matching batch failed")
+                time.sleep(RETRY_SECONDS)
+
+    def _expire(self, conn):
+        rows = conn.execute(
+            "SELECT id, user_id FROM chat_queue WHERE status=? AND requested_at < datetime('now', ?)",
+            (WAITING, f"-{self.timeout} seconds")
+        ).fetchall()
+        if not rows:
+            return
+        conn.executemany(
+            "UPDATE chat_queue SET status=? WHERE id=? AND status=?",
+            [(EXPIRED, r["id"], WAITING) for r in rows]
+        )
+        conn.commit()
+        self.expired += len(rows)
+        for r in rows:
+            socketio.emit("match_failed", {"message": "Không tìm thấy ai rảnh."}, to=f"user_{r['user_id']}")
+
+    def run_batch(self, conn):
+        """Một lượt ghép cho toàn bộ hàng chờ; trả về số cặp đã tạo"""
+        self._expire(conn)
+        waiting = conn.execute(
+            "SELECT id, user_id, illness_type, prefer_expert FROM chat_queue "
+            "WHERE status=? ORDER BY requested_at, id LIMIT ?",
+            (WAITING, BATCH_LIMIT)
+        ).fetchall()
+        if not waiting:
+            return 0
+        self.batches += 1
+
+        pairs = self.matchmaker.assign(
+            conn, [(r["user_id"], r["illness_type"], bool(r["prefer_expert"])) for r in waiting]
+        )
+        if not pairs:
+            return 0
+
+        created = []
+        released = set()
+        try:
+            for i, helper_id, is_expert in pairs:
+                r = waiting[i]
+                # status=? trong WHERE: lượt chờ vừa bị huỷ thì không ghép nữa
+                if not conn.execute("UPDATE chat_queue SET status=? WHERE id=? AND status=?",
+                                    (MATCHED, r["id"], WAITING)).rowcount:
+                    self.matchmaker.release(r["user_id"], helper_id)
+                    released.add(i)
+                    continue
+                session_key = str(uuid.uuid4())
+                conn.execute(
+                    "INSERT INTO chat_sessions (session_key, seeker_id, helper_id, status, is_expert_fallback) "
+                    "VALUES (?, ?, ?, ?, ?)",
+                    (session_key, r["user_id"], helper_id, "active", is_expert)
+                )
+                created.append((session_key, r["user_id"], helper_id))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            # Cả lô không được lưu: trả lại các cặp còn giữ chỗ
+            for i, helper_id, _ in pairs:
+                if i not in released:
+                    self.matchmaker.release(waiting[i]["user_id"], helper_id)
+            raise
+
+        for session_key, seeker_id, helper_id in created:
+            self.matchmaker.start_session(session_key, seeker_id, helper_id)
+            room_url = f"/chat/room/{session_key}"
+            # Ép helper join room, rồi báo seeker
+            socketio.emit("force_join_room", {"room_url": room_url}, to=f"user_{helper_id}")
+            socketio.emit("match_found", {"room_url": room_url}, to=f"user_{seeker_id}")
+        self.matched += len(created)
+        return len(created)
+
+    def stats(self):
+        return {"matched": self.matched, "expired": self.expired, "batches": self.batches}
@@ -0,0 +1,272 @@
+"""
+In-memory matchmaking for peer chat
+===================================
+
+`find_match_for_user` used to run up to three `ORDER BY RANDOM()` scans of
+users, each with `NOT IN` subqueries over every chat session ever created.
+The matchmaker keeps the same answer in memory:
+
+- one pool per tag `cured_<illness>` (from user_tags)
+- `cured`: every opted-in student with a `cured` or `cured_*` tag
+- `experts`: every opted-in expert
+- busy: users in an active chat session (a count per user), removed from
+  all pools; `is_busy` answers availability without touching chat_sessions
+
+A pool is a list plus a position dict, so add, remove and a random pick are
+all O(1). `assign` matches a whole batch of waiting seekers at once (see
+match_scheduler.py). The fallback order is unchanged: matching tag, then
+any cured student, then an expert (or straight to an expert with
+prefer_anonymous). Matching tags is a bipartite matching, so a helper with
+several tags is not used up by one seeker while another seeker needs them,
+and seekers who have waited longer are served first.
+
+The pools are loaded from the DB on first use and then kept current by
+the opt-in toggle, status changes, session start (`assign`) and session end
+(`end_session`, from leave_chat and disconnect). State is per process, like
+the expert inbox; the app runs a single Socket.IO server process.
+
+Loading reads active sessions through the partial index
+ix_chat_sessions_active, so it does not grow with the ended-session
+history. Sessions left active longer than SESSION_MAX_HOURS (the server
+stopped before leave/disconnect could end them) are ended first, so
+their users do not stay busy forever.
+"""
+
+import random
+import threading
+from collections import Counter
+
+from .user_tags import get_user_tags, is_cured
+
+SESSION_MAX_HOURS = 12
+
+
+class _Pool:
+    """Tập hợp chọn ngẫu nhiên O(1): list + vị trí của từng phần tử"""
+
+    def __init__(self):
+        self.items = []
+        self.pos = {}
+
+    def __len__(self):
+        return len(self.items)
+
+    def add(self, x):
+        if x not in self.pos:
+            self.pos[x] = len(self.items)
+            self.items.append(x)
+
+    def discard(self, x):
+        i = self.pos.pop(x, None)
+        if i is None:
+            return
+        last = self.items.pop()
+        if i < len(self.items):
+            # đưa phần tử cuối vào chỗ trống
+            self.items[i] = last
+            self.pos[last] = i
+
+    def choice(self):
+        return random.choice(self.items) if self.items else None
+
+
+def _pool_keys(role, tags, opted_in):
+    """Các pool mà user thuộc về khi đang rảnh; tags: chữ thường, từ user_tags"""
+    if not opted_in or opted_in == "0":
+        return ()
+    if (role or "").upper() == "EXPERT":
+        return ("experts",)
+    if not is_cured(tags):
+        return ()
+    return ("cured",) + tuple(t for t in tags if t.startswith("cured_"))
+
+
+class Matchmaker:
+    def __init__(self):
+        self._pools = {}
+        self._keys = {}        # user_id -> các pool của user (kể cả khi đang bận)
+        self._busy = Counter()  # user_id -> số session active đang tham gia
+        self._sessions = {}    # session_key -> (seeker_id, helper_id), chỉ session active
+        self._loaded = False
+        self._lock = threading.RLock()
+
+    def _pool(self, key):
+        pool = self._pools.get(key)
+        if pool is None:
+            pool = self._pools[key] = _Pool()
+        return pool
+
+    def _set_user(self, user_id, keys):
+        for key in self._keys.pop(user_id, ()):
+            self._pools[key].discard(user_id)
+        if keys:
+            self._keys[user_id] = keys
+            if user_id not in self._busy:
+                for key in keys:
+                    self._pool(key).add(user_id)
+
+    def _mark_busy(self, *user_ids):
+        for uid in user_ids:
+            self._busy[uid] += 1
+            for key in self._keys.get(uid, ()):
+                self._pools[key].discard(uid)
+
+    def _mark_free(self, *user_ids):
+        for uid in user_ids:
+            n = self._busy.get(uid, 0)
+            if n > 1:
+                self._busy[uid] = n - 1
+                continue
+            self._busy.pop(uid, None)
+            for key in self._keys.get(uid, ()):
+                self._pool(key).add(uid)
+
+    # --- Nạp từ DB (một lần) ---
+    def ensure_loaded(self, conn):
+        if self._loaded:
+            return
+        with self._lock:
+            if self._loaded:
+                return
+            conn.execute(
+                "UPDATE chat_sessions SET status='ended' "
+                "WHERE status='active' AND created_at < datetime('now', ?)",
+                (f"-{SESSION_MAX_HOURS} hours",)
+            )
+            conn.commit()
+            for r in conn.execute(
+                "SELECT session_key, seeker_id, helper_id FROM chat_sessions WHERE status='active'"
+            ):
+                self._sessions[r[0]] = (r[1], r[2])
+                self._mark_busy(r[1], r[2])
+            for r in conn.execute(
+                "SELECT u.id, u.role, group_concat(t.tag), u.chat_opt_in FROM users u "
+                "LEFT JOIN user_tags t ON t.user_id = u.id "
+                "WHERE u.chat_opt_in=1 OR u.chat_opt_in='1' GROUP BY u.id"
+            ):
+                self._set_user(r[0], _pool_keys(r[1], r[2].split(",") if r[2] else [], r[3]))
+            self._loaded = True
+
+    # --- Cập nhật ---
+    def refresh_user(self, conn, user_id):
+        """Đọc lại role / tag / chat_opt_in của user sau khi đổi (toggle opt-in, đổi trạng thái)"""
+        with self._lock:
+            if not self._loaded:
+                return  # lần nạp đầu sẽ đọc từ DB
+            r = conn.execute("SELECT role, chat_opt_in FROM users WHERE id=?", (user_id,)).fetchone()
+            keys = _pool_keys(r[0], get_user_tags(conn, user_id), r[1]) if r else ()
+            self._set_user(user_id, keys)
+
+    def end_session(self, session_key):
+        """Session kết thúc (rời phòng / ngắt kết nối): hai người rảnh trở lại"""
+        with self._lock:
+            users = self._sessions.pop(session_key, None)
+            if users is None:
+                return
+            self._mark_free(*users)
+
+    def is_busy(self, conn, user_id):
+        """User đang trong một session active?"""
+        self.ensure_loaded(conn)
+        with self._lock:
+            return user_id in self._busy
+
+    # --- Ghép cặp ---
+    def _match_tag(self, seekers):
+        """
+        Bipartite matching (đường tăng, Kuhn) seeker -> helper cùng tag cured_<illness>.
+        seekers: [(i, key)] cũ nhất trước; seeker đã ghép không bao giờ bị bỏ ra
+        khi xét seeker sau, nên người chờ lâu hơn luôn được ưu tiên.
+        """
+        by_key = {}  # một danh sách xáo trộn cho mỗi tag, dùng chung cho các seeker cùng tag
+        for _, key in seekers:
+            if key not in by_key:
+                pool = self._pools.get(key)
+                by_key[key] = random.sample(pool.items, len(pool)) if pool else []
+        cands = {i: by_key[key] for i, key in seekers}
+        owner = {}  # helper_id -> i
+
+        def augment(i, seen):
+            for h in cands[i]:
+                if h in seen:
+                    continue
+                seen.add(h)
+                if h not in owner or augment(owner[h], seen):
+                    owner[h] = i
+                    return True
+            return False
+
+        helpers = set()
+        for c in by_key.values():
+            helpers.update(c)
+        for i, _ in seekers:
+            if len(owner) == len(helpers):
+                break  # không còn helper rảnh -> không còn đường tăng nào
+            # Có helper còn trống thì lấy luôn, không cần tìm đường tăng
+            free = next((h for h in cands[i] if h not in owner), None)
+            if free is not None:
+                owner[free] = i
+            elif cands[i]:
+                augment(i, set())
+        return {i: h for h, i in owner.items()}
+
+    def assign(self, conn, requests):
+        """
+        Ghép cả một lô người chờ với helper đang rảnh.
+        requests: [(seeker_id, illness, prefer_expert)], chờ lâu nhất trước.
+        Trả về [(chỉ số trong requests, helper_id, is_expert)]; cả hai người
+        đã bị đánh dấu bận -> người gọi phải start_session hoặc release.
+        Thứ tự ưu tiên như cũ: đúng tag -> cured bất kỳ -> expert
+        (prefer_expert: vào thẳng expert).
+        """
+        self.ensure_loaded(conn)
+        with self._lock:
+            seekers = []
+            seen = set()
+            for i, (seeker_id, illness, prefer_expert) in enumerate(requests):
+                if seeker_id in self._busy or seeker_id in seen:
+                    continue  # đang trong session khác / trùng trong lô
+                seen.add(seeker_id)
+                seekers.append((i, seeker_id, (illness or "").strip().lower(), prefer_expert))
+            # Người đang chờ không làm helper cho người khác trong cùng lô
+            self._mark_busy(*seen)
+
+            result = {}
+            tagged = [(i, f"cured_{illness}") for i, _, illness, prefer_expert in seekers if not prefer_expert]
+            for i, helper_id in self._match_tag(tagged).items():
+                result[i] = (helper_id, 0)
+                self._mark_busy(helper_id)
+
+            for i, _, _, prefer_expert in seekers:
+                if i in result:
+                    continue
+                for key in (("experts",) if prefer_expert else ("cured", "experts")):
+                    pool = self._pools.get(key)
+                    helper_id = pool.choice() if pool else None
+                    if helper_id is not None:
+                        result[i] = (helper_id, int(key == "experts"))
+                        self._mark_busy(helper_id)
+                        break
+
+            self._mark_free(*(seeker_id for i, seeker_id, _, _ in seekers if i not in result))
+            return [(i, h, is_expert) for i, (h, is_expert) in sorted(result.items())]
+
+    def start_session(self, session_key, seeker_id, helper_id):
+        with self._lock:
+            self._sessions[session_key] = (seeker_id, helper_id)
+
+    def release(self, seeker_id, helper_id):
+        """Tạo session thất bại sau assign"""
+        with self._lock:
+            self._mark_free(seeker_id, helper_id)
+
+    def stats(self):
+        with self._lock:
+            return {
+                "pools": {k: len(p) for k, p in self._pools.items()},
+                "busy": len(self._busy),
+                "active_sessions": len(self._sessions),
+            }
+
+
+matchmaker = Matchmaker()
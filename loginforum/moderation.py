@@ -0,0 +1,130 @@
+"""
+Moderation queue for forum posts
+================================
+
+`new_post` used to run both toxicity models over title and content before
+answering the student. Now it only inserts the post as `pending_review`
+and wakes this worker.
+
+The worker runs as a Socket.IO background task. It takes pending posts in
+batches of up to BATCH_SIZE and runs one classifier call per batch over
+every title and content. Each post is then flipped to `published` or
+`rejected`, and the author is notified on their `user_<id>` room (in the
+worker's Socket.IO namespace) with a `post_moderated` event.
+
+The queue is the posts table itself, so nothing is lost on restart: leftover
+pending posts are picked up by the idle poll.
+"""
+
+import logging
+import sqlite3
+import threading
+import time
+
+from db import DATABASE
+from .extensions import socketio
+
+PENDING = "pending_review"
+PUBLISHED = "published"
+REJECTED = "rejected"
+
+BATCH_SIZE = 16
+IDLE_SECONDS = 10    # quét lại định kỳ: bài còn pending sau restart, lần đánh thức bị lỡ
+RETRY_SECONDS = 30   # classifier lỗi -> đợi rồi thử lại, bài vẫn pending
+
+try:
+    # Inference torch chạy trong thread thật, không chặn event loop của eventlet
+    from eventlet import tpool
+    run_blocking = tpool.execute
+except ImportError:
+    def run_blocking(fn, *args):
+        return fn(*args)
+
+
+class ModerationWorker:
+    """
+    classify: list[str] -> list[bool] (True = vi phạm), gọi một lần mỗi lô
+    on_decided: (conn, decisions) trong cùng transaction với việc đổi status (vd. bộ đếm)
+    on_done: (conn, decisions) sau khi lô đã commit; decisions = [(post row, status)]
+    namespace: namespace Socket.IO của room user_<id> nhận post_moderated
+    """
+
+    def __init__(self, classify, on_done=None, batch_size=BATCH_SIZE, database=DATABASE,
+                 on_decided=None, namespace=None):
+        self.classify = classify
+        self.namespace = namespace
+        self.on_decided = on_decided
+        self.on_done = on_done
+        self.batch_size = batch_size
+        self.database = database
+        self._wake = threading.Event()
+        self._started = False
+        self._start_lock = threading.Lock()
+        self.processed = 0
+        self.batches = 0
+
+    def start(self):
+        with self._start_lock:
+            if not self._started:
+                self._started = True
+                socketio.start_background_task(self._run)
+
+    def enqueue(self):
+        """Gọi sau khi commit một bài pending"""
+        self.start()
+        self._wake.set()
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=10)
+        conn.row_factory = sqlite3.Row
+        return conn
+
+    def _run(self):
+        while True:
+            self._wake.wait(IDLE_SECONDS)
+            self._wake.clear()
+            try:
+                conn = self._connect()
+                try:
+                    while self.process_batch(conn):
+                        pass
+                finally:
+                    conn.close()
+            except Exception:
+                logging.exception("Moderation batch failed")
+                time.sleep(RETRY_SECONDS)
+
+    def process_batch(self, conn):
+        """Kiểm duyệt một lô; trả về số bài đã xử lý (0 = hết hàng đợi)"""
+        rows = conn.execute(
+            "SELECT id, user_id, title, content FROM posts WHERE status=? ORDER BY id LIMIT ?",
+            (PENDING, self.batch_size)
+        ).fetchall()
+        if not rows:
+            return 0
+
+        texts = [r["title"] for r in rows] + [r["content"] for r in rows]
+        flags = run_blocking(self.classify, texts)
+        n = len(rows)
+        decisions = []
+        for i, r in enumerate(rows):
+            status = REJECTED if flags[i] or flags[n + i] else PUBLISHED
+            # status=? trong WHERE: bài đã bị xử lý ở nơi khác thì không ghi đè
+            if conn.execute("UPDATE posts SET status=? WHERE id=? AND status=?",
+                            (status, r["id"], PENDING)).rowcount:
+                decisions.append((r, status))
+        if self.on_decided is not None:
+            self.on_decided(conn, decisions)
+        conn.commit()
+        self.processed += len(decisions)
+        self.batches += 1
+
+        if self.on_done is not None:
+            self.on_done(conn, decisions)
+        for r, status in decisions:
+            socketio.emit("post_moderated", {
+                "post_id": r["id"],
+                "title": r["title"],
+                "status": status,
+            }, to=f"user_{r['user_id']}", namespace=self.namespace)
+        return n
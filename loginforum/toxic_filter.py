@@ -35,6 +35,33 @@ def is_toxic_vi(text: str, threshold: float = VI_THRESHOLD) -> bool:
     # probs[1] = OFFENSIVE, probs[2] = HATE
     return probs[1] > threshold or probs[2] > threshold
 
+# — Theo lô: một lần forward cho cả danh sách (hàng đợi kiểm duyệt) —
+def toxic_scores_en(texts):
+    inputs = en_tokenizer(texts, return_tensors="pt", truncation=True, padding=True)
+    with torch.no_grad():
+        outputs = en_model(**inputs)
+    return torch.sigmoid(outputs.logits).max(dim=1).values.tolist()
+
+def toxic_scores_vi(texts):
+    inputs = vi_tokenizer(texts, return_tensors="pt", truncation=True, padding=True)
+    with torch.no_grad():
+        outputs = vi_model(**inputs)
+    probs = torch.softmax(outputs.logits, dim=1)
+    # max(OFFENSIVE, HATE) cho từng câu
+    return probs[:, 1:3].max(dim=1).values.tolist()
+
+def toxic_flags(texts, en_threshold: float = EN_THRESHOLD, vi_threshold: float = VI_THRESHOLD):
+    """Giống is_toxic cho từng text; model Anh chỉ chạy trên những text model Việt cho qua"""
+    texts = list(texts)
+    if not texts:
+        return []
+    flags = [p > vi_threshold for p in toxic_scores_vi(texts)]
+    rest = [i for i, f in enumerate(flags) if not f]
+    if rest:
+        for i, p in zip(rest, toxic_scores_en([texts[i] for i in rest])):
+            flags[i] = p > en_threshold
+    return flags
+
 # — Kết hợp —
 def is_toxic(text: str, en_threshold: float = EN_THRESHOLD, vi_threshold: float = VI_THRESHOLD) -> bool:
     # Nếu là tiếng Việt hoặc mix: check với vi_model
@@ -0,0 +1,41 @@
+"""
+users.status_tag as rows
+========================
+
+users.status_tag is a comma-separated string ("CURED", "CURED,cured_anxiety")
+that could only be searched with `LIKE '%,cured_x,%'`. Each tag is now
+also a row in user_tags(user_id, tag). Tags are stored lower-case, and the
+(tag, user_id) index answers "who has tag X" without scanning users.
+
+status_tag stays as the display value (badges, session["status_tag"]).
+Every write goes through `set_status_tag`, which updates both in the
+caller's transaction.
+"""
+
+
+def parse_status_tag(status_tag):
+    """'CURED, cured_Anxiety,,cured' -> ['cured', 'cured_anxiety']"""
+    tags = []
+    for t in (status_tag or "").split(","):
+        t = t.strip().lower()
+        if t and t not in tags:
+            tags.append(t)
+    return tags
+
+
+def is_cured(tags):
+    return any(t == "cured" or t.startswith("cured_") for t in tags)
+
+
+def set_status_tag(conn, user_id, status_tag):
+    """Ghi status_tag + user_tags của một user; người gọi commit"""
+    conn.execute("UPDATE users SET status_tag=? WHERE id=?", (status_tag, user_id))
+    conn.execute("DELETE FROM user_tags WHERE user_id=?", (user_id,))
+    conn.executemany(
+        "INSERT INTO user_tags(user_id, tag) VALUES(?, ?)",
+        [(user_id, t) for t in parse_status_tag(status_tag)]
+    )
+
+
+def get_user_tags(conn, user_id):
+    return [r[0] for r in conn.execute("SELECT tag FROM user_tags WHERE user_id=? ORDER BY tag", (user_id,))]
@@ -0,0 +1,191 @@
+"""
+Write-behind buffer for chat messages
+=====================================
+
+Each chat line used to do an INSERT and a COMMIT, which means one fsync,
+inside the Socket.IO handler. Message throughput was bounded by commit
+latency. The handlers now only append the row to this buffer, after the
+message has already been emitted to the room.
+
+The buffer is written in one transaction when either:
+
+- FLUSH_EVERY rows are pending (the flusher is woken immediately), or
+- FLUSH_MS milliseconds have passed (periodic background task).
+
+Rows keep their order. Consecutive rows for the same statement go through
+one executemany. If a flush fails (e.g. database locked), the rows go back
+to the front of the queue and are retried on the next flush. A row that
+can never be written (integrity error) is logged and dropped, so it does
+not block the rows behind it.
+
+Reads that must see every message (history, unread counts, mark-read)
+call `sync()` first. It returns at once when nothing is pending.
+
+Shutdown: `flush()` is registered with atexit, and SIGTERM is turned
+into a normal exit, so pending rows are written before the process ends.
+`stats()` exposes queue depth and flush counters.
+"""
+
+import atexit
+import logging
+import signal
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+
+from db import DATABASE
+from .extensions import socketio
+
+FLUSH_EVERY = 100
+FLUSH_MS = 200
+RETRY_SECONDS = 1
+
+
+class WriteBehindBuffer:
+    def __init__(self, database=DATABASE, flush_every=FLUSH_EVERY, flush_ms=FLUSH_MS):
+        self.database = database
+        self.flush_every = flush_every
+        self.flush_ms = flush_ms
+        self._rows = deque()            # (sql, params)
+        self._rows_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._conn = None
+        self._started = False
+        self._start_lock = threading.Lock()
+        # metrics
+        self.enqueued = 0
+        self.flushed = 0
+        self.flushes = 0
+        self.failures = 0
+        self.max_depth = 0
+        self.last_flush_ms = 0.0
+
+    def start(self):
+        with self._start_lock:
+            if self._started:
+                return
+            self._started = True
+            atexit.register(self.flush)
+            try:
+                # SIGTERM -> SystemExit -> atexit chạy flush (chỉ đăng ký được ở main thread)
+                if signal.getsignal(signal.SIGTERM) in (signal.SIG_DFL, None):
+                    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+            except ValueError:
+                pass
+            socketio.start_background_task(self._run)
+
+    def add(self, sql, params):
+        """Xếp một dòng chờ ghi; không chạm DB"""
+        with self._rows_lock:
+            self._rows.append((sql, params))
+            depth = len(self._rows)
+            self.enqueued += 1
+            if depth > self.max_depth:
+                self.max_depth = depth
+        if depth >= self.flush_every:
+            self._wake.set()
+
+    def _connect(self):
+        if self._conn is None:
+            self._conn = sqlite3.connect(self.database, timeout=10, check_same_thread=False)
+        return self._conn
+
+    def _requeue(self, rows):
+        """Trả lại đầu hàng đợi theo đúng thứ tự, lần flush sau thử lại"""
+        with self._rows_lock:
+            self._rows.extendleft(reversed(rows))
+
+    def flush(self):
+        """Ghi mọi dòng đang chờ trong một transaction; trả về số dòng đã ghi"""
+        if not self._rows:
+            return 0
+        with self._flush_lock:
+            with self._rows_lock:
+                batch = list(self._rows)
+                self._rows.clear()
+            if not batch:
+                return 0
+            t = time.perf_counter()
+            conn = self._connect()
+            try:
+                i = 0
+                while i < len(batch):
+                    # các dòng liên tiếp cùng câu lệnh -> một executemany, giữ nguyên thứ tự
+                    sql = batch[i][0]
+                    j = i
+                    while j < len(batch) and batch[j][0] == sql:
+                        j += 1
+                    conn.executemany(sql, [params for _, params in batch[i:j]])
+                    i = j
+                conn.commit()
+            except sqlite3.IntegrityError:
+                # Một dòng hỏng (vd. khoá ngoại) không được chặn cả hàng đợi: ghi từng dòng, bỏ dòng lỗi
+                conn.rollback()
+                self.failures += 1
+                written = []
+                for k, (sql, params) in enumerate(batch):
+                    try:
+                        conn.execute(sql, params)
+                    except sqlite3.IntegrityError:
+                        logging.exception("Dropping chat row that cannot be written: %r", params)
+                        continue
+                    except Exception:
+                        # vd. database is locked: rollback huỷ cả các dòng đã ghi ở vòng này
+                        # -> trả lại chúng cùng phần chưa ghi (trừ dòng hỏng đã bỏ)
+                        conn.rollback()
+                        self._requeue(written + batch[k:])
+                        raise
+                    written.append((sql, params))
+                try:
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    self._requeue(written)
+                    raise
+                batch = written
+            except Exception:
+                conn.rollback()
+                self._requeue(batch)
+                self.failures += 1
+                raise
+            self.flushes += 1
+            self.flushed += len(batch)
+            self.last_flush_ms = (time.perf_counter() - t) * 1000
+            return len(batch)
+
+    def sync(self):
+        """flush() trước khi đọc messages / conversation_history; lỗi chỉ ghi log, dòng vẫn chờ"""
+        try:
+            self.flush()
+        except Exception:
+            logging.exception("Chat message flush before read failed")
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.flush_ms / 1000)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception:
+                logging.exception("Chat message flush failed")
+                time.sleep(RETRY_SECONDS)
+
+    def stats(self):
+        with self._rows_lock:
+            depth = len(self._rows)
+        return {
+            "depth": depth,
+            "max_depth": self.max_depth,
+            "enqueued": self.enqueued,
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failures": self.failures,
+            "last_flush_ms": round(self.last_flush_ms, 2),
+        }
+
+
+# Dùng chung cho chat ẩn danh (conversation_history) và chat với chuyên gia (messages)
+message_buffer = WriteBehindBuffer()
@@ -1,34 +1,30 @@
-import sqlite3
+"""Add students.user_id (legacy; skipped when there is no students table)"""
 
-DB_PATH = "therapy.db"
 STUDENT_TABLE = "students"
 
-conn = sqlite3.connect(DB_PATH)
-cur = conn.cursor()
 
-# Check column exists
-cur.execute(f"PRAGMA table_info({STUDENT_TABLE})")
-cols = [row[1] for row in cur.fetchall()]
+def upgrade(conn):
+    # Bảng students đã bỏ (sinh viên nằm ở users / student_profiles) -> DB mới không có gì để làm
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name=?", (STUDENT_TABLE,)
+    ).fetchone():
+        print(f"ℹ️ No {STUDENT_TABLE} table, nothing to do")
+        return
 
-if "user_id" not in cols:
-    cur.execute(f"ALTER TABLE {STUDENT_TABLE} ADD COLUMN user_id INTEGER NULL")
-    print("✅ Added students.user_id")
-else:
-    print("ℹ️ students.user_id already exists")
+    # Check column exists
+    cols = [row[1] for row in conn.execute(f"PRAGMA table_info({STUDENT_TABLE})")]
 
-# Create unique index (ignore if exists)
-try:
-    cur.execute(
+    if "user_id" not in cols:
+        conn.execute(f"ALTER TABLE {STUDENT_TABLE} ADD COLUMN user_id INTEGER NULL")
+        print("✅ Added students.user_id")
+    else:
+        print("ℹ️ students.user_id already exists")
+
+    conn.execute(
         f"""
-        CREATE UNIQUE INDEX ux_students_user_id_notnull
+        CREATE UNIQUE INDEX IF NOT EXISTS ux_students_user_id_notnull
         ON {STUDENT_TABLE}(user_id)
         WHERE user_id IS NOT NULL
         """
     )
-    print("✅ Created unique index")
-except sqlite3.OperationalError:
-    print("ℹ️ Unique index already exists")
-
-conn.commit()
-conn.close()
-print("🎉 Done")
+    print("✅ Unique index ready")
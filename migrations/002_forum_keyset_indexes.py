@@ -0,0 +1,20 @@
+"""Forum keyset pagination and per-page answer indexes"""
+
+CHECKS = [
+    ("forum page", "SELECT posts.id FROM posts JOIN users ON posts.user_id = users.id "
+     "WHERE posts.status = ? AND (posts.created_at, posts.id) < (?, ?) "
+     "ORDER BY posts.created_at DESC, posts.id DESC LIMIT ?",
+     ("published", "2026-01-01 00:00:00", 1, 21), "ix_posts_created_at_id"),
+    ("answers of a page", "SELECT a.id FROM answers a JOIN users u ON a.expert_id = u.id "
+     "WHERE a.post_id IN (?, ?, ?) ORDER BY a.created_at, a.id", (1, 2, 3), "ix_answers_post_id"),
+]
+
+
+def upgrade(conn):
+    # Keyset pagination của forum: (created_at, id) < (?, ?) ORDER BY created_at DESC, id DESC
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_posts_created_at_id ON posts(created_at, id)")
+    print("✅ posts(created_at, id) index ready")
+
+    # Answers của cả trang: WHERE post_id IN (...)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_answers_post_id ON answers(post_id)")
+    print("✅ answers(post_id) index ready")
@@ -0,0 +1,51 @@
+"""Canonical UTC timestamps; diary and stress log indexes per student"""
+
+from zoneinfo import ZoneInfo
+
+from timefmt import UTC, is_canonical, to_db_time
+
+# Giá trị không có offset: posts/answers do CURRENT_TIMESTAMP ghi (UTC),
+# diary/stress_logs do datetime.now() của server ghi (giờ VN)
+LEGACY_LOCAL_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+COLUMNS = [
+    ("posts", "created_at", UTC),
+    ("answers", "created_at", UTC),
+    ("diary_entries", "created_at", LEGACY_LOCAL_TZ),
+    ("diary_entries", "updated_at", LEGACY_LOCAL_TZ),
+    ("stress_logs", "created_at", LEGACY_LOCAL_TZ),
+]
+
+CHECKS = [
+    ("diary entries of a student", "SELECT * FROM diary_entries WHERE student_id=? ORDER BY created_at DESC",
+     (1,), "ix_diary_entries_student_created"),
+    ("stress logs of a student (quiz history)", "SELECT * FROM stress_logs WHERE student_id=? ORDER BY created_at DESC",
+     (1,), "ix_stress_logs_student_created"),
+]
+
+
+def upgrade(conn):
+    for table, col, naive_tz in COLUMNS:
+        rows = conn.execute(f"SELECT id, {col} FROM {table} WHERE {col} IS NOT NULL").fetchall()
+        fixed = skipped = 0
+        for row_id, value in rows:
+            # Đã đúng dạng chuẩn -> bỏ qua (chạy lại không dịch giờ lần nữa)
+            if isinstance(value, str) and is_canonical(value):
+                continue
+            canon = to_db_time(value, naive_tz)
+            if canon is None:
+                skipped += 1
+                continue
+            conn.execute(f"UPDATE {table} SET {col}=? WHERE id=?", (canon, row_id))
+            fixed += 1
+        if fixed:
+            print(f"✅ {table}.{col}: {fixed} rows -> UTC 'YYYY-MM-DD HH:MM:SS'")
+        else:
+            print(f"ℹ️ {table}.{col} already canonical")
+        if skipped:
+            print(f"ℹ️ {table}.{col}: {skipped} unreadable values left as is")
+
+    # Danh sách theo sinh viên, sắp xếp theo thời gian
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_diary_entries_student_created ON diary_entries(student_id, created_at)")
+    print("✅ diary_entries(student_id, created_at) index ready")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_stress_logs_student_created ON stress_logs(student_id, created_at)")
+    print("✅ stress_logs(student_id, created_at) index ready")
@@ -0,0 +1,22 @@
+"""posts.status for the moderation queue"""
+
+CHECKS = [
+    ("moderation batch", "SELECT id, user_id, title, content FROM posts WHERE status=? ORDER BY id LIMIT ?",
+     ("pending_review", 16), "ix_posts_pending"),
+]
+
+
+def upgrade(conn):
+    # posts.status: pending_review -> published / rejected (hàng đợi kiểm duyệt)
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(posts)")]
+
+    if "status" not in cols:
+        # Bài cũ đã qua kiểm tra đồng bộ lúc đăng -> published
+        conn.execute("ALTER TABLE posts ADD COLUMN status VARCHAR NOT NULL DEFAULT 'published'")
+        print("✅ Added posts.status")
+    else:
+        print("ℹ️ posts.status already exists")
+
+    # Worker chỉ quét bài đang chờ -> partial index luôn nhỏ
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_posts_pending ON posts(id) WHERE status = 'pending_review'")
+    print("✅ posts pending_review partial index ready")
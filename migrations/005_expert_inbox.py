@@ -0,0 +1,26 @@
+"""posts.crisis_score / posts.embedding for the expert inbox"""
+
+CHECKS = [
+    ("expert inbox", "SELECT posts.id FROM posts JOIN users ON posts.user_id = users.id "
+     "WHERE posts.tag = 'unanswered' AND posts.status = 'published' ORDER BY posts.created_at",
+     (), "ix_posts_unanswered"),
+]
+
+
+def upgrade(conn):
+    # Điểm tính một lần khi bài qua kiểm duyệt (loginforum/expert_inbox.py)
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(posts)")]
+
+    for name, decl in (("crisis_score", "FLOAT"), ("embedding", "BLOB")):
+        if name not in cols:
+            conn.execute(f"ALTER TABLE posts ADD COLUMN {name} {decl}")
+            print(f"✅ Added posts.{name}")
+        else:
+            print(f"ℹ️ posts.{name} already exists")
+
+    # Hộp thư expert chỉ đọc bài chưa trả lời đã duyệt -> partial index
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS ix_posts_unanswered ON posts(created_at) "
+        "WHERE tag = 'unanswered' AND status = 'published'"
+    )
+    print("✅ posts unanswered partial index ready")
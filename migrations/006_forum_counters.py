@@ -0,0 +1,50 @@
+"""Materialized forum counters (forum_stats, user_forum_stats, posts.answer_count)"""
+
+
+def upgrade(conn):
+    # Bộ đếm forum (loginforum/forum_stats.py)
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(posts)")]
+
+    if "answer_count" not in cols:
+        conn.execute("ALTER TABLE posts ADD COLUMN answer_count INTEGER NOT NULL DEFAULT 0")
+        print("✅ Added posts.answer_count")
+    else:
+        print("ℹ️ posts.answer_count already exists")
+
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS forum_stats (
+            key VARCHAR PRIMARY KEY,
+            value INTEGER NOT NULL DEFAULT 0
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_forum_stats (
+            user_id INTEGER PRIMARY KEY REFERENCES users(id),
+            post_count INTEGER NOT NULL DEFAULT 0,
+            answer_count INTEGER NOT NULL DEFAULT 0,
+            last_active_at VARCHAR
+        )
+    """)
+    print("✅ forum_stats / user_forum_stats tables ready")
+
+    # Điền giá trị ban đầu từ dữ liệu hiện có (chạy lại cũng cho cùng kết quả)
+    conn.execute("""
+        UPDATE posts SET answer_count = (SELECT COUNT(*) FROM answers WHERE answers.post_id = posts.id)
+    """)
+    conn.execute("""
+        INSERT OR REPLACE INTO forum_stats(key, value) VALUES
+            ('posts', (SELECT COUNT(*) FROM posts WHERE status = 'published')),
+            ('unanswered', (SELECT COUNT(*) FROM posts WHERE status = 'published' AND tag = 'unanswered')),
+            ('answers', (SELECT COUNT(*) FROM answers))
+    """)
+    conn.execute("DELETE FROM user_forum_stats")
+    conn.execute("""
+        INSERT INTO user_forum_stats(user_id, post_count, answer_count, last_active_at)
+        SELECT user_id, SUM(n_posts), SUM(n_answers), MAX(last_at) FROM (
+            SELECT user_id, COUNT(*) AS n_posts, 0 AS n_answers, MAX(created_at) AS last_at
+            FROM posts WHERE status = 'published' GROUP BY user_id
+            UNION ALL
+            SELECT expert_id, 0, COUNT(*), MAX(created_at) FROM answers GROUP BY expert_id
+        ) GROUP BY user_id
+    """)
+    print("✅ Counters backfilled")
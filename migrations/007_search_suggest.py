@@ -0,0 +1,40 @@
+"""Search suggestion tables and FTS5 index"""
+
+# Bản chụp Search/suggest.py SCHEMA lúc viết migration. Từng câu chạy bằng conn.execute
+# (không executescript: nó commit BEGIN của runner) -> cả migration là một transaction.
+# Không dựng gợi ý ở đây: start_rebuilder của app rebuild khi khởi động.
+STATEMENTS = (
+    """CREATE TABLE IF NOT EXISTS search_queries (
+        norm VARCHAR PRIMARY KEY,
+        display VARCHAR NOT NULL,
+        hits INTEGER NOT NULL DEFAULT 0,
+        last_at VARCHAR
+    )""",
+    """CREATE TABLE IF NOT EXISTS search_terms (
+        id INTEGER PRIMARY KEY,
+        norm TEXT NOT NULL UNIQUE,
+        display TEXT NOT NULL,
+        kind TEXT NOT NULL,
+        weight INTEGER NOT NULL DEFAULT 0
+    )""",
+    """CREATE VIRTUAL TABLE IF NOT EXISTS search_terms_fts USING fts5(
+        norm, content='search_terms', content_rowid='id', prefix='2 3 4'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS search_terms_ai AFTER INSERT ON search_terms BEGIN
+        INSERT INTO search_terms_fts(rowid, norm) VALUES (new.id, new.norm);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_terms_ad AFTER DELETE ON search_terms BEGIN
+        INSERT INTO search_terms_fts(search_terms_fts, rowid, norm) VALUES ('delete', old.id, old.norm);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS search_terms_au AFTER UPDATE OF norm ON search_terms BEGIN
+        INSERT INTO search_terms_fts(search_terms_fts, rowid, norm) VALUES ('delete', old.id, old.norm);
+        INSERT INTO search_terms_fts(rowid, norm) VALUES (new.id, new.norm);
+    END""",
+)
+
+
+def upgrade(conn):
+    # Gợi ý tìm kiếm: search_queries (log), search_terms + search_terms_fts (FTS5, prefix 2-4 ký tự)
+    for sql in STATEMENTS:
+        conn.execute(sql)
+    print("✅ search_queries / search_terms / search_terms_fts ready (suggestions are built at app startup)")
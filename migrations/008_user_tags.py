@@ -0,0 +1,37 @@
+"""user_tags: one row per status tag"""
+
+CHECKS = [
+    ("users with a tag", "SELECT user_id FROM user_tags WHERE tag=?", ("cured_stress",), "ix_user_tags_tag_user"),
+]
+
+
+def upgrade(conn):
+    # Mỗi tag của users.status_tag thành một dòng (loginforum/user_tags.py)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_tags (
+            user_id INTEGER NOT NULL REFERENCES users(id),
+            tag VARCHAR NOT NULL,
+            PRIMARY KEY (user_id, tag)
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_user_tags_tag_user ON user_tags(tag, user_id)")
+    print("✅ user_tags table + (tag, user_id) index ready")
+
+    rows = conn.execute(
+        "SELECT id, status_tag FROM users WHERE status_tag IS NOT NULL AND status_tag != ''"
+    ).fetchall()
+    pairs = []
+    for user_id, status_tag in rows:
+        for t in status_tag.split(","):
+            t = t.strip().lower()
+            if t:
+                pairs.append((user_id, t))
+
+    # INSERT OR IGNORE: chạy lại không tạo trùng
+    before = conn.execute("SELECT COUNT(*) FROM user_tags").fetchone()[0]
+    conn.executemany("INSERT OR IGNORE INTO user_tags(user_id, tag) VALUES(?, ?)", pairs)
+    added = conn.execute("SELECT COUNT(*) FROM user_tags").fetchone()[0] - before
+    if added:
+        print(f"✅ {added} tags split from users.status_tag")
+    else:
+        print("ℹ️ user_tags already up to date")
@@ -0,0 +1,21 @@
+"""Partial index over active chat sessions"""
+
+CHECKS = [
+    ("active sessions (matchmaker load)",
+     "SELECT session_key, seeker_id, helper_id FROM chat_sessions WHERE status='active'",
+     (), "ix_chat_sessions_active"),
+]
+
+
+def upgrade(conn):
+    # Partial index: chỉ chứa session active, không lớn dần theo lịch sử session đã kết thúc
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS ix_chat_sessions_active
+        ON chat_sessions(created_at, session_key, seeker_id, helper_id)
+        WHERE status = 'active'
+    """)
+    print("✅ chat_sessions active-session partial index ready")
+
+    active = conn.execute("SELECT COUNT(*) FROM chat_sessions WHERE status = 'active'").fetchone()[0]
+    total = conn.execute("SELECT COUNT(*) FROM chat_sessions").fetchone()[0]
+    print(f"ℹ️ {active} active of {total} chat sessions")
@@ -0,0 +1,29 @@
+"""chat_queue.prefer_expert and the waiting-entries index for batch matching"""
+
+CHECKS = [
+    ("waiting seekers", "SELECT id, user_id, illness_type, prefer_expert FROM chat_queue "
+     "WHERE status=? ORDER BY requested_at, id LIMIT ?", ("waiting", 500), "ix_chat_queue_waiting"),
+]
+
+
+def upgrade(conn):
+    # Hàng chờ ghép cặp theo lô (loginforum/match_scheduler.py)
+    cols = [row[1] for row in conn.execute("PRAGMA table_info(chat_queue)")]
+
+    if "prefer_expert" not in cols:
+        conn.execute("ALTER TABLE chat_queue ADD COLUMN prefer_expert BOOLEAN NOT NULL DEFAULT 0")
+        print("✅ Added chat_queue.prefer_expert")
+    else:
+        print("ℹ️ chat_queue.prefer_expert already exists")
+
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS ix_chat_queue_waiting
+        ON chat_queue(requested_at, id)
+        WHERE status = 'waiting'
+    """)
+    print("✅ chat_queue waiting-entries partial index ready")
+
+    # Lượt chờ còn sót từ trước (không còn ai đang đợi ở trang) -> expired
+    n = conn.execute("UPDATE chat_queue SET status = 'expired' WHERE status = 'waiting'").rowcount
+    if n:
+        print(f"ℹ️ {n} leftover waiting entries marked expired")
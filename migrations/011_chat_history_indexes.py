@@ -0,0 +1,29 @@
+"""Indexes for cursor-paginated chat history"""
+
+CHECKS = [
+    ("chat room history page", "SELECT * FROM conversation_history WHERE session_key=? AND id < ? "
+     "ORDER BY id DESC LIMIT ?", ("room", 2 ** 63 - 1, 51), "ix_conversation_history_session_id"),
+    ("expert chat page", "SELECT * FROM messages "
+     "WHERE min(sender_id, receiver_id)=? AND max(sender_id, receiver_id)=? AND id < ? "
+     "ORDER BY id DESC LIMIT ?", (1, 2, 2 ** 63 - 1, 51), "ix_messages_pair_id"),
+]
+
+
+def upgrade(conn):
+    # Lịch sử phòng chat ẩn danh theo trang (session_key, id)
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS ix_conversation_history_session_id
+        ON conversation_history(session_key, id)
+    """)
+    print("✅ conversation_history (session_key, id) index ready")
+
+    # Hội thoại student - expert theo trang, không phụ thuộc ai là người gửi
+    conn.execute("""
+        CREATE INDEX IF NOT EXISTS ix_messages_pair_id
+        ON messages(min(sender_id, receiver_id), max(sender_id, receiver_id), id)
+    """)
+    print("✅ messages (pair, id) expression index ready")
+
+    for table in ("conversation_history", "messages"):
+        n = conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+        print(f"ℹ️ {n} rows in {table}")
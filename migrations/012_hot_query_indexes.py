@@ -0,0 +1,57 @@
+"""Indexes for the hot chat, forum, booking and quiz queries"""
+
+# (tên index, bảng, cột [+ điều kiện partial])
+INDEXES = [
+    # Tin chưa đọc (get_peers, get_experts_for_student, get_unread) và mark_read:
+    # receiver_id=? AND is_read=0 [AND sender_id=?]
+    ("ix_messages_receiver_unread", "messages", "(receiver_id, is_read, sender_id)"),
+    # Danh sách người từng nhắn (get_peers, quản lý sinh viên): sender_id=? OR receiver_id=?
+    # -> SQLite gộp index này với index trên (MULTI-INDEX OR) thay vì quét cả bảng
+    ("ix_messages_sender", "messages", "(sender_id)"),
+    # forum_stats.reconcile: số câu trả lời + lần hoạt động cuối theo expert (covering)
+    ("ix_answers_expert_created", "answers", "(expert_id, created_at)"),
+    # Booking: slot đã có người đặt (therapist_id=? AND start_time=?) và lịch của therapist
+    ("ix_appointments_therapist_start", "appointments", "(therapist_id, start_time)"),
+    # Lịch hẹn của sinh viên; kiểm tra đã có lịch sắp tới với therapist
+    ("ix_appointments_student_start", "appointments", "(student_id, start_time)"),
+    # Quyền xem kết quả quiz: expert_id=? AND student_id=?
+    ("ix_quiz_access_requests_expert_student", "quiz_access_requests", "(expert_id, student_id)"),
+    # Thông báo của sinh viên: student_id=? AND status='pending'
+    ("ix_quiz_access_requests_student_status", "quiz_access_requests", "(student_id, status)"),
+]
+
+CHECKS = [
+    ("unread from one peer", "SELECT COUNT(*) FROM messages WHERE receiver_id=? AND sender_id=? AND is_read=0",
+     (1, 2), "ix_messages_receiver_unread"),
+    ("unread total", "SELECT COUNT(*) AS cnt FROM messages WHERE receiver_id=? AND is_read=0",
+     (1,), "ix_messages_receiver_unread"),
+    ("chat peers", "SELECT DISTINCT CASE WHEN sender_id=? THEN receiver_id ELSE sender_id END AS peer "
+     "FROM messages WHERE sender_id=? OR receiver_id=?", (1, 1, 1),
+     ("ix_messages_sender", "ix_messages_receiver_unread")),
+    ("answers per expert", "SELECT expert_id, COUNT(*), MAX(created_at) FROM answers GROUP BY expert_id",
+     (), "ix_answers_expert_created"),
+    ("booked slot", "SELECT id FROM appointments WHERE therapist_id=? AND start_time=? LIMIT 1",
+     (1, "2026-01-05 08:00:00"), "ix_appointments_therapist_start"),
+    ("therapist schedule", "SELECT * FROM appointments WHERE therapist_id=? ORDER BY start_time DESC",
+     (1,), "ix_appointments_therapist_start"),
+    ("student appointments", "SELECT * FROM appointments WHERE student_id=? ORDER BY start_time DESC",
+     (1,), "ix_appointments_student_start"),
+    ("upcoming with therapist", "SELECT * FROM appointments WHERE student_id=? AND therapist_id=? AND start_time >= ?",
+     (1, 2, "2026-01-05"), "ix_appointments_student_start"),
+    ("quiz access request", "SELECT status FROM quiz_access_requests WHERE expert_id=? AND student_id=?",
+     (1, 2), "ix_quiz_access_requests_expert_student"),
+    ("pending quiz requests", "SELECT r.id, u.username FROM quiz_access_requests r "
+     "JOIN users u ON r.expert_id = u.id WHERE r.student_id=? AND r.status='pending'",
+     (1,), "ix_quiz_access_requests_student_status"),
+]
+
+
+def upgrade(conn):
+    tables = {r[0] for r in conn.execute("SELECT name FROM sqlite_master WHERE type='table'")}
+    for name, table, columns in INDEXES:
+        # quiz_access_requests không có trong models.py: DB tạo bằng create_db có thể chưa có bảng
+        if table not in tables:
+            print(f"ℹ️ No {table} table, skipping {name}")
+            continue
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {table}{columns}")
+        print(f"✅ {name} ready")
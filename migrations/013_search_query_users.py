@@ -0,0 +1,18 @@
+"""search_query_users: suggestions from queries of several different users"""
+
+
+def upgrade(conn):
+    # Gợi ý từ truy vấn: đếm user khác nhau thay vì số lần gõ (Search/suggest.py log_query)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS search_query_users (
+            norm VARCHAR NOT NULL,
+            user_id INTEGER NOT NULL,
+            PRIMARY KEY (norm, user_id)
+        )
+    """)
+    print("✅ search_query_users table ready")
+
+    # Gợi ý "query" cũ được lên chỉ vì số lần gõ -> bỏ; rebuild lúc khởi động dựng lại theo số user
+    removed = conn.execute("DELETE FROM search_terms WHERE kind = 'query'").rowcount
+    if removed:
+        print(f"✅ Removed {removed} query suggestions promoted by hit count")
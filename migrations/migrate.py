@@ -0,0 +1,239 @@
+"""
+Versioned schema migrations
+===========================
+
+Every schema change to therapy.db is a file `migrations/NNN_name.py`:
+
+- a module docstring; its first line is the description
+- `upgrade(conn)`: applies the change on a sqlite3 connection. It does not
+  commit (the runner does), and it must be idempotent: IF NOT EXISTS,
+  PRAGMA table_info checks, etc. Databases migrated by running the scripts
+  by hand have no version rows yet, so the runner applies every migration
+  to them once more.
+- optional `CHECKS = [(label, sql, params, index)]`: after the migration
+  the runner runs EXPLAIN QUERY PLAN for each hot query and fails if the
+  plan does not use `index` (a name, or a tuple of names that must all
+  appear). A renamed index or a query that no longer matches its index is
+  caught here rather than as a slow page.
+
+Applied versions are recorded in schema_migrations. Pending migrations run
+in version order, each in one transaction with its version row, so a
+migration that fails (or fails its checks) leaves neither.
+
+    python migrations/migrate.py             apply pending migrations
+    python migrations/migrate.py --dry-run   apply them to an in-memory copy and print the SQL
+    python migrations/migrate.py --status    list applied / pending versions
+    python migrations/migrate.py --check     run every migration's CHECKS against the database
+
+Run it from the project root (DB_PATH is relative, like the old scripts),
+or pass --db.
+"""
+
+import argparse
+import importlib.util
+import os
+import re
+import sqlite3
+import sys
+
+MIGRATIONS_DIR = os.path.dirname(os.path.abspath(__file__))
+# Migration được import module của app (vd. timefmt)
+sys.path.insert(0, os.path.dirname(MIGRATIONS_DIR))
+from timefmt import utc_now_str
+
+DB_PATH = "therapy.db"
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        name VARCHAR NOT NULL,
+        applied_at VARCHAR NOT NULL
+    )
+"""
+
+_FILE = re.compile(r"^(\d{3})_(\w+)\.py$")
+_WRITE = re.compile(r"^\s*(CREATE|ALTER|DROP|INSERT|UPDATE|DELETE|REPLACE)\b", re.I)
+_DML = re.compile(r"^\s*(INSERT|UPDATE|DELETE|REPLACE)\b", re.I)
+_LITERAL = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?\b")
+
+
+class MigrationError(Exception):
+    pass
+
+
+def discover(directory=MIGRATIONS_DIR):
+    """[(version, name, module)] theo thứ tự version"""
+    found = []
+    for fname in sorted(os.listdir(directory)):
+        m = _FILE.match(fname)
+        if not m:
+            continue
+        spec = importlib.util.spec_from_file_location(f"migration_{m[1]}", os.path.join(directory, fname))
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        if not callable(getattr(module, "upgrade", None)):
+            raise MigrationError(f"{fname} has no upgrade(conn)")
+        found.append((int(m[1]), m[2], module))
+    versions = [v for v, _, _ in found]
+    if len(set(versions)) != len(versions):
+        raise MigrationError("Two migrations share a version number")
+    return found
+
+
+def describe(module):
+    doc = (module.__doc__ or "").strip()
+    return doc.splitlines()[0] if doc else ""
+
+
+def applied_versions(conn):
+    """Các version đã chạy; DB chưa có bảng schema_migrations -> rỗng (không tạo bảng ở đây)"""
+    if not conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type='table' AND name='schema_migrations'"
+    ).fetchone():
+        return set()
+    return {r[0] for r in conn.execute("SELECT version FROM schema_migrations")}
+
+
+def check_plans(conn, module):
+    """EXPLAIN QUERY PLAN cho từng CHECKS của migration; trả về danh sách lỗi"""
+    errors = []
+    for label, sql, params, index in getattr(module, "CHECKS", ()):
+        try:
+            plan = " | ".join(r[3] for r in conn.execute("EXPLAIN QUERY PLAN " + sql, params))
+        except sqlite3.OperationalError as e:
+            # Bảng không có trong DB này (vd. quiz_access_requests) -> migration đã bỏ qua index đó
+            print(f"   ℹ️ {label}: skipped ({e})")
+            continue
+        wanted = (index,) if isinstance(index, str) else index
+        missing = [i for i in wanted if not re.search(rf"\bINDEX {re.escape(i)}\b", plan)]
+        if missing:
+            errors.append(f"{label}: expected {', '.join(missing)}, plan is: {plan}")
+        else:
+            print(f"   ✅ {label}: {plan}")
+    return errors
+
+
+def _apply(conn, version, name, module):
+    conn.execute("BEGIN")
+    try:
+        module.upgrade(conn)
+        errors = check_plans(conn, module)
+        if errors:
+            raise MigrationError(f"{version:03d}_{name} query plan checks failed:\n  " + "\n  ".join(errors))
+        conn.execute(
+            "INSERT INTO schema_migrations(version, name, applied_at) VALUES(?,?,?)",
+            (version, name, utc_now_str())
+        )
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+
+def _print_writes(statements):
+    """Các câu ghi của một migration; câu DML giống nhau (khác tham số) gộp thành một dòng"""
+    counts = {}
+    for sql in statements:
+        if not _WRITE.match(sql) or "schema_migrations" in sql:
+            continue
+        dml = _DML.match(sql)
+        if dml:
+            sql = _LITERAL.sub("?", sql)
+        sql = " ".join(sql.split())
+        # executescript báo lại DDL đã chạy -> DDL chỉ in một lần, DML thì đếm
+        counts[sql] = counts.get(sql, 0) + 1 if dml else 1
+    if not counts:
+        print("   (no changes)")
+    for sql, n in counts.items():
+        print(f"   {sql}" + (f"  (x{n})" if n > 1 else ""))
+
+
+def migrate(database=DB_PATH, dry_run=False):
+    """
+    Chạy các migration chưa chạy theo thứ tự; trả về danh sách version.
+    dry_run: chạy trên bản sao trong RAM, in SQL sẽ chạy, file DB không đổi.
+    """
+    conn = sqlite3.connect(database)
+    statements = []
+    if dry_run:
+        copy = sqlite3.connect(":memory:")
+        conn.backup(copy)
+        conn.close()
+        conn = copy
+        conn.set_trace_callback(statements.append)
+    try:
+        applied = applied_versions(conn)
+        pending = [m for m in discover() if m[0] not in applied]
+        if not pending:
+            print("ℹ️ Database is up to date")
+            return []
+        conn.execute(SCHEMA)
+        for version, name, module in pending:
+            print(f"{'🔎 Would apply' if dry_run else '▶️ Applying'} {version:03d}_{name}: {describe(module)}")
+            statements.clear()
+            _apply(conn, version, name, module)
+            if dry_run:
+                _print_writes(statements)
+        if dry_run:
+            print(f"🔎 {len(pending)} pending migration(s); dry run, nothing written")
+        else:
+            print(f"🎉 {len(pending)} migration(s) applied")
+        return [version for version, _, _ in pending]
+    finally:
+        conn.close()
+
+
+def status(database=DB_PATH):
+    conn = sqlite3.connect(database)
+    try:
+        applied = applied_versions(conn)
+        for version, name, module in discover():
+            mark = "✅" if version in applied else "⏳"
+            print(f"{mark} {version:03d}_{name}: {describe(module)}")
+    finally:
+        conn.close()
+
+
+def check(database=DB_PATH):
+    """Chạy CHECKS của mọi migration trên DB hiện tại; trả về số lỗi"""
+    conn = sqlite3.connect(database)
+    errors = []
+    try:
+        for version, name, module in discover():
+            if getattr(module, "CHECKS", None):
+                print(f"🔎 {version:03d}_{name}")
+                errors += check_plans(conn, module)
+    finally:
+        conn.close()
+    for e in errors:
+        print(f"❌ {e}")
+    return len(errors)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply therapy.db schema migrations in order")
+    parser.add_argument("--db", default=DB_PATH, help="SQLite database (default: %(default)s)")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--dry-run", action="store_true", help="apply to an in-memory copy and print the SQL")
+    mode.add_argument("--status", action="store_true", help="list applied and pending migrations")
+    mode.add_argument("--check", action="store_true", help="verify hot-query plans use their indexes")
+    args = parser.parse_args(argv)
+
+    # sqlite3.connect tạo file rỗng nếu sai đường dẫn -> báo lỗi thay vì migrate một DB trống
+    if not os.path.exists(args.db):
+        parser.error(f"{args.db} not found")
+    if args.status:
+        status(args.db)
+        return 0
+    if args.check:
+        return 1 if check(args.db) else 0
+    try:
+        migrate(args.db, dry_run=args.dry_run)
+    except MigrationError as e:
+        print(f"❌ {e}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -2,13 +2,14 @@
 import os
 from sqlalchemy import (
     String, Text, Integer, ForeignKey, Column, Float, Date,
-    DateTime, Boolean, func
+    DateTime, Boolean, func, Index, text, LargeBinary
 )
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 from datetime import datetime
 from database import Base
 from sqlalchemy import UniqueConstraint
 from datetime import date
+from timefmt import utc_now_str
 
 
 BASE_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -88,11 +89,27 @@ class Post(Base):
     content: Mapped[str] = mapped_column(Text)
     user_id: Mapped[int] = mapped_column(ForeignKey("users.id"))
     tag: Mapped[str] = mapped_column(String, default="unanswered")
+    # pending_review -> published / rejected (loginforum/moderation.py)
+    status: Mapped[str] = mapped_column(String, default="published", server_default="published")
+    # hộp thư expert (loginforum/expert_inbox.py): tính một lần khi bài được duyệt
+    crisis_score = Column(Float)
+    answer_count = Column(Integer, nullable=False, default=0, server_default="0")  # loginforum/forum_stats.py
+    embedding = Column(LargeBinary)  # float32 SBERT, đã chuẩn hoá
     created_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
 
     author = relationship("User", back_populates="posts")
     answers = relationship("Answer", back_populates="post")
 
+    __table_args__ = (
+        # keyset pagination của forum: ORDER BY created_at DESC, id DESC
+        Index("ix_posts_created_at_id", "created_at", "id"),
+        # hàng đợi kiểm duyệt: chỉ chứa bài đang chờ, luôn nhỏ
+        Index("ix_posts_pending", "id", sqlite_where=text("status = 'pending_review'")),
+        # hộp thư expert: chỉ bài chưa trả lời đã duyệt
+        Index("ix_posts_unanswered", "created_at",
+              sqlite_where=text("tag = 'unanswered' AND status = 'published'")),
+    )
+
 class Answer(Base):
     __tablename__ = "answers"
 
@@ -105,6 +122,58 @@ class Answer(Base):
     expert = relationship("User", back_populates="answers")
     post = relationship("Post", back_populates="answers")
 
+    __table_args__ = (
+        # nạp answers của cả trang forum bằng post_id IN (...)
+        Index("ix_answers_post_id", "post_id"),
+        # forum_stats.reconcile: số câu trả lời + lần cuối theo expert (covering)
+        Index("ix_answers_expert_created", "expert_id", "created_at"),
+    )
+
+
+class UserTag(Base):
+    """Từng tag của users.status_tag (chữ thường), ghi qua loginforum/user_tags.py"""
+    __tablename__ = "user_tags"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    tag = Column(String, primary_key=True)
+
+    __table_args__ = (
+        # Tìm user theo tag (matching: cured, cured_<illness>)
+        Index("ix_user_tags_tag_user", "tag", "user_id"),
+    )
+
+class ForumStat(Base):
+    """Bộ đếm toàn forum: posts (đã duyệt), unanswered, answers (loginforum/forum_stats.py)"""
+    __tablename__ = "forum_stats"
+
+    key = Column(String, primary_key=True)
+    value = Column(Integer, nullable=False, default=0)
+
+class UserForumStats(Base):
+    """Số bài / câu trả lời của từng user, cập nhật cùng transaction với bài / answer"""
+    __tablename__ = "user_forum_stats"
+
+    user_id = Column(Integer, ForeignKey("users.id"), primary_key=True)
+    post_count = Column(Integer, nullable=False, default=0)
+    answer_count = Column(Integer, nullable=False, default=0)
+    last_active_at = Column(String)  # UTC "YYYY-MM-DD HH:MM:SS"
+
+class SearchQuery(Base):
+    """Log truy vấn tìm chuyên gia (Search/suggest.py); số user khác nhau nằm ở search_query_users"""
+    __tablename__ = "search_queries"
+
+    norm = Column(String, primary_key=True)  # đã bỏ dấu, chữ thường
+    display = Column(String, nullable=False)
+    hits = Column(Integer, nullable=False, default=0)
+    last_at = Column(String)  # UTC "YYYY-MM-DD HH:MM:SS"
+
+class SearchQueryUser(Base):
+    """User đã gõ truy vấn; đủ MIN_QUERY_USERS user khác nhau thì truy vấn thành gợi ý"""
+    __tablename__ = "search_query_users"
+
+    norm = Column(String, primary_key=True)
+    user_id = Column(Integer, primary_key=True)
+
 class ChatQueue(Base):
     __tablename__ = "chat_queue"
 
@@ -113,9 +182,16 @@ class ChatQueue(Base):
     illness_type: Mapped[str] = mapped_column(String)
     status: Mapped[str] = mapped_column(String, default="waiting")
     requested_at: Mapped[DateTime] = mapped_column(DateTime, server_default=func.now())
+    # Muốn nói chuyện với chuyên gia (bỏ qua cured student)
+    prefer_expert: Mapped[bool] = mapped_column(Boolean, default=False, server_default="0")
 
     user = relationship("User")
 
+    __table_args__ = (
+        # hàng chờ của match_scheduler: chỉ lượt đang chờ, theo thứ tự xếp hàng
+        Index("ix_chat_queue_waiting", "requested_at", "id", sqlite_where=text("status = 'waiting'")),
+    )
+
 class ChatSession(Base):
     __tablename__ = "chat_sessions"
 
@@ -130,6 +206,12 @@ class ChatSession(Base):
     seeker = relationship("User", foreign_keys=[seeker_id])
     helper = relationship("User", foreign_keys=[helper_id])
 
+    __table_args__ = (
+        # chỉ session active (ít dòng): nạp người bận cho matchmaking, kết thúc session treo
+        Index("ix_chat_sessions_active", "created_at", "session_key", "seeker_id", "helper_id",
+              sqlite_where=text("status = 'active'")),
+    )
+
 class ChatAlert(Base):
     __tablename__ = "chat_alerts"
 
@@ -154,6 +236,11 @@ class ConversationHistory(Base):
 
     user = relationship("User")
 
+    __table_args__ = (
+        # Lịch sử một phòng chat theo trang: session_key = ? AND id < ? ORDER BY id DESC
+        Index("ix_conversation_history_session_id", "session_key", "id"),
+    )
+
 class Message(Base):
     __tablename__ = "messages"
 
@@ -168,6 +255,17 @@ class Message(Base):
     sender = relationship("User", foreign_keys=[sender_id], backref="sent_messages")
     receiver = relationship("User", foreign_keys=[receiver_id], backref="received_messages")
 
+    __table_args__ = (
+        # Hội thoại hai người theo trang, không phụ thuộc chiều gửi:
+        # min(sender_id, receiver_id) = ? AND max(...) = ? AND id < ? ORDER BY id DESC
+        Index("ix_messages_pair_id", text("min(sender_id, receiver_id)"),
+              text("max(sender_id, receiver_id)"), "id"),
+        # Tin chưa đọc: receiver_id = ? AND is_read = 0 [AND sender_id = ?]
+        Index("ix_messages_receiver_unread", "receiver_id", "is_read", "sender_id"),
+        # Người từng nhắn: sender_id = ? OR receiver_id = ? (cùng index trên)
+        Index("ix_messages_sender", "sender_id"),
+    )
+
 # class TherapistRating(Base):
 #     __tablename__ = "therapist_ratings"
 #     id = Column(Integer, primary_key=True)
@@ -184,7 +282,12 @@ class StressLog(Base):
     score = Column(Float, nullable=False)
     scale_name = Column(String, default="DASS")
     note = Column(Text)
-    created_at = Column(String, default=lambda: datetime.now().isoformat(timespec="seconds"))
+    created_at = Column(String, default=utc_now_str)  # UTC "YYYY-MM-DD HH:MM:SS" (timefmt)
+
+    __table_args__ = (
+        # lịch sử khảo sát của một sinh viên: WHERE student_id=? ORDER BY created_at
+        Index("ix_stress_logs_student_created", "student_id", "created_at"),
+    )
 
 class Appointment(Base):
     __tablename__ = "appointments"
@@ -208,6 +311,13 @@ class Appointment(Base):
     student = relationship("User", foreign_keys=[student_id], backref="student_appointments")
     therapist = relationship("User", foreign_keys=[therapist_id], backref="therapist_appointments")
 
+    __table_args__ = (
+        # Slot đã có người đặt (therapist_id = ? AND start_time = ?), lịch của therapist
+        Index("ix_appointments_therapist_start", "therapist_id", "start_time"),
+        # Lịch hẹn của sinh viên
+        Index("ix_appointments_student_start", "student_id", "start_time"),
+    )
+
 class DiaryEntry(Base):
     __tablename__ = "diary_entries"
     id = Column(Integer, primary_key=True)
@@ -219,8 +329,13 @@ class DiaryEntry(Base):
     tags = Column(String)
     is_private = Column(Integer, default=1)  # 1: private, 0: public/share
 
-    created_at = Column(String, default=lambda: datetime.now().isoformat(timespec="seconds"))
-    updated_at = Column(String, default=lambda: datetime.now().isoformat(timespec="seconds"))
+    created_at = Column(String, default=utc_now_str)  # UTC "YYYY-MM-DD HH:MM:SS" (timefmt)
+    updated_at = Column(String, default=utc_now_str)
+
+    __table_args__ = (
+        # nhật ký / biểu đồ tâm trạng của một sinh viên: WHERE student_id=? ORDER BY created_at
+        Index("ix_diary_entries_student_created", "student_id", "created_at"),
+    )
 
 class DailyActivity(Base):
     __tablename__ = "daily_activity"
@@ -3,10 +3,10 @@
 # =======================
 
 from flask import Blueprint, request, jsonify, render_template, session
-from datetime import datetime
 from flask_cors import CORS
 from database import TherapySession
 from models import User, StudentProfile, StressLog
+from timefmt import vn_format
 from quiz.LogicDiem import (
     CAU_HOI,
     TAN_SUAT,
@@ -234,15 +234,7 @@ def lich_su_by_username():
             for log in logs:
                 muc_do, _, icon_emoticon = tinh_muc_do(log.score)
                 
-                # Parse created_at
-                try:
-                    if isinstance(log.created_at, str):
-                        dt = datetime.fromisoformat(log.created_at)
-                        thoi_gian = dt.strftime("%d/%m/%Y %H:%M")
-                    else:
-                        thoi_gian = log.created_at.strftime("%d/%m/%Y %H:%M")
-                except:
-                    thoi_gian = log.created_at if log.created_at else "N/A"
+                thoi_gian = vn_format(log.created_at) or "N/A"
                 
                 result.append({
                     "thoi_gian": thoi_gian,
@@ -1,11 +1,9 @@
 from datetime import datetime, timedelta, date
-from zoneinfo import ZoneInfo
 from sqlalchemy import select
 from sqlalchemy.exc import IntegrityError
 
 from models import DailyActivity  
-
-VN_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+from timefmt import VN_TZ
 
 def today_vn() -> date:
     return datetime.now(VN_TZ).date()
@@ -0,0 +1,87 @@
+"""
+Query counts of the forum loaders: posts with their answers must take a
+fixed number of queries, however many posts there are (no N+1).
+"""
+
+import os
+import sqlite3
+import sys
+
+import pytest
+from flask import Flask, g
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import db  # noqa: E402
+
+SCHEMA = """
+CREATE TABLE users (id INTEGER PRIMARY KEY, username TEXT);
+CREATE TABLE posts (
+    id INTEGER PRIMARY KEY, title TEXT, content TEXT, user_id INTEGER, tag TEXT,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP, status TEXT, answer_count INTEGER DEFAULT 0
+);
+CREATE TABLE answers (
+    id INTEGER PRIMARY KEY, content TEXT, expert_id INTEGER, post_id INTEGER,
+    created_at TEXT DEFAULT CURRENT_TIMESTAMP
+);
+"""
+
+N_POSTS = 30
+
+
+@pytest.fixture
+def conn():
+    app = Flask(__name__)
+    with app.app_context():
+        c = sqlite3.connect(":memory:")
+        c.row_factory = sqlite3.Row
+        c.executescript(SCHEMA)
+        c.executemany("INSERT INTO users(id, username) VALUES (?, ?)", [(1, "student"), (2, "expert")])
+        for i in range(1, N_POSTS + 1):
+            # Bài chẵn có 2 câu trả lời; bài 7 còn chờ kiểm duyệt
+            status = "pending_review" if i == 7 else "published"
+            answers = 2 if i % 2 == 0 else 0
+            c.execute(
+                "INSERT INTO posts(id, title, content, user_id, tag, status, answer_count) "
+                "VALUES (?, ?, ?, 1, 'unanswered', ?, ?)",
+                (i, f"title {i}", f"content {i}", status, answers),
+            )
+            c.executemany(
+                "INSERT INTO answers(content, expert_id, post_id) VALUES (?, 2, ?)",
+                [(f"answer {i}.{k}", i) for k in range(answers)],
+            )
+        g.db = c  # db.get_db() dùng kết nối này
+        yield c
+        c.close()
+
+
+def count_queries(c, fn, *args):
+    statements = []
+    c.set_trace_callback(statements.append)
+    try:
+        result = fn(*args)
+    finally:
+        c.set_trace_callback(None)
+    return result, [s for s in statements if s.lstrip().upper().startswith("SELECT")]
+
+
+def test_all_posts_take_two_queries(conn):
+    posts, queries = count_queries(conn, db.get_all_forum_posts)
+    assert len(posts) == N_POSTS - 1
+    assert len(queries) == 2
+    by_id = {p["id"]: p for p in posts}
+    assert 7 not in by_id
+    assert [a["content"] for a in by_id[4]["answers"]] == ["answer 4.0", "answer 4.1"]
+    assert by_id[3]["answers"] == []
+
+
+def test_selected_posts_keep_order(conn):
+    posts, queries = count_queries(conn, db.load_forum_posts, [9, 4, 7, 2])
+    assert [p["id"] for p in posts] == [9, 4, 2]
+    assert len(queries) == 2
+
+
+def test_search_texts_skip_answers(conn):
+    rows, queries = count_queries(conn, db.get_forum_post_texts)
+    assert len(rows) == N_POSTS - 1
+    assert len(queries) == 1
+    assert "answers" not in queries[0]
@@ -0,0 +1,105 @@
+"""
+Timestamp storage and display
+=============================
+
+Every created_at / updated_at column is stored as a canonical UTC string
+"YYYY-MM-DD HH:MM:SS". That is the same format as SQLite's
+CURRENT_TIMESTAMP, it sorts like the time it encodes, and it works with
+SQLite's date functions (see migrations/003_canonical_utc_timestamps.py).
+
+Display is always in Vietnam time through one function, `vn_format`, which
+is also the Jinja filter `vntime`:
+
+    {{ post.created_at|vntime("%d/%m/%Y") }}
+
+The timezone objects are built once. Formatting is memoized, because pages
+render the same timestamps over and over.
+"""
+
+from __future__ import annotations
+from datetime import datetime, timezone
+from functools import lru_cache
+from typing import Optional, Union
+from zoneinfo import ZoneInfo
+
+UTC = timezone.utc
+VN_TZ = ZoneInfo("Asia/Ho_Chi_Minh")
+
+DB_FORMAT = "%Y-%m-%d %H:%M:%S"
+DEFAULT_DISPLAY = "%d/%m/%Y %H:%M"
+
+Stamp = Union[str, datetime, None]
+
+
+def utc_now_str() -> str:
+    """Current time in the canonical storage format (default for new rows)."""
+    return datetime.now(UTC).strftime(DB_FORMAT)
+
+
+def is_canonical(s: str) -> bool:
+    return (
+        len(s) == 19 and s[4] == "-" and s[7] == "-" and s[10] == " "
+        and s[13] == ":" and s[16] == ":"
+    )
+
+
+def parse_db_time(value: Stamp, naive_tz=UTC) -> Optional[datetime]:
+    """
+    Aware datetime from a stored value, or None if unreadable.
+    Naive values (no offset) are read in `naive_tz`, UTC for everything the
+    app writes.
+    """
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime):
+        dt = value
+    else:
+        s = str(value).strip()
+        if is_canonical(s):
+            # Đường nhanh: cắt chuỗi thay vì strptime
+            try:
+                dt = datetime(int(s[0:4]), int(s[5:7]), int(s[8:10]),
+                              int(s[11:13]), int(s[14:16]), int(s[17:19]))
+            except ValueError:
+                return None
+        else:
+            # ISO có 'T', phần lẻ giây, offset... (dữ liệu cũ)
+            try:
+                dt = datetime.fromisoformat(s)
+            except ValueError:
+                return None
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=naive_tz)
+    return dt
+
+
+def to_db_time(value: Stamp, naive_tz=UTC) -> Optional[str]:
+    """Canonical UTC storage string for a value, or None if unreadable."""
+    dt = parse_db_time(value, naive_tz)
+    return dt.astimezone(UTC).strftime(DB_FORMAT) if dt else None
+
+
+def to_vn(value: Stamp) -> Optional[datetime]:
+    dt = parse_db_time(value)
+    return dt.astimezone(VN_TZ) if dt else None
+
+
+@lru_cache(maxsize=8192)
+def _vn_format_str(value: str, fmt: str) -> str:
+    dt = to_vn(value)
+    return dt.strftime(fmt) if dt else ""
+
+
+def vn_format(value: Stamp, fmt: str = DEFAULT_DISPLAY) -> str:
+    """Stored timestamp -> Vietnam local time text; "" when empty or unreadable."""
+    if value is None or value == "":
+        return ""
+    if isinstance(value, datetime):
+        dt = to_vn(value)
+        return dt.strftime(fmt) if dt else ""
+    return _vn_format_str(str(value), fmt)
+
+
+def init_app(app) -> None:
+    """Register the `vntime` Jinja filter on the app (all blueprints' templates)."""
+    app.add_template_filter(vn_format, "vntime")